@@ -0,0 +1,82 @@
+"""Per-file copy engine vs. streamed tar, across average file sizes.
+
+Builds trees of equal total size whose files get smaller row by row, copies
+each with every backend and prints the time per backend, to locate the
+average file size below which ``slm.core.tarstream`` wins (the crossover
+behind ``TAR_MAX_AVG_SIZE``). Run from the repository root::
+
+    python benchmarks/copy_backends.py [--total-mib 64] [--dir /mnt/other]
+
+Pass ``--dir`` on another device than the default temporary directory to
+measure a real cross-device copy; the page cache is not dropped, so numbers
+are best compared within one run.
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from slm.core.copier import copy_tree  # noqa: E402
+from slm.core.tarstream import gnu_tar, tar_copy_tree  # noqa: E402
+
+SIZES = [1 << 20, 256 << 10, 64 << 10, 16 << 10, 4 << 10, 1 << 10]
+PER_DIR = 500
+
+
+def build(root: Path, total: int, size: int) -> int:
+    files = max(1, total // size)
+    payload = os.urandom(size)
+    for i in range(files):
+        sub = root / f"d{i // PER_DIR}"
+        if i % PER_DIR == 0:
+            sub.mkdir(parents=True)
+        (sub / f"f{i}").write_bytes(payload)
+    return files
+
+
+def timed(fn, src: Path, dst: Path) -> float:
+    start = time.perf_counter()
+    fn(src, dst)
+    elapsed = time.perf_counter() - start
+    shutil.rmtree(dst)
+    return elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--total-mib", type=int, default=64)
+    parser.add_argument("--dir", type=Path, default=None, help="Destination parent")
+    args = parser.parse_args()
+
+    backends = {"files": lambda s, d: copy_tree(s, d, reflink=False)}
+    if gnu_tar():
+        backends["tar (GNU tar)"] = lambda s, d: tar_copy_tree(s, d, external=True)
+    backends["tar (tarfile)"] = lambda s, d: tar_copy_tree(s, d, external=False)
+
+    work = Path(tempfile.mkdtemp(prefix="slm-bench-"))
+    out = Path(tempfile.mkdtemp(prefix="slm-bench-", dir=args.dir))
+    try:
+        print(f"{'avg size':>9} {'files':>7}  " + "  ".join(f"{n:>14}" for n in backends))
+        for size in SIZES:
+            src = work / f"src-{size}"
+            files = build(src, args.total_mib << 20, size)
+            times = [timed(fn, src, out / "dst") for fn in backends.values()]
+            best = min(times)
+            cells = [f"{t:>12.2f}s{'*' if t == best else ' '}" for t in times]
+            print(f"{size >> 10:>7}Ki {files:>7}  " + "  ".join(cells))
+            shutil.rmtree(src)
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+        shutil.rmtree(out, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -15,150 +15,125 @@ from .config import (
     ConfigError,
     LoadedConfig,
     coerce_scan_roots,
+    load_batch_mapping,
     load_config,
 )
 from .core import (
+    DEFAULT_CONFIDENCE,
+    DEFAULT_PER_DEVICE,
+    BatchResult,
+    CopyStats,
     MigrationError,
+    MigrationPlan,
+    VerificationReport,
     _derive_backup_path,
     _safe_move_dir,
     fast_tree_summary,
     format_summary_pair,
     group_by_target_within_data,
-    move_and_delete_links,
+    execute_plan,
+    has_resumable_copy,
     materialize_links_in_place,
-    migrate_target_and_update_links,
+    needs_copy,
+    plan_batch,
+    plan_migration,
+    relative_rewrites,
+    run_batch,
     rewrite_links_to_relative,
+    rollback_journal,
     SymlinkInfo,
+    SummaryCache,
+    SummaryPrefetcher,
+    format_bytes,
+    iter_tree_diff,
     scan_symlinks_pointing_into_data,
+    top_heaviest,
+    tree_size_breakdown,
     get_project_data_status,
     set_project_data_mode,
     LinkMode,
 )
+from .core.progress import Progress, format_duration
+from .core.throttle import (
+    IO_PRIORITIES,
+    Limits,
+    Throttle,
+    install_reload_signal,
+    parse_size,
+    set_io_priority,
+    throttled,
+)
 
 DEFAULT_DATA_ROOT = Path.home() / "Developer" / "Data"
 DEFAULT_SCAN_ROOTS = [
     str(Path.home() / "Developer" / "Cloud" / "Dropbox" / "-Code-" / "Scripts")
 ]
 
+# Number of menu entries whose summaries are computed speculatively after a scan.
+PREFETCH_TOP_TARGETS = 3
+# Per-link lines shown in a plan preview before the rest are only counted.
+PREVIEW_LINK_LIMIT = 200
+# Seconds between progress records in --log-json, and between progress lines
+# when stdout is not a terminal (a terminal gets a live bar instead).
+PROGRESS_LOG_INTERVAL = 5.0
+PROGRESS_PLAIN_INTERVAL = 10.0
+_PROGRESS_LABELS = {
+    "copy": "跨设备复制",
+    "precopy": "预复制",
+    "sync": "增量同步",
+    "merge": "合并",
+    "inline": "内联复制",
+    "delete": "删除源目录",
+}
+
 app = typer.Typer(
     add_completion=False,
     help="符号链接目标迁移（Typer CLI + Questionary 交互界面）",
 )
 
 
-def _append_json_log(
-    path: Path,
-    phase: str,
-    current_target: Path,
-    new_target: Path,
-    links: Iterable[Path],
-    backup_entry: Optional[Tuple[Path, Path]] = None,
-    link_mode: str = "relative",
-) -> None:
-    """Append action records as JSON Lines.
+def _append_plan_log(path: Path, phase: str, plan: MigrationPlan) -> None:
+    """Append a plan's action records as JSON Lines.
 
     Each line is an object with keys: phase, type, from/to or link/to, ts.
     """
-    path = Path(path).expanduser()
-    path.parent.mkdir(parents=True, exist_ok=True)
-    ts = time.time()
-    records = []
-    if backup_entry:
-        records.append(
-            {
-                "phase": phase,
-                "type": "backup",
-                "from": str(backup_entry[0]),
-                "to": str(backup_entry[1]),
-                "ts": ts,
-            }
-        )
-    records.append(
-        {
-            "phase": phase,
-            "type": "move",
-            "from": str(current_target),
-            "to": str(new_target),
-            "link_mode": link_mode,
-            "ts": ts,
-        }
-    )
-    record_type = "materialize" if link_mode == "inline" else "retarget"
-    for link in links:
-        records.append(
-            {
-                "phase": phase,
-                "type": record_type,
-                "link": str(link),
-                "to": str(new_target),
-                "link_mode": link_mode,
-                "ts": ts,
-            }
-        )
-    with path.open("a", encoding="utf-8") as f:
-        for rec in records:
-            f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+    _append_records(path, plan.iter_log_records(phase))
 
 
-def _append_move_only_log(
-    path: Path,
-    phase: str,
-    current_target: Path,
-    new_target: Path,
-    links: Iterable[Path],
-    backup_entry: Optional[Tuple[Path, Path]] = None,
-) -> None:
-    """Append move-only action records (move + unlink) as JSON Lines."""
+def _append_records(path: Path, records: Iterable[Dict[str, Any]]) -> None:
+    """Write ``records`` as JSON Lines as they are produced."""
 
     path = Path(path).expanduser()
     path.parent.mkdir(parents=True, exist_ok=True)
-    ts = time.time()
-    records = []
-    if backup_entry:
-        records.append(
-            {
-                "phase": phase,
-                "type": "backup",
-                "from": str(backup_entry[0]),
-                "to": str(backup_entry[1]),
-                "ts": ts,
-            }
-        )
-    records.append(
-        {
-            "phase": phase,
-            "type": "move",
-            "from": str(current_target),
-            "to": str(new_target),
-            "link_mode": "move-only",
-            "ts": ts,
-        }
-    )
-    for link in links:
-        records.append(
-            {
-                "phase": phase,
-                "type": "unlink",
-                "link": str(link),
-                "ts": ts,
-            }
-        )
     with path.open("a", encoding="utf-8") as f:
         for rec in records:
             f.write(json.dumps(rec, ensure_ascii=False) + "\n")
 
 
+def _print_limited(lines: Iterable[Any], limit: Optional[int], prefix: str) -> int:
+    """Print up to ``limit`` lines (all when ``None``), then count the rest.
+
+    ``lines`` is consumed lazily; returns how many there were.
+    """
+
+    total = 0
+    for total, line in enumerate(lines, 1):
+        if limit is None or total <= limit:
+            print(f"{prefix}{line}")
+    if limit is not None and total > limit:
+        print(f"{prefix}... 另有 {total - limit} 项未显示")
+    return total
+
+
 def _append_relative_only_log(
     path: Path, phase: str, infos: Iterable[SymlinkInfo]
 ) -> None:
     """Append retarget-only action records as JSON Lines."""
 
-    path = Path(path).expanduser()
-    path.parent.mkdir(parents=True, exist_ok=True)
     ts = time.time()
-    records = []
-    for info in infos:
-        records.append(
+    _append_records(
+        path,
+        (
             {
                 "phase": phase,
                 "type": "retarget",
@@ -167,14 +142,17 @@ def _append_relative_only_log(
                 "link_mode": "relative-only",
                 "ts": ts,
             }
-        )
-    with path.open("a", encoding="utf-8") as f:
-        for rec in records:
-            f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+            for info in infos
+        ),
+    )
 
 
 def _append_materialize_log(
-    path: Path, phase: str, source_target: Path, links: Iterable[Path]
+    path: Path,
+    phase: str,
+    source_target: Path,
+    links: Iterable[Path],
+    link_mode: str = "inline",
 ) -> None:
     """Append materialize action records as JSON Lines.
 
@@ -192,7 +170,7 @@ def _append_materialize_log(
                 "type": "materialize",
                 "link": str(link),
                 "source": str(source_target),
-                "link_mode": "inline",
+                "link_mode": link_mode,
                 "ts": ts,
             }
         )
@@ -201,29 +179,41 @@ def _append_materialize_log(
             f.write(json.dumps(rec, ensure_ascii=False) + "\n")
 
 
-def _run_interactive_flow(
-    data_root_option: Optional[str],
-    scan_roots_option: Optional[List[str]],
-    link_mode_option: Optional[str],
-    relative_only: bool,
-    dry_run: bool,
-    log_json: Optional[Path],
-) -> int:
-    """Run the original interactive flow (Questionary-based)."""
+def _append_verification_log(
+    path: Path, phase: str, report: VerificationReport
+) -> None:
+    """Append one cross-device copy verification record, including the sample."""
 
-    if questionary is None:
-        print("未安装 questionary，请先安装依赖。")
-        return 2
+    path = Path(path).expanduser()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    record = {
+        "phase": phase,
+        "type": "verify",
+        "from": str(report.source),
+        "to": str(report.destination),
+        "mode": report.mode,
+        "files": report.files,
+        "bytes": report.bytes,
+        "confidence": report.confidence,
+        "tolerance": report.tolerance,
+        "sampled": report.sampled,
+        "sampled_bytes": report.sampled_bytes,
+        "prehashed": report.prehashed,
+        "ts": time.time(),
+    }
+    with path.open("a", encoding="utf-8") as f:
+        f.write(json.dumps(record, ensure_ascii=False) + "\n")
 
-    if link_mode_option:
-        link_mode_option = link_mode_option.lower()
 
-    try:
-        loaded_config: LoadedConfig = load_config()
-    except ConfigError as exc:
-        print(f"配置错误：{exc}")
-        return 2
+def _resolve_roots(
+    data_root_option: Optional[str], scan_roots_option: Optional[List[str]]
+) -> Tuple[Path, List[Path], Optional[Path]]:
+    """Data root and scan roots from options, then the config file, then defaults.
+
+    Returns ``(data_root, scan_roots, config_path)``; raises ``ConfigError``.
+    """
 
+    loaded_config: LoadedConfig = load_config()
     config_data: Dict[str, Any] = loaded_config.data
 
     if data_root_option is not None:
@@ -233,28 +223,164 @@ def _run_interactive_flow(
     if data_root_str is None:
         data_root_str = str(DEFAULT_DATA_ROOT)
     if not isinstance(data_root_str, str):
-        print("配置错误：data_root 必须是字符串。")
-        return 2
+        raise ConfigError("data_root 必须是字符串。")
     data_root = Path(data_root_str).expanduser().resolve()
 
     if scan_roots_option is not None:
         scan_roots_raw = scan_roots_option
     else:
-        try:
-            scan_roots_raw = coerce_scan_roots(
-                config_data.get("scan_roots"),
-                context=str(loaded_config.path) if loaded_config.path else "配置文件",
-            )
-        except ConfigError as exc:
-            print(f"配置错误：{exc}")
-            return 2
+        scan_roots_raw = coerce_scan_roots(
+            config_data.get("scan_roots"),
+            context=str(loaded_config.path) if loaded_config.path else "配置文件",
+        )
         if not scan_roots_raw:
             scan_roots_raw = DEFAULT_SCAN_ROOTS
 
     scan_roots = [Path(p).expanduser() for p in scan_roots_raw]
+    return data_root, scan_roots, loaded_config.path
+
+
+def _setup_throttle(
+    max_bytes: Optional[str],
+    max_files: Optional[str],
+    io_priority: Optional[str],
+    throttle_file: Optional[Path],
+) -> Optional[Throttle]:
+    """Apply ``--io-priority``; build the throttle for the rate options.
+
+    Returns ``None`` when nothing is capped (no caps and no control file);
+    raises ``ConfigError``.
+    """
+
+    if io_priority is not None:
+        level = io_priority.lower()
+        if level not in IO_PRIORITIES:
+            raise ConfigError(f"--io-priority 必须是 {'/'.join(IO_PRIORITIES)} 之一。")
+        if not set_io_priority(level):
+            typer.echo("提示：此平台不支持设置 IO 优先级，已忽略。")
+    try:
+        limits = Limits(
+            parse_size(max_bytes) if max_bytes else 0,
+            parse_size(max_files) if max_files else 0,
+        )
+    except ValueError as exc:
+        raise ConfigError(f"限速参数无效：{exc}") from exc
+    if limits.unlimited and throttle_file is None:
+        return None
+
+    def _on_change(new: Limits) -> None:
+        typer.echo(f"限速已调整：{new.describe()}")
+
+    limiter = Throttle(limits, control_file=throttle_file, on_change=_on_change)
+    typer.echo(f"限速：{limiter.limits.describe()}")
+    if throttle_file is not None:
+        hint = "，或发送 SIGHUP 立即重读" if install_reload_signal(limiter) else ""
+        typer.echo(
+            f"修改 {throttle_file}（如 bytes=20M files=500）即可在运行中调整{hint}。"
+        )
+    return limiter
+
+
+def _format_progress(progress: Progress, width: int = 24) -> str:
+    """One status line: bar, percentage, bytes, files, rate, ETA, current file."""
+
+    label = _PROGRESS_LABELS.get(progress.phase, progress.phase)
+    fraction = progress.fraction
+    if fraction is None:
+        bar, pct = "?" * width, "  ?%"
+    else:
+        filled = int(fraction * width)
+        bar, pct = "#" * filled + "-" * (width - filled), f"{fraction:4.0%}"
+    size = format_bytes(progress.bytes_done)
+    if progress.bytes_total:
+        size += f"/{format_bytes(progress.bytes_total)}"
+    files = str(progress.files_done)
+    if progress.files_total:
+        files += f"/{progress.files_total}"
+    line = (
+        f"{label} [{bar}] {pct} {size} {files} 文件 "
+        f"{format_bytes(int(progress.rate))}/s"
+    )
+    if progress.finished:
+        return line + f" 用时 {format_duration(progress.elapsed)}"
+    if progress.eta is not None:
+        line += f" 剩余 {format_duration(progress.eta)}"
+    if progress.current:
+        name = progress.current
+        line += f" {name if len(name) <= 40 else '…' + name[-39:]}"
+    return line
 
-    if loaded_config.path:
-        print(f"已加载配置文件：{loaded_config.path}")
+
+class _ProgressDisplay:
+    """``on_progress`` callback: a live bar on a terminal, plain lines otherwise.
+
+    With ``log_json``, a progress record is appended every
+    ``PROGRESS_LOG_INTERVAL`` seconds and when a step finishes.
+    """
+
+    def __init__(self, log_json: Optional[Path] = None) -> None:
+        self.log_json = log_json
+        self.live = sys.stdout.isatty()
+        self._printed = 0.0
+        self._logged = 0.0
+        self._width = 0
+
+    def __call__(self, progress: Progress) -> None:
+        now = time.monotonic()
+        line = _format_progress(progress)
+        if self.live:
+            pad = " " * max(0, self._width - len(line))
+            self._width = len(line)
+            typer.echo(f"\r{line}{pad}", nl=progress.finished)
+            if progress.finished:
+                self._width = 0
+        elif progress.finished or now - self._printed >= PROGRESS_PLAIN_INTERVAL:
+            self._printed = now
+            typer.echo(line)
+        if self.log_json and (
+            progress.finished or now - self._logged >= PROGRESS_LOG_INTERVAL
+        ):
+            self._logged = now
+            record = {"phase": "applied", **progress.to_record(), "ts": time.time()}
+            _append_records(self.log_json, [record])
+
+
+def _run_interactive_flow(
+    data_root_option: Optional[str],
+    scan_roots_option: Optional[List[str]],
+    link_mode_option: Optional[str],
+    relative_only: bool,
+    dry_run: bool,
+    log_json: Optional[Path],
+    summary_estimate: Optional[float] = None,
+    sort_by_size: bool = False,
+    verify: str = "metadata",
+    verify_confidence: float = DEFAULT_CONFIDENCE,
+    background_delete: bool = False,
+    two_phase: bool = False,
+    save_plan: Optional[Path] = None,
+    preview_limit: Optional[int] = PREVIEW_LINK_LIMIT,
+    journal: Optional[Path] = None,
+) -> int:
+    """Run the original interactive flow (Questionary-based)."""
+
+    if questionary is None:
+        print("未安装 questionary，请先安装依赖。")
+        return 2
+
+    if link_mode_option:
+        link_mode_option = link_mode_option.lower()
+
+    try:
+        data_root, scan_roots, config_path = _resolve_roots(
+            data_root_option, scan_roots_option
+        )
+    except ConfigError as exc:
+        print(f"配置错误：{exc}")
+        return 2
+
+    if config_path:
+        print(f"已加载配置文件：{config_path}")
 
     link_mode_label = link_mode_option or "interactive"
     print(
@@ -267,12 +393,41 @@ def _run_interactive_flow(
         if not infos:
             print("未找到指向 Data 目录的符号链接。请检查扫描范围或目录。")
             return 0
-        plan = rewrite_links_to_relative(infos, dry_run=dry_run)
+        # Each section is one lazy pass over the links, so only the shown
+        # lines are ever held.
         print("计划 (relative-only):")
-        for line in plan:
-            print(f"  • {line}")
+        try:
+            changed = _print_limited(
+                (
+                    f"Retarget: {i.source} -> {rel} (target={i.target})"
+                    for chunk, _ in relative_rewrites(infos)
+                    for i, rel in chunk
+                ),
+                preview_limit,
+                "  • ",
+            )
+            unchanged = _print_limited(
+                (
+                    f"Unchanged: {i.source} -> {rel}"
+                    for _, chunk in relative_rewrites(infos)
+                    for i, rel in chunk
+                ),
+                preview_limit,
+                "  • ",
+            )
+        except MigrationError as exc:
+            print(f"校验失败：{exc}")
+            return 2
+        print(f"需改写 {changed} 个链接，{unchanged} 个已是相对路径（不改动）。")
+        if not changed:
+            print("完成。无需改写。")
+            return 0
         if log_json:
-            _append_relative_only_log(log_json, "preview", infos)
+            _append_relative_only_log(
+                log_json,
+                "preview",
+                (i for chunk, _ in relative_rewrites(infos) for i, _ in chunk),
+            )
         if dry_run:
             proceed = questionary.confirm(
                 "执行上述操作（仅改写为相对路径）吗？", default=False
@@ -280,13 +435,22 @@ def _run_interactive_flow(
             if not proceed:
                 print("已取消。")
                 return 0
+        def _log_applied(chunk: List[SymlinkInfo]) -> None:
+            _append_relative_only_log(log_json, "applied", chunk)
+
         try:
-            rewrite_links_to_relative(infos, dry_run=False)
+            rewrite_links_to_relative(
+                infos,
+                dry_run=False,
+                journal=journal,
+                limit=0,
+                on_rewritten=_log_applied if log_json else None,
+            )
         except MigrationError as exc:
             print(f"执行失败：{exc}")
+            if journal and journal.exists():
+                print(f"可用 lk rollback {journal} 撤销已完成的步骤。")
             return 2
-        if log_json:
-            _append_relative_only_log(log_json, "applied", infos)
         print("完成。已将符号链接改写为相对路径（未移动目录）。")
         return 0
 
@@ -296,11 +460,83 @@ def _run_interactive_flow(
         print("未找到指向 Data 目录的符号链接。请检查扫描范围或目录。")
         return 0
 
+    # Start summaries for the first few menu entries while the operator reads
+    # the menu; close() cancels whatever is still running on every exit path.
+    summary_cache = SummaryCache()
+    if sort_by_size:
+        grouped = _sort_targets_by_size(grouped, data_root, summary_cache)
+    prefetcher = SummaryPrefetcher(
+        estimate_budget=summary_estimate, cache=summary_cache
+    )
+    try:
+        prefetcher.submit(list(grouped)[:PREFETCH_TOP_TARGETS])
+        return _run_target_menu(
+            grouped,
+            data_root,
+            link_mode_option,
+            dry_run,
+            log_json,
+            prefetcher,
+            verify=verify,
+            verify_confidence=verify_confidence,
+            background_delete=background_delete,
+            two_phase=two_phase,
+            save_plan=save_plan,
+            preview_limit=preview_limit,
+            journal=journal,
+        )
+    finally:
+        prefetcher.close()
+
+
+def _sort_targets_by_size(
+    grouped: Dict[Path, List[SymlinkInfo]], data_root: Path, cache: SummaryCache
+) -> Dict[Path, List[SymlinkInfo]]:
+    """Size every target in one pass over the data root; heaviest first."""
+
+    depth = 1
+    for target in grouped:
+        try:
+            depth = max(depth, len(target.relative_to(data_root).parts))
+        except ValueError:
+            continue
+    tree_size_breakdown(data_root, max_depth=depth, cache=cache)
+    for target in grouped:
+        if target not in cache:
+            fast_tree_summary(target, cache=cache)
+
+    def _bytes(item: Tuple[Path, List[SymlinkInfo]]) -> int:
+        cached = cache.get(item[0])
+        return cached[1] if cached else 0
+
+    return dict(sorted(grouped.items(), key=_bytes, reverse=True))
+
+
+def _run_target_menu(
+    grouped: Dict[Path, List[SymlinkInfo]],
+    data_root: Path,
+    link_mode_option: Optional[str],
+    dry_run: bool,
+    log_json: Optional[Path],
+    prefetcher: SummaryPrefetcher,
+    verify: str = "metadata",
+    verify_confidence: float = DEFAULT_CONFIDENCE,
+    background_delete: bool = False,
+    two_phase: bool = False,
+    save_plan: Optional[Path] = None,
+    preview_limit: Optional[int] = PREVIEW_LINK_LIMIT,
+    journal: Optional[Path] = None,
+) -> int:
+    """Target selection, operation choice, plan preview and apply."""
+
     def _fmt_target(t: Path, count: int) -> str:
         try:
             rel = t.relative_to(data_root)
         except ValueError:
             rel = t
+        size = prefetcher.cache.get(t)
+        if size is not None:
+            return f"{rel}  ({count} 个链接, {format_bytes(size[1])})"
         return f"{rel}  ({count} 个链接)"
 
     choices = [
@@ -321,9 +557,10 @@ def _run_interactive_flow(
         print("已取消。")
         return 0
 
+    prefetcher.submit([selected_target])
     links = [info.source for info in grouped[selected_target]]
-    display_links = "\n".join(f"- {p}" for p in links)
-    print(f"以下符号链接指向该目录:\n{display_links}")
+    print(f"以下 {len(links)} 个符号链接指向该目录:")
+    _print_limited(links, preview_limit, "- ")
 
     operation_kind = None
     if link_mode_option is None:
@@ -334,6 +571,10 @@ def _run_interactive_flow(
                     title="本地化（Materialize）：复制数据到链接位置，保留原数据",
                     value="materialize",
                 ),
+                questionary.Choice(
+                    title="本地化（硬链接）：同设备上以硬链接构建目录，共享 inode，不占额外空间",
+                    value="materialize-hardlink",
+                ),
                 questionary.Choice(
                     title="迁移 + 相对路径链接：移动数据并创建相对符号链接",
                     value="relative",
@@ -354,30 +595,65 @@ def _run_interactive_flow(
             return 0
         operation_kind = operation_choice
     else:
-        operation_kind = "materialize" if link_mode_option == "inline" else link_mode_option
+        operation_kind = {
+            "inline": "materialize",
+            "inline-hardlink": "materialize-hardlink",
+        }.get(link_mode_option, link_mode_option)
 
     # Materialize: copy data to link locations, preserve original
-    if operation_kind == "materialize":
-        curr_summary = fast_tree_summary(selected_target)
-        plan = materialize_links_in_place(selected_target, links, dry_run=True)
-        print("计划 (inline/materialize):")
+    if operation_kind in ("materialize", "materialize-hardlink"):
+        materialize_mode = (
+            "inline-hardlink" if operation_kind == "materialize-hardlink" else "inline"
+        )
+        try:
+            plan = materialize_links_in_place(
+                selected_target,
+                links,
+                dry_run=True,
+                link_mode=materialize_mode,
+                verify=verify,
+                verify_confidence=verify_confidence,
+                summary_cache=prefetcher.cache,
+            )
+        except MigrationError as e:
+            print(f"校验失败：{e}")
+            return 2
+        print(f"计划 ({materialize_mode}/materialize):")
         for line in plan:
             print(f"  • {line}")
-        print(f"源目录摘要：files={curr_summary[0]} bytes={curr_summary[1]}")
+        print(f"源目录摘要：{prefetcher.describe(selected_target)}")
         print("注意：原数据目录将保留，数据将被复制到各链接位置。")
+        if materialize_mode == "inline-hardlink":
+            print("注意：同一设备上的副本为硬链接，与原数据共享 inode，修改任一处会同时影响另一处。")
         if log_json:
-            _append_materialize_log(log_json, "preview", selected_target, links)
+            _append_materialize_log(
+                log_json, "preview", selected_target, links, link_mode=materialize_mode
+            )
         proceed = questionary.confirm("执行上述操作吗？", default=False).ask()
         if not proceed:
             print("已取消。")
             return 0
         try:
-            materialize_links_in_place(selected_target, links, dry_run=False)
+            materialize_links_in_place(
+                selected_target,
+                links,
+                dry_run=False,
+                link_mode=materialize_mode,
+                verify=verify,
+                verify_confidence=verify_confidence,
+                summary_cache=prefetcher.cache,
+                on_progress=_ProgressDisplay(log_json),
+                journal=journal,
+            )
         except MigrationError as e:
             print(f"执行失败：{e}")
+            if journal and journal.exists():
+                print(f"可用 lk rollback {journal} 撤销已完成的步骤。")
             return 2
         if log_json:
-            _append_materialize_log(log_json, "applied", selected_target, links)
+            _append_materialize_log(
+                log_json, "applied", selected_target, links, link_mode=materialize_mode
+            )
         print("完成。已将符号链接替换为数据副本（原数据保留）。")
         return 0
 
@@ -391,10 +667,14 @@ def _run_interactive_flow(
         return 0
 
     new_target = Path(new_path_str).expanduser()
+    if new_target.exists():
+        prefetcher.submit([new_target])
 
     conflict_strategy = "abort"
     backup_path: Optional[Path] = None
-    if new_target.exists():
+    if has_resumable_copy(selected_target, new_target):
+        print(f"检测到未完成的跨设备复制，将续传：{new_target}")
+    elif new_target.exists():
         print(f"目标路径已存在：{new_target}")
         backup_candidate = _derive_backup_path(new_target)
         strategy_choice = questionary.select(
@@ -404,6 +684,9 @@ def _run_interactive_flow(
                 questionary.Choice(
                     title=f"备份后迁移（先重命名为 {backup_candidate.name}）", value="backup"
                 ),
+                questionary.Choice(
+                    title="合并（只传输缺失的文件；同名文件内容不同则失败）", value="merge"
+                ),
                 questionary.Choice(title="强制覆盖（不支持）", value="reject"),
             ],
             default="abort",
@@ -414,120 +697,88 @@ def _run_interactive_flow(
         if strategy_choice == "abort" or strategy_choice is None:
             print("已中止迁移。")
             return 0
-        conflict_strategy = "backup"
-        backup_path = backup_candidate
+        if strategy_choice == "merge":
+            conflict_strategy = "merge"
+        else:
+            conflict_strategy = "backup"
+            backup_path = backup_candidate
+
+    def _on_verified(report: VerificationReport) -> None:
+        sampled = f" sampled={len(report.sampled)}" if report.mode == "sampled" else ""
+        if report.prehashed:
+            sampled += f" prehashed={report.prehashed}"
+        print(f"跨设备复制已校验：mode={report.mode} files={report.files}{sampled}")
+        if log_json:
+            _append_verification_log(log_json, "applied", report)
+
+    def _on_copied(stats: CopyStats) -> None:
+        print(f"跨设备复制：{stats.describe()}")
+
+    def _on_precopied(stats: CopyStats) -> None:
+        print(f"预复制完成（源目录仍可写）：{stats.describe()}")
+        proceed = questionary.confirm(
+            "请先停止对源目录的写入，然后开始最终增量同步？", default=True
+        ).ask()
+        if not proceed:
+            raise MigrationError("已取消最终同步；重新执行同一迁移可从复制日志继续。")
 
     try:
-        if operation_kind == "move-only":
-            plan = move_and_delete_links(
-                selected_target,
-                new_target,
-                links,
-                dry_run=dry_run,
-                conflict_strategy=conflict_strategy,
-                backup_path=backup_path,
-                data_root=data_root,
-            )
-        else:
-            plan = migrate_target_and_update_links(
-                selected_target,
-                new_target,
-                links,
-                dry_run=dry_run,
-                conflict_strategy=conflict_strategy,
-                backup_path=backup_path,
-                data_root=data_root,
-                link_mode=operation_kind,
-            )
+        plan = plan_migration(
+            selected_target,
+            new_target,
+            links,
+            link_mode=operation_kind,
+            conflict_strategy=conflict_strategy,
+            backup_path=backup_path,
+            data_root=data_root,
+            verify=verify,
+            verify_confidence=verify_confidence,
+            background_delete=background_delete,
+            two_phase=two_phase,
+            summary_cache=prefetcher.cache,
+        )
     except MigrationError as e:
         print(f"校验失败：{e}")
         return 2
+    if save_plan:
+        plan.save(save_plan)
+        print(f"计划已保存：{save_plan}（可用 lk apply 执行）")
 
     if dry_run:
         print("计划 (dry-run):")
-        for line in plan:
+        for line in plan.iter_actions(preview_limit):
             print(f"  • {line}")
-        # Fast tree summaries for preview
-        curr_summary = fast_tree_summary(selected_target)
-        new_summary = fast_tree_summary(new_target) if new_target.exists() else (0, 0)
+        # Background summaries started at scan time; unfinished ones show as
+        # "computing…" instead of blocking the preview.
+        curr_summary = prefetcher.status(selected_target)
+        new_summary = prefetcher.status(new_target) if new_target.exists() else (0, 0)
         print(format_summary_pair(curr_summary, new_summary))
         if log_json:
-            if operation_kind == "move-only":
-                _append_move_only_log(
-                    log_json,
-                    "preview",
-                    selected_target,
-                    new_target,
-                    links,
-                    backup_entry=(new_target, backup_path) if backup_path else None,
-                )
-            else:
-                _append_json_log(
-                    log_json,
-                    "preview",
-                    selected_target,
-                    new_target,
-                    links,
-                    backup_entry=(new_target, backup_path) if backup_path else None,
-                    link_mode=operation_kind,
-                )
+            _append_plan_log(log_json, "preview", plan)
         proceed = questionary.confirm("执行上述操作吗？", default=False).ask()
         if not proceed:
             print("已取消。")
             return 0
-        # execute for real after confirmation
-        try:
-            if operation_kind == "move-only":
-                move_and_delete_links(
-                    selected_target,
-                    new_target,
-                    links,
-                    dry_run=False,
-                    conflict_strategy=conflict_strategy,
-                    backup_path=backup_path,
-                    data_root=data_root,
-                )
-            else:
-                migrate_target_and_update_links(
-                    selected_target,
-                    new_target,
-                    links,
-                    dry_run=False,
-                    conflict_strategy=conflict_strategy,
-                    backup_path=backup_path,
-                    data_root=data_root,
-                    link_mode=operation_kind,
-                )
-        except MigrationError as e:
-            print(f"执行失败：{e}")
-            return 2
-        if log_json:
-            if operation_kind == "move-only":
-                _append_move_only_log(
-                    log_json,
-                    "applied",
-                    selected_target,
-                    new_target,
-                    links,
-                    backup_entry=(new_target, backup_path) if backup_path else None,
-                )
-            else:
-                _append_json_log(
-                    log_json,
-                    "applied",
-                    selected_target,
-                    new_target,
-                    links,
-                    backup_entry=(new_target, backup_path) if backup_path else None,
-                    link_mode=operation_kind,
-                )
-        # Final summary for new target after apply
-        final_new = fast_tree_summary(new_target)
-        print(f"summary(new=files:{final_new[0]} bytes:{final_new[1]})")
-    else:
-        # Non-dry-run invocation: operation already applied above
-        final_new = fast_tree_summary(new_target)
-        print(f"summary(new=files:{final_new[0]} bytes:{final_new[1]})")
+    # The plan computed above is executed as-is; it is revalidated first.
+    try:
+        execute_plan(
+            plan,
+            on_verified=_on_verified,
+            on_copied=_on_copied,
+            on_precopied=_on_precopied,
+            journal=journal,
+            on_progress=_ProgressDisplay(log_json),
+            summary_cache=prefetcher.cache,
+        )
+    except MigrationError as e:
+        print(f"执行失败：{e}")
+        if journal and journal.exists():
+            print(f"可用 lk rollback {journal} 撤销已完成的步骤。")
+        return 2
+    if dry_run and log_json:
+        _append_plan_log(log_json, "applied", plan)
+    final_new = fast_tree_summary(plan.new_target)
+    print(f"summary(new=files:{final_new[0]} bytes:{final_new[1]})")
 
     if operation_kind == "move-only":
         print("完成。已移动目录并删除关联符号链接。")
@@ -553,7 +804,8 @@ def app_callback(
         None,
         "--link-mode",
         case_sensitive=False,
-        help="relative|absolute symlinks or inline copies; omit to choose interactively",
+        help="relative|absolute symlinks, inline copies, or inline-hardlink "
+        "(hard-linked trees sharing inodes); omit to choose interactively",
     ),
     relative_only: bool = typer.Option(
         False,
@@ -571,22 +823,394 @@ def app_callback(
         "--log-json",
         help="Append JSON Lines records of planned/applied actions to the given file",
     ),
+    summary_estimate: Optional[float] = typer.Option(
+        None,
+        "--summary-estimate",
+        min=0.0,
+        help="Show time-bounded approximate preview summaries (seconds per target); "
+        "summaries after apply stay exact",
+    ),
+    sort_by_size: bool = typer.Option(
+        False,
+        "--sort-by-size",
+        help="Size all targets in one pass and list the heaviest first in the menu",
+    ),
+    verify: str = typer.Option(
+        "metadata",
+        "--verify",
+        case_sensitive=False,
+        help="Cross-device copy check before deleting the source: "
+        "metadata | sampled (size-weighted content sample) | full",
+    ),
+    verify_confidence: float = typer.Option(
+        DEFAULT_CONFIDENCE,
+        "--verify-confidence",
+        min=0.5,
+        max=0.999999,
+        help="Detection confidence used to size the --verify sampled content sample",
+    ),
+    background_delete: bool = typer.Option(
+        False,
+        "--background-delete",
+        help="After a cross-device copy, rename the source aside and delete it "
+        "in a detached background process instead of waiting",
+    ),
+    two_phase: bool = typer.Option(
+        False,
+        "--two-phase",
+        help="Cross-device moves: pre-copy while the source stays live, then "
+        "pause and sync only the files changed since before switching links",
+    ),
+    save_plan: Optional[Path] = typer.Option(
+        None,
+        "--save-plan",
+        help="Write the computed migration plan to this JSON file; "
+        "run it later with `lk apply`",
+    ),
+    preview_limit: int = typer.Option(
+        PREVIEW_LINK_LIMIT,
+        "--preview-limit",
+        min=0,
+        help="Per-link lines shown in a plan preview before the rest are only "
+        "counted (0: show all)",
+    ),
+    journal: Optional[Path] = typer.Option(
+        None,
+        "--journal",
+        help="Write a write-ahead journal of the migration's steps here "
+        "(also for materialize and --relative-only); undo it with `lk rollback`",
+    ),
+    max_bytes_per_sec: Optional[str] = typer.Option(
+        None,
+        "--max-bytes-per-sec",
+        help="Cap copy bandwidth, e.g. 50M (bytes written per second)",
+    ),
+    max_files_per_sec: Optional[str] = typer.Option(
+        None,
+        "--max-files-per-sec",
+        help="Cap files copied or deleted per second",
+    ),
+    io_priority: Optional[str] = typer.Option(
+        None,
+        "--io-priority",
+        case_sensitive=False,
+        help="Kernel IO priority for this run: normal | low | idle (Linux)",
+    ),
+    throttle_file: Optional[Path] = typer.Option(
+        None,
+        "--throttle-file",
+        help="Control file with caps like 'bytes=20M files=500', re-read while "
+        "running (and on SIGHUP)",
+    ),
 ) -> None:
     """Default command: run the interactive Questionary flow."""
     if ctx.invoked_subcommand:
         return
 
-    exit_code = _run_interactive_flow(
-        data_root_option=data_root,
-        scan_roots_option=scan_roots,
-        link_mode_option=link_mode,
-        relative_only=relative_only,
-        dry_run=dry_run,
-        log_json=log_json,
-    )
+    try:
+        limiter = _setup_throttle(
+            max_bytes_per_sec, max_files_per_sec, io_priority, throttle_file
+        )
+    except ConfigError as exc:
+        typer.echo(f"配置错误：{exc}")
+        raise typer.Exit(code=2)
+    with throttled(limiter):
+        exit_code = _run_interactive_flow(
+            data_root_option=data_root,
+            scan_roots_option=scan_roots,
+            link_mode_option=link_mode,
+            relative_only=relative_only,
+            dry_run=dry_run,
+            log_json=log_json,
+            summary_estimate=summary_estimate,
+            sort_by_size=sort_by_size,
+            verify=verify.lower(),
+            verify_confidence=verify_confidence,
+            background_delete=background_delete,
+            two_phase=two_phase,
+            save_plan=save_plan,
+            preview_limit=preview_limit or None,
+            journal=journal,
+        )
     raise typer.Exit(code=exit_code)
 
 
+@app.command("apply")
+def apply_command(
+    plan_file: Path = typer.Argument(..., help="Plan file written by --save-plan"),
+    dry_run: bool = typer.Option(
+        False,
+        "--dry-run",
+        help="Revalidate and print the plan without executing it",
+    ),
+    log_json: Optional[Path] = typer.Option(
+        None,
+        "--log-json",
+        help="Append JSON Lines records of the applied actions to the given file",
+    ),
+    journal: Optional[Path] = typer.Option(
+        None,
+        "--journal",
+        help="Write a write-ahead journal of the steps; undo with `lk rollback`",
+    ),
+    max_bytes_per_sec: Optional[str] = typer.Option(
+        None,
+        "--max-bytes-per-sec",
+        help="Cap copy bandwidth, e.g. 50M (bytes written per second)",
+    ),
+    max_files_per_sec: Optional[str] = typer.Option(
+        None,
+        "--max-files-per-sec",
+        help="Cap files copied or deleted per second",
+    ),
+    io_priority: Optional[str] = typer.Option(
+        None,
+        "--io-priority",
+        case_sensitive=False,
+        help="Kernel IO priority for this run: normal | low | idle (Linux)",
+    ),
+    throttle_file: Optional[Path] = typer.Option(
+        None,
+        "--throttle-file",
+        help="Control file with caps like 'bytes=20M files=500', re-read while "
+        "running (and on SIGHUP)",
+    ),
+) -> None:
+    """Execute a saved migration plan after checking nothing it relies on changed."""
+
+    try:
+        limiter = _setup_throttle(
+            max_bytes_per_sec, max_files_per_sec, io_priority, throttle_file
+        )
+    except ConfigError as exc:
+        typer.echo(f"配置错误：{exc}")
+        raise typer.Exit(2)
+    try:
+        plan = MigrationPlan.load(plan_file)
+    except (OSError, ValueError, KeyError) as exc:
+        typer.echo(f"无法读取计划：{exc}")
+        raise typer.Exit(2)
+    typer.echo(f"计划 ({plan.operation}, {time.ctime(plan.created)}):")
+    for line in plan.iter_actions(PREVIEW_LINK_LIMIT):
+        typer.echo(f"  • {line}")
+    stale = plan.stale_reasons()
+    if stale:
+        typer.echo("计划已过期（路径自规划后已改变）：")
+        for reason in stale:
+            typer.echo(f"  - {reason}")
+        raise typer.Exit(2)
+    if dry_run:
+        raise typer.Exit(0)
+
+    def _on_copied(stats: CopyStats) -> None:
+        typer.echo(f"跨设备复制：{stats.describe()}")
+
+    try:
+        with throttled(limiter):
+            execute_plan(
+                plan,
+                on_copied=_on_copied,
+                journal=journal,
+                on_progress=_ProgressDisplay(log_json),
+            )
+    except MigrationError as exc:
+        typer.echo(f"执行失败：{exc}")
+        if journal and journal.exists():
+            typer.echo(f"可用 lk rollback {journal} 撤销已完成的步骤。")
+        raise typer.Exit(2)
+    if log_json:
+        _append_plan_log(log_json, "applied", plan)
+    typer.echo("完成。")
+    raise typer.Exit(0)
+
+
+@app.command("rollback")
+def rollback_command(
+    journal: Path = typer.Argument(..., help="Journal written by --journal"),
+    dry_run: bool = typer.Option(
+        False, "--dry-run", help="Print what would be undone without changing anything"
+    ),
+) -> None:
+    """Undo the completed steps of a journaled migration, newest first."""
+
+    try:
+        lines = rollback_journal(journal, dry_run=dry_run)
+    except MigrationError as exc:
+        typer.echo(f"回滚失败：{exc}")
+        raise typer.Exit(2)
+    typer.echo("回滚计划 (dry-run):" if dry_run else "回滚：")
+    for line in lines:
+        typer.echo(f"  • {line}")
+    if not dry_run:
+        typer.echo("完成。已恢复迁移前的状态。")
+    raise typer.Exit(0)
+
+
+@app.command("batch")
+def batch_command(
+    mapping_file: Optional[Path] = typer.Argument(
+        None,
+        help="YAML/JSON file mapping current targets to new locations; "
+        "omit to pick targets from a checklist",
+    ),
+    data_root: Optional[str] = typer.Option(
+        None, "--data-root", help="Data directory (relative paths resolve here)"
+    ),
+    scan_roots: Optional[List[str]] = typer.Option(
+        None, "--scan-roots", help="Roots to scan once for symlink sources"
+    ),
+    link_mode: str = typer.Option(
+        "relative",
+        "--link-mode",
+        case_sensitive=False,
+        help="relative | absolute | inline | inline-hardlink | move-only",
+    ),
+    conflict: str = typer.Option(
+        "abort",
+        "--conflict",
+        case_sensitive=False,
+        help="Existing destinations: abort | backup | merge",
+    ),
+    dry_run: bool = typer.Option(
+        True,
+        "--dry-run/--apply",
+        help="Preview the whole batch and confirm (default) or run it directly",
+        show_default=True,
+    ),
+    per_device: int = typer.Option(
+        DEFAULT_PER_DEVICE,
+        "--per-device",
+        min=1,
+        help="Concurrent cross-device copies allowed per source/destination device",
+    ),
+    verify: str = typer.Option(
+        "metadata",
+        "--verify",
+        case_sensitive=False,
+        help="Cross-device copy check: metadata | sampled | full",
+    ),
+    log_json: Optional[Path] = typer.Option(
+        None,
+        "--log-json",
+        help="Append JSON Lines records for every item to one file",
+    ),
+    journal_dir: Optional[Path] = typer.Option(
+        None,
+        "--journal-dir",
+        help="Write one rollback journal per item into this directory",
+    ),
+    max_bytes_per_sec: Optional[str] = typer.Option(
+        None,
+        "--max-bytes-per-sec",
+        help="Cap copy bandwidth, e.g. 50M (bytes written per second)",
+    ),
+    max_files_per_sec: Optional[str] = typer.Option(
+        None,
+        "--max-files-per-sec",
+        help="Cap files copied or deleted per second",
+    ),
+    io_priority: Optional[str] = typer.Option(
+        None,
+        "--io-priority",
+        case_sensitive=False,
+        help="Kernel IO priority for this run: normal | low | idle (Linux)",
+    ),
+    throttle_file: Optional[Path] = typer.Option(
+        None,
+        "--throttle-file",
+        help="Control file with caps like 'bytes=20M files=500', re-read while "
+        "running (and on SIGHUP)",
+    ),
+) -> None:
+    """Migrate many targets in one run: scan once, rename now, copy concurrently."""
+
+    try:
+        root, roots, _ = _resolve_roots(data_root, scan_roots)
+        pairs = load_batch_mapping(mapping_file) if mapping_file else None
+        limiter = _setup_throttle(
+            max_bytes_per_sec, max_files_per_sec, io_priority, throttle_file
+        )
+    except ConfigError as exc:
+        typer.echo(f"配置错误：{exc}")
+        raise typer.Exit(2)
+
+    grouped = group_by_target_within_data(
+        scan_symlinks_pointing_into_data(roots, root), root
+    )
+    links = {t: [info.source for info in infos] for t, infos in grouped.items()}
+    if pairs is None:
+        if questionary is None:
+            typer.echo("未安装 questionary；请提供批量迁移文件。")
+            raise typer.Exit(2)
+        if not grouped:
+            typer.echo("未找到指向 Data 目录的符号链接。请检查扫描范围或目录。")
+            raise typer.Exit(0)
+        selected = questionary.checkbox(
+            "选择要迁移的目标目录：",
+            choices=[questionary.Choice(title=str(t), value=t) for t in grouped],
+        ).ask()
+        dest = questionary.text("输入新的父目录（各目标保留原名）:").ask()
+        if not selected or not dest:
+            typer.echo("已取消。")
+            raise typer.Exit(0)
+        pairs = [(str(t), str(Path(dest).expanduser() / t.name)) for t in selected]
+
+    try:
+        plans = plan_batch(
+            [(Path(a), Path(b)) for a, b in pairs],
+            links,
+            data_root=root,
+            link_mode=link_mode.lower(),
+            conflict_strategy=conflict.lower(),
+            verify=verify.lower(),
+        )
+    except MigrationError as exc:
+        typer.echo(f"校验失败：{exc}")
+        raise typer.Exit(2)
+
+    copies = sum(needs_copy(p) for p in plans)
+    typer.echo(
+        f"批量计划：{len(plans)} 项（同设备重命名 {len(plans) - copies}，"
+        f"跨设备复制 {copies}，每设备并发 {per_device}）"
+    )
+    for plan in plans:
+        typer.echo(f"[{plan.current_target.name}]")
+        for line in plan.iter_actions(PREVIEW_LINK_LIMIT):
+            typer.echo(f"  • {line}")
+    if log_json:
+        for plan in plans:
+            _append_plan_log(log_json, "preview", plan)
+    if dry_run:
+        if questionary is None or not questionary.confirm(
+            "执行上述批量操作吗？", default=False
+        ).ask():
+            typer.echo("已取消。")
+            raise typer.Exit(0)
+
+    def _on_result(result: BatchResult) -> None:
+        plan = result.plan
+        if result.ok:
+            copied = f"，{result.copied.describe()}" if result.copied else ""
+            typer.echo(
+                f"✓ {plan.current_target} -> {plan.new_target} "
+                f"({result.seconds:.1f}s{copied})"
+            )
+        else:
+            typer.echo(f"✗ {plan.current_target} -> {plan.new_target}：{result.error}")
+            if result.journal and result.journal.exists():
+                typer.echo(f"  可用 lk rollback {result.journal} 撤销")
+        if log_json:
+            _append_records(log_json, result.iter_log_records())
+
+    with throttled(limiter):
+        results = run_batch(
+            plans, per_device=per_device, on_result=_on_result, journal_dir=journal_dir
+        )
+    failed = sum(not r.ok for r in results)
+    typer.echo(f"完成 {len(results) - failed}/{len(results)} 项。")
+    raise typer.Exit(2 if failed else 0)
+
+
 @app.command("status")
 def status_command(
     project_root: Path = typer.Option(
@@ -657,7 +1281,7 @@ def set_mode_command(
         "--mode",
         "-m",
         case_sensitive=False,
-        help="Target mode: relative | absolute | inline",
+        help="Target mode: relative | absolute | inline | inline-hardlink",
     ),
     dry_run: bool = typer.Option(
         False,
@@ -693,6 +1317,120 @@ def set_mode_command(
     raise typer.Exit(0)
 
 
+@app.command("du")
+def du_command(
+    data_root: Path = typer.Option(
+        DEFAULT_DATA_ROOT,
+        "--data-root",
+        "-d",
+        help="Directory to size (default: ~/Developer/Data)",
+    ),
+    depth: int = typer.Option(
+        2, "--depth", min=1, help="Directory levels below the data root to report"
+    ),
+    top: int = typer.Option(
+        20, "--top", "-n", min=1, help="Number of heaviest entries to list"
+    ),
+    workers: int = typer.Option(
+        8, "--workers", min=1, help="Parallel walkers (one per first-level directory)"
+    ),
+    json_output: bool = typer.Option(
+        False,
+        "--json",
+        help="Output the size breakdown as JSON (machine-readable)",
+    ),
+) -> None:
+    """Per-target and per-subdirectory sizes in one pass over the data root."""
+    data_root = Path(data_root).expanduser().resolve()
+    if not data_root.is_dir():
+        typer.echo(f"Error: not a directory: {data_root}")
+        raise typer.Exit(1)
+
+    tree = tree_size_breakdown(data_root, max_depth=depth, max_workers=workers)
+    heaviest = top_heaviest(tree, top)
+    targets = sorted(tree.children, key=lambda n: n.bytes, reverse=True)
+
+    def _rel(p: Path) -> str:
+        try:
+            return str(p.relative_to(data_root))
+        except ValueError:
+            return str(p)
+
+    if json_output:
+        payload = {
+            "data_root": str(data_root),
+            "files": tree.files,
+            "bytes": tree.bytes,
+            "targets": [
+                {"path": _rel(n.path), "files": n.files, "bytes": n.bytes}
+                for n in targets
+            ],
+            "top": [
+                {"path": _rel(n.path), "files": n.files, "bytes": n.bytes}
+                for n in heaviest
+            ],
+        }
+        typer.echo(json.dumps(payload, ensure_ascii=False))
+        raise typer.Exit(0)
+
+    lines = [
+        f"Data root: {data_root}  files={tree.files} bytes={tree.bytes} "
+        f"({format_bytes(tree.bytes)})",
+        "Targets:",
+    ]
+    for n in targets:
+        lines.append(f"  {format_bytes(n.bytes):>12}  {n.files:>10} files  {_rel(n.path)}")
+    lines.append(f"Top {len(heaviest)} heaviest:")
+    for n in heaviest:
+        lines.append(f"  {format_bytes(n.bytes):>12}  {n.files:>10} files  {_rel(n.path)}")
+    typer.echo("\n".join(lines))
+    raise typer.Exit(0)
+
+
+@app.command("diff")
+def diff_command(
+    a: Path = typer.Argument(..., help="Reference tree (e.g. current target)"),
+    b: Path = typer.Argument(..., help="Tree to compare (e.g. new target)"),
+    compare_hash: bool = typer.Option(
+        False, "--hash", help="Also compare SHA-256 digests of same-size files"
+    ),
+    mtime_window: float = typer.Option(
+        0.0, "--mtime-window", min=0.0, help="Allowed mtime difference in seconds"
+    ),
+    json_output: bool = typer.Option(
+        False,
+        "--json",
+        help="Output one JSON object per difference (JSON Lines)",
+    ),
+) -> None:
+    """Stream added/removed/changed entries between two trees (exit 1 if they differ)."""
+    a = Path(a).expanduser().resolve()
+    b = Path(b).expanduser().resolve()
+    for p in (a, b):
+        if not p.is_dir():
+            typer.echo(f"Error: not a directory: {p}")
+            raise typer.Exit(2)
+
+    counts = {"added": 0, "removed": 0, "changed": 0}
+    for entry in iter_tree_diff(a, b, compare_hash=compare_hash, mtime_window=mtime_window):
+        counts[entry.kind] += 1
+        if json_output:
+            typer.echo(
+                json.dumps(
+                    {"kind": entry.kind, "path": entry.path, "reason": entry.reason},
+                    ensure_ascii=False,
+                )
+            )
+        else:
+            typer.echo(str(entry))
+    if not json_output:
+        typer.echo(
+            f"diff(added={counts['added']} removed={counts['removed']} "
+            f"changed={counts['changed']})"
+        )
+    raise typer.Exit(1 if any(counts.values()) else 0)
+
+
 def main(argv=None):
     argv = sys.argv[1:] if argv is None else argv
     try:
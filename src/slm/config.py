@@ -10,6 +10,7 @@ from .services.configuration import (  # noqa: F401
     DEFAULT_CONFIG_LOCATIONS,
     LoadedConfig,
     coerce_scan_roots,
+    load_batch_mapping,
     load_config,
 )
 
@@ -18,5 +19,6 @@ __all__ = [
     "DEFAULT_CONFIG_LOCATIONS",
     "LoadedConfig",
     "coerce_scan_roots",
+    "load_batch_mapping",
     "load_config",
 ]
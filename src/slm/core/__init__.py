@@ -1,21 +1,113 @@
 """Core primitives for scanning, migrating, and summarising symlink targets."""
 
+from .batch import (
+    DEFAULT_PER_DEVICE,
+    BatchResult,
+    journal_path,
+    needs_copy,
+    plan_batch,
+    run_batch,
+)
+from .copier import (
+    CopyJournal,
+    CopyStats,
+    DEFAULT_COPY_WORKERS,
+    clone_file,
+    copy_file,
+    copy_file_fanout,
+    copy_tree,
+    fan_out_copy_tree,
+    hardlink_tree,
+    reflink_known,
+    reflink_supported,
+)
+from .diff import DiffEntry, file_digest, iter_tree_diff
+from .exchange import (
+    RENAME_EXCHANGE,
+    RENAME_NOREPLACE,
+    exchange_supported,
+    rename_exchange,
+    rename_noreplace,
+)
+from .journal import JournalState, MigrationJournal
 from .migration import (
+    INLINE_MODES,
     MigrationError,
     _derive_backup_path,
     _materialize_link,
     _safe_move_dir,
+    execute_plan,
+    has_resumable_copy,
     move_and_delete_links,
     materialize_links_in_place,
     migrate_target_and_update_links,
+    plan_migration,
+    relative_rewrites,
     rewrite_links_to_relative,
+    rollback_journal,
+)
+from .merge import MergeConflict, MergePlan, apply_merge, plan_merge
+from .plan import MOVE_ONLY, ActionLines, DirSnapshot, MigrationPlan, PathSnapshot
+from .progress import Progress, ProgressTracker
+from .preflight import CapacityReport, DeviceCapacity, check_capacity
+from .relink import (
+    DEFAULT_RETARGET_WORKERS,
+    RetargetError,
+    link_text,
+    restore_links,
+    retarget_links,
+    split_unchanged,
+    verify_links,
+)
+from .remover import (
+    BackgroundRemoval,
+    DEFAULT_REMOVE_WORKERS,
+    RemoveStats,
+    remove_tree,
+    remove_tree_in_background,
+    rename_aside,
 )
 from .scanner import (
     SymlinkInfo,
     group_by_target_within_data,
     scan_symlinks_pointing_into_data,
 )
-from .summary import fast_tree_summary, format_summary_pair
+from .summary import (
+    COMPUTING_LABEL,
+    DEFAULT_ESTIMATE_BUDGET,
+    SizeNode,
+    SummaryCache,
+    SummaryCancelled,
+    SummaryEstimate,
+    SummaryPrefetcher,
+    fast_tree_summary,
+    format_bytes,
+    format_summary_pair,
+    top_heaviest,
+    tree_size_breakdown,
+)
+from .tarstream import (
+    COPY_BACKENDS,
+    choose_copy_backend,
+    gnu_tar,
+    tar_copy_tree,
+)
+from .throttle import (
+    IO_PRIORITIES,
+    Limits,
+    Throttle,
+    parse_size,
+    set_io_priority,
+    throttled,
+)
+from .verify import (
+    DEFAULT_CONFIDENCE,
+    DEFAULT_MTIME_WINDOW,
+    VERIFY_MODES,
+    VerificationReport,
+    sample_size_for_confidence,
+    verify_tree_copy,
+)
 from .project_mode import (
     LinkMode,
     ProjectDataStatus,
@@ -25,19 +117,105 @@ from .project_mode import (
 )
 
 __all__ = [
+    "ActionLines",
+    "BackgroundRemoval",
+    "COMPUTING_LABEL",
+    "BatchResult",
+    "CapacityReport",
+    "COPY_BACKENDS",
+    "CopyJournal",
+    "CopyStats",
+    "DEFAULT_CONFIDENCE",
+    "DEFAULT_MTIME_WINDOW",
+    "DEFAULT_COPY_WORKERS",
+    "DEFAULT_PER_DEVICE",
+    "DEFAULT_REMOVE_WORKERS",
+    "DEFAULT_RETARGET_WORKERS",
+    "DeviceCapacity",
+    "DiffEntry",
+    "DirSnapshot",
+    "DEFAULT_ESTIMATE_BUDGET",
+    "INLINE_MODES",
+    "IO_PRIORITIES",
+    "JournalState",
+    "Limits",
+    "MergeConflict",
+    "MergePlan",
+    "MOVE_ONLY",
     "MigrationError",
+    "MigrationJournal",
+    "MigrationPlan",
+    "PathSnapshot",
+    "Progress",
+    "ProgressTracker",
+    "RENAME_EXCHANGE",
+    "RENAME_NOREPLACE",
+    "RemoveStats",
+    "RetargetError",
+    "SizeNode",
+    "SummaryCache",
+    "SummaryCancelled",
+    "SummaryEstimate",
+    "SummaryPrefetcher",
+    "VERIFY_MODES",
+    "VerificationReport",
     "SymlinkInfo",
+    "Throttle",
     "_derive_backup_path",
     "_materialize_link",
     "_safe_move_dir",
+    "apply_merge",
+    "check_capacity",
+    "choose_copy_backend",
+    "clone_file",
+    "copy_file",
+    "copy_file_fanout",
+    "copy_tree",
+    "exchange_supported",
+    "execute_plan",
+    "fan_out_copy_tree",
     "fast_tree_summary",
+    "file_digest",
+    "format_bytes",
     "format_summary_pair",
+    "gnu_tar",
+    "hardlink_tree",
     "group_by_target_within_data",
+    "has_resumable_copy",
+    "iter_tree_diff",
+    "journal_path",
+    "link_text",
     "move_and_delete_links",
     "materialize_links_in_place",
+    "parse_size",
     "migrate_target_and_update_links",
+    "needs_copy",
+    "plan_merge",
+    "plan_migration",
+    "plan_batch",
+    "reflink_known",
+    "reflink_supported",
+    "remove_tree",
+    "remove_tree_in_background",
+    "relative_rewrites",
+    "rename_aside",
+    "rename_exchange",
+    "rename_noreplace",
+    "restore_links",
+    "retarget_links",
     "rewrite_links_to_relative",
+    "rollback_journal",
+    "run_batch",
+    "sample_size_for_confidence",
     "scan_symlinks_pointing_into_data",
+    "set_io_priority",
+    "split_unchanged",
+    "tar_copy_tree",
+    "throttled",
+    "top_heaviest",
+    "tree_size_breakdown",
+    "verify_links",
+    "verify_tree_copy",
     "LinkMode",
     "ProjectDataStatus",
     "DATA_DIR_NAME",
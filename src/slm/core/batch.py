@@ -0,0 +1,272 @@
+"""Batch migrations: many targets planned from one scan and run together.
+
+Items whose move is a same-device rename finish in milliseconds and run
+right away on the calling thread; items that must copy across devices run
+on a thread pool while those renames proceed. Each copy holds a slot on
+both its source and its destination device, so ``per_device`` bounds how
+many copies read from or write to any one disk at a time.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+from .copier import CopyStats
+from .migration import (
+    MigrationError,
+    _existing_parent,
+    _resolve_new_target,
+    _same_device,
+    execute_plan,
+    plan_migration,
+)
+from .plan import MigrationPlan
+from .preflight import check_capacity
+from .summary import SummaryCache
+from .verify import DEFAULT_CONFIDENCE
+
+# Concurrent cross-device copies allowed to touch any single device.
+DEFAULT_PER_DEVICE = 2
+
+
+@dataclass
+class BatchResult:
+    """Outcome of one batch item.
+
+    Attributes:
+        plan: The item's plan.
+        error: Why it failed, or ``None`` on success.
+        seconds: Wall time spent executing it.
+        copied: Copy counters when the item was copied across devices.
+        journal: The item's rollback journal, if one was written.
+    """
+
+    plan: MigrationPlan
+    error: Optional[str] = None
+    seconds: float = 0.0
+    copied: Optional[CopyStats] = None
+    journal: Optional[Path] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    def iter_log_records(self, ts: Optional[float] = None) -> Iterator[Dict[str, Any]]:
+        """``applied`` records of the plan, or one ``failed`` error record."""
+
+        ts = time.time() if ts is None else ts
+        if self.ok:
+            yield from self.plan.iter_log_records("applied", ts)
+            return
+        yield {
+            "phase": "failed",
+            "type": "error",
+            "from": str(self.plan.current_target),
+            "to": str(self.plan.new_target),
+            "error": self.error,
+            "ts": ts,
+        }
+
+
+def journal_path(journal_dir: Path, index: int, plan: MigrationPlan) -> Path:
+    """Rollback journal of batch item ``index`` inside ``journal_dir``."""
+
+    return Path(journal_dir) / f"{index:03d}-{plan.current_target.name}.jsonl"
+
+
+def needs_copy(plan: MigrationPlan) -> bool:
+    """Whether executing ``plan`` copies data instead of renaming it."""
+
+    if plan.resuming:
+        return True
+    return not _same_device(plan.current_target, _existing_parent(plan.new_target))
+
+
+def _devices(plan: MigrationPlan) -> List[int]:
+    """Devices a cross-device item reads from and writes to, sorted."""
+
+    src = os.stat(plan.current_target).st_dev
+    dst = os.stat(_existing_parent(plan.new_target)).st_dev
+    return sorted({src, dst})
+
+
+def _check_overlaps(pairs: Sequence[Tuple[Path, Path]]) -> None:
+    """Reject items that would move into, out of or onto each other."""
+
+    def _within(a: Path, b: Path) -> bool:
+        return a == b or b in a.parents
+
+    for i, (src_a, dst_a) in enumerate(pairs):
+        for src_b, dst_b in pairs[i + 1 :]:
+            for a, b in (
+                (src_a, src_b),
+                (dst_a, dst_b),
+                (src_a, dst_b),
+                (dst_a, src_b),
+            ):
+                if _within(a, b) or _within(b, a):
+                    raise MigrationError(
+                        f"Batch items overlap: {src_a} -> {dst_a} "
+                        f"and {src_b} -> {dst_b}"
+                    )
+
+
+def plan_batch(
+    mapping: Sequence[Tuple[Path, Path]],
+    links: Mapping[Path, Sequence[Path]],
+    *,
+    data_root: Optional[Path] = None,
+    link_mode: str = "relative",
+    conflict_strategy: str = "abort",
+    verify: str = "metadata",
+    verify_confidence: float = DEFAULT_CONFIDENCE,
+    summary_cache: Optional[SummaryCache] = None,
+) -> List[MigrationPlan]:
+    """Plan every ``(current_target, new_target)`` pair against one scan.
+
+    ``links`` maps each current target to the symlinks found for it (targets
+    without links just move). Relative paths on either side are taken
+    relative to ``data_root``. Besides each item's own checks, the free
+    space of every destination device is checked against the sum of all
+    cross-device copies headed there.
+    """
+
+    root = Path(data_root).resolve() if data_root else None
+    pairs: List[Tuple[Path, Path]] = []
+    for src, dst in mapping:
+        src = Path(src).expanduser()
+        if not src.is_absolute() and root is not None:
+            src = root / src
+        pairs.append((src.resolve(), _resolve_new_target(Path(dst), root)))
+    _check_overlaps(pairs)
+    cache = summary_cache if summary_cache is not None else SummaryCache()
+    plans: List[MigrationPlan] = []
+    for src, dst in pairs:
+        if not src.is_dir():
+            raise MigrationError(f"Not a directory: {src}")
+        try:
+            plans.append(
+                plan_migration(
+                    src,
+                    dst,
+                    links.get(src, []),
+                    link_mode=link_mode,
+                    conflict_strategy=conflict_strategy,
+                    verify=verify,
+                    verify_confidence=verify_confidence,
+                    summary_cache=cache,
+                )
+            )
+        except MigrationError as e:
+            raise MigrationError(f"{src} -> {dst}: {e}") from e
+    needs = [
+        (p.new_target, p.source_bytes or 0, p.source_files or 0)
+        for p in plans
+        if needs_copy(p) and not p.resuming
+    ]
+    if len(needs) > 1:
+        report = check_capacity(needs)
+        if not report.ok:
+            raise MigrationError(
+                "Not enough space for the whole batch: "
+                + "; ".join(report.shortfalls())
+            )
+    return plans
+
+
+def run_batch(
+    plans: Sequence[MigrationPlan],
+    *,
+    per_device: int = DEFAULT_PER_DEVICE,
+    on_result: Optional[Callable[[BatchResult], None]] = None,
+    journal_dir: Optional[Path] = None,
+) -> List[BatchResult]:
+    """Execute ``plans``: renames inline, cross-device copies concurrently.
+
+    A failing item does not stop the others. ``on_result`` is called once per
+    item as it finishes (never concurrently). Results come back in the
+    order of ``plans``. With ``journal_dir``, each item writes its own
+    rollback journal there (see :func:`journal_path`).
+    """
+
+    if per_device < 1:
+        raise ValueError("per_device must be at least 1")
+    results: List[Optional[BatchResult]] = [None] * len(plans)
+    result_lock = threading.Lock()
+    slots: Dict[int, threading.Semaphore] = {}
+
+    def _run(index: int, devices: List[int]) -> None:
+        plan = plans[index]
+        result = BatchResult(plan)
+        for dev in devices:
+            slots[dev].acquire()
+        start = time.perf_counter()
+        try:
+            copied: List[CopyStats] = []
+            journal = None
+            if journal_dir is not None:
+                journal = journal_path(journal_dir, index, plan)
+                result.journal = journal
+            execute_plan(plan, on_copied=copied.append, journal=journal)
+            if copied:
+                result.copied = copied[-1]
+        except (MigrationError, OSError) as e:
+            result.error = str(e)
+        finally:
+            result.seconds = time.perf_counter() - start
+            for dev in reversed(devices):
+                slots[dev].release()
+        with result_lock:
+            results[index] = result
+            if on_result is not None:
+                on_result(result)
+
+    copies: List[Tuple[int, List[int]]] = []
+    renames: List[int] = []
+    for index, plan in enumerate(plans):
+        if needs_copy(plan):
+            devices = _devices(plan)
+            for dev in devices:
+                slots.setdefault(dev, threading.Semaphore(per_device))
+            copies.append((index, devices))
+        else:
+            renames.append(index)
+
+    workers = min(len(copies), per_device * max(1, len(slots)))
+    if workers:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_run, index, devices) for index, devices in copies]
+            for index in renames:
+                _run(index, [])
+            for future in futures:
+                future.result()
+    else:
+        for index in renames:
+            _run(index, [])
+    return [r for r in results if r is not None]
+
+
+__all__ = [
+    "BatchResult",
+    "DEFAULT_PER_DEVICE",
+    "journal_path",
+    "needs_copy",
+    "plan_batch",
+    "run_batch",
+]
@@ -0,0 +1,851 @@
+"""Cross-device copy engine used when a directory cannot simply be renamed.
+
+Regular files are copied on a thread pool with kernel-side transfers
+(``os.copy_file_range`` first, then ``os.sendfile``) and fall back to a plain
+read/write loop. Where the filesystem supports reflinks (``FICLONE`` on
+btrfs, XFS and friends) files are cloned instead, so the copy shares extents
+with the source until either side is modified; support is probed once per
+pair of devices and cached. When the caller asks for digests, each file is
+hashed from the same buffers it is copied with, so a full content check
+afterwards only has to read the destination. Metadata handling mirrors ``shutil.copytree(symlinks=True)``:
+symlinks are recreated verbatim and every file, link and directory gets
+``shutil.copystat``.
+"""
+
+from __future__ import annotations
+
+import ctypes
+import errno
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import suppress
+from dataclasses import dataclass, field
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from . import throttle
+from .progress import ProgressTracker
+
+try:  # pragma: no cover - not available on Windows
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None  # type: ignore[assignment]
+
+DEFAULT_COPY_WORKERS = 8
+# Largest single kernel transfer request; the loops repeat until EOF.
+_CHUNK = 1 << 30
+_BUFFER = 1 << 20
+# Transfer size while progress is tracked, so large files report as they go.
+_PROGRESS_CHUNK = 64 << 20
+# Must match the default of ``diff.file_digest``, which re-hashes destinations.
+DIGEST_ALGORITHM = "sha256"
+# errnos meaning "this transfer primitive is not usable here", not a real IO error.
+_FALLBACK_ERRNOS = {
+    errno.EXDEV,
+    errno.ENOSYS,
+    errno.EINVAL,
+    errno.EBADF,
+    errno.EOPNOTSUPP,
+    getattr(errno, "ENOTSUP", errno.EOPNOTSUPP),
+    errno.ENOTTY,
+}
+# os.link failures that mean "use a copy for this file" (bind mounts, link
+# count limits, fs.protected_hardlinks).
+_LINK_FALLBACK_ERRNOS = {errno.EXDEV, errno.EMLINK, errno.EPERM, errno.EACCES}
+# Linux _IOW(0x94, 9, int): share all of the source file's extents with the
+# destination file.
+FICLONE = 0x40049409
+# (source st_dev, destination st_dev) -> whether FICLONE works between them.
+_reflink_support: Dict[Tuple[int, int], bool] = {}
+_reflink_lock = threading.Lock()
+# Directory entries scanned for a file to probe reflinks with.
+_PROBE_SCAN_LIMIT = 1000
+
+
+@dataclass
+class CopyStats:
+    """Counters for one copy run; safe to update from worker threads."""
+
+    files: int = 0
+    bytes: int = 0
+    dirs: int = 0
+    symlinks: int = 0
+    skipped: int = 0
+    seconds: float = 0.0
+    strategies: Dict[str, int] = field(default_factory=dict)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def add_file(self, size: int, strategy: str) -> None:
+        with self._lock:
+            self.files += 1
+            self.bytes += size
+            self.strategies[strategy] = self.strategies.get(strategy, 0) + 1
+
+    def merge(self, other: "CopyStats") -> None:
+        """Fold another run's counters into this one (times add up)."""
+
+        with self._lock:
+            self.files += other.files
+            self.bytes += other.bytes
+            self.dirs += other.dirs
+            self.symlinks += other.symlinks
+            self.skipped += other.skipped
+            self.seconds += other.seconds
+            for key, count in other.strategies.items():
+                self.strategies[key] = self.strategies.get(key, 0) + count
+
+    @property
+    def throughput(self) -> float:
+        """Bytes per second over the whole run."""
+
+        return self.bytes / self.seconds if self.seconds > 0 else 0.0
+
+    def describe(self) -> str:
+        rate = self.throughput / (1024 * 1024)
+        used = ",".join(f"{k}={v}" for k, v in sorted(self.strategies.items()))
+        return (
+            f"copied files={self.files} bytes={self.bytes} dirs={self.dirs} "
+            f"symlinks={self.symlinks} skipped={self.skipped} "
+            f"in {self.seconds:.2f}s ({rate:.1f} MiB/s)"
+            + (f" via {used}" if used else "")
+        )
+
+
+class CopyJournal:
+    """Per-migration manifest of files already copied to the destination.
+
+    Lives next to the destination as ``.<name>.slm-copy-journal``. Completed
+    files are buffered and only appended once their data is on disk
+    (``syncfs`` of the destination filesystem on Linux, else an ``fsync``
+    per file and directory), and the journal itself is fsynced, so every
+    journaled file is durable; a crash merely loses the last unflushed
+    batch, which is copied again on resume.
+    """
+
+    VERSION = 1
+
+    def __init__(
+        self,
+        path: Path,
+        source: Path,
+        destination: Path,
+        *,
+        batch_files: int = 1000,
+        batch_seconds: float = 5.0,
+    ) -> None:
+        self.path = Path(path)
+        self.source = Path(source)
+        self.destination = Path(destination)
+        # rel -> (size, mtime_ns, inode); inode is None in older journals.
+        self.done: Dict[str, Tuple[int, int, Optional[int]]] = {}
+        self._pending: List[Tuple[str, int, int, int]] = []
+        self._batch_files = batch_files
+        self._batch_seconds = batch_seconds
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        self._fh = None
+
+    @staticmethod
+    def path_for(destination: Path) -> Path:
+        destination = Path(destination)
+        return destination.with_name(f".{destination.name}.slm-copy-journal")
+
+    @classmethod
+    def read_source(cls, path: Path) -> Optional[Path]:
+        """Return the source recorded in an existing journal, if readable."""
+
+        try:
+            with Path(path).open("r", encoding="utf-8") as fh:
+                header = json.loads(fh.readline())
+        except (OSError, ValueError):
+            return None
+        if not isinstance(header, dict) or header.get("version") != cls.VERSION:
+            return None
+        return Path(header["source"]) if header.get("source") else None
+
+    @classmethod
+    def open(cls, source: Path, destination: Path) -> "CopyJournal":
+        """Create a journal, or load the one left by an interrupted copy."""
+
+        journal = cls(cls.path_for(destination), source, destination)
+        if journal.path.exists():
+            recorded = cls.read_source(journal.path)
+            if recorded != journal.source:
+                raise ValueError(
+                    f"Copy journal {journal.path} belongs to {recorded}, not {source}"
+                )
+            with journal.path.open("r", encoding="utf-8") as fh:
+                fh.readline()
+                for line in fh:
+                    try:
+                        rec = json.loads(line)
+                        ino = rec.get("i")
+                        journal.done[rec["p"]] = (
+                            int(rec["s"]),
+                            int(rec["m"]),
+                            None if ino is None else int(ino),
+                        )
+                    except (ValueError, KeyError, TypeError):
+                        # A torn last line from a crash; that file is redone.
+                        continue
+            journal._fh = journal.path.open("a", encoding="utf-8")
+        else:
+            journal.path.parent.mkdir(parents=True, exist_ok=True)
+            journal._fh = journal.path.open("w", encoding="utf-8")
+            header = {
+                "version": cls.VERSION,
+                "source": str(journal.source),
+                "destination": str(journal.destination),
+            }
+            journal._fh.write(json.dumps(header, ensure_ascii=False) + "\n")
+            journal._fh.flush()
+        return journal
+
+    def is_done(self, rel: str, st: os.stat_result, dst: str) -> bool:
+        """True when ``rel`` was journaled unchanged (size, mtime, inode) and still exists.
+
+        A changed inode means the file was replaced (e.g. saved via rename)
+        even if size and mtime happen to match.
+        """
+
+        entry = self.done.get(rel)
+        if entry is None or entry[:2] != (st.st_size, st.st_mtime_ns):
+            return False
+        if entry[2] is not None and entry[2] != st.st_ino:
+            return False
+        try:
+            return os.lstat(dst).st_size == st.st_size
+        except OSError:
+            return False
+
+    def record(self, rel: str, st: os.stat_result) -> None:
+        with self._lock:
+            self._pending.append((rel, st.st_size, st.st_mtime_ns, st.st_ino))
+            if (
+                len(self._pending) >= self._batch_files
+                or time.monotonic() - self._last_flush >= self._batch_seconds
+            ):
+                self._flush_locked()
+
+    def _flush_locked(self) -> None:
+        if not self._pending or self._fh is None:
+            return
+        for rel in self._sync_pending_locked():
+            entry = self._pending[rel]
+            record = {"p": entry[0], "s": entry[1], "m": entry[2], "i": entry[3]}
+            self._fh.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._fh.flush()
+        os.fsync(self._fh.fileno())
+        self._pending.clear()
+        self._last_flush = time.monotonic()
+
+    def _sync_pending_locked(self) -> List[int]:
+        """Make the pending files durable; returns the indexes that are.
+
+        Only the destination filesystem is flushed, never the whole host. A
+        file that can no longer be opened is left out and copied again on
+        resume.
+        """
+
+        if _syncfs(self.destination):
+            return list(range(len(self._pending)))
+        durable: List[int] = []
+        parents = set()
+        for index, (rel, *_) in enumerate(self._pending):
+            path = os.path.join(self.destination, rel)
+            try:
+                _fsync_path(path)
+            except OSError:
+                continue
+            durable.append(index)
+            parents.add(os.path.dirname(path))
+        for parent in parents:
+            with suppress(OSError):  # directories cannot be opened on Windows
+                _fsync_path(parent)
+        return durable
+
+    def close(self) -> None:
+        with self._lock:
+            self._flush_locked()
+            if self._fh is not None:
+                self._fh.close()
+                self._fh = None
+
+    def remove(self) -> None:
+        self.close()
+        with suppress(FileNotFoundError):
+            self.path.unlink()
+
+
+def _fsync_path(path: str) -> None:
+    fd = os.open(path, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+@lru_cache(maxsize=None)
+def _syncfs_function() -> Optional[Any]:
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        fn = ctypes.CDLL(None, use_errno=True).syncfs
+    except (AttributeError, OSError):
+        return None
+    fn.argtypes = [ctypes.c_int]
+    fn.restype = ctypes.c_int
+    return fn
+
+
+def _syncfs(path: Path) -> bool:
+    """``syncfs(2)`` the filesystem holding ``path``; ``False`` if not possible."""
+
+    fn = _syncfs_function()
+    if fn is None:
+        return False
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return False
+    try:
+        return fn(fd) == 0
+    finally:
+        os.close(fd)
+
+
+def _copy_data(
+    fsrc: int, fdst: int, progress: Optional[ProgressTracker] = None
+) -> Tuple[int, str]:
+    """Copy all bytes from ``fsrc`` to ``fdst``; returns (bytes, strategy).
+
+    Under an installed throttle the transfers shrink to
+    :meth:`Throttle.chunk_size` and each one is charged to the byte cap.
+    Each transfer is also added to ``progress``.
+    """
+
+    copied = 0
+    limiter = throttle.current()
+    chunk = limiter.chunk_size(_CHUNK) if limiter is not None else _CHUNK
+    if progress is not None:
+        chunk = min(chunk, _PROGRESS_CHUNK)
+    buffer = min(chunk, _BUFFER)
+    if hasattr(os, "copy_file_range"):
+        try:
+            while True:
+                n = os.copy_file_range(fsrc, fdst, chunk)
+                if n == 0:
+                    return copied, "copy_file_range"
+                copied += n
+                throttle.consume(n)
+                if progress is not None:
+                    progress.add(n)
+        except OSError as exc:
+            if copied or exc.errno not in _FALLBACK_ERRNOS:
+                raise
+    if hasattr(os, "sendfile") and sys.platform.startswith("linux"):
+        try:
+            while True:
+                n = os.sendfile(fdst, fsrc, copied, chunk)
+                if n == 0:
+                    return copied, "sendfile"
+                copied += n
+                throttle.consume(n)
+                if progress is not None:
+                    progress.add(n)
+        except OSError as exc:
+            if copied or exc.errno not in _FALLBACK_ERRNOS:
+                raise
+    while True:
+        buf = os.read(fsrc, buffer)
+        if not buf:
+            return copied, "readwrite"
+        view = memoryview(buf)
+        while view:
+            written = os.write(fdst, view)
+            view = view[written:]
+        copied += len(buf)
+        throttle.consume(len(buf))
+        if progress is not None:
+            progress.add(len(buf))
+
+
+def copy_file(
+    src: str, dst: str, progress: Optional[ProgressTracker] = None
+) -> Tuple[int, str]:
+    """Copy one regular file with its metadata, like ``shutil.copy2``.
+
+    Bytes are added to ``progress`` as they are transferred; the caller
+    counts the file itself.
+    """
+
+    fsrc = os.open(src, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+    try:
+        fdst = os.open(
+            dst,
+            os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0),
+            0o666,
+        )
+        try:
+            result = _copy_data(fsrc, fdst, progress)
+        finally:
+            os.close(fdst)
+    finally:
+        os.close(fsrc)
+    shutil.copystat(src, dst)
+    return result
+
+
+def copy_file_fanout(
+    src: str,
+    dsts: Sequence[str],
+    digest: Optional["hashlib._Hash"] = None,
+    progress: Optional[ProgressTracker] = None,
+) -> Tuple[int, str]:
+    """Read ``src`` once and write it to every path in ``dsts`` (with metadata).
+
+    ``digest`` is updated with every block read, so the caller gets the
+    source's content hash without a second read. ``progress`` counts bytes
+    read, once per block.
+    """
+
+    flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0)
+    fsrc = os.open(src, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+    fds: List[int] = []
+    copied = 0
+    limiter = throttle.current()
+    buffer = limiter.chunk_size(_BUFFER) if limiter is not None else _BUFFER
+    try:
+        for d in dsts:
+            fds.append(os.open(d, flags, 0o666))
+        while True:
+            buf = os.read(fsrc, buffer)
+            if not buf:
+                break
+            if digest is not None:
+                digest.update(buf)
+            for fd in fds:
+                view = memoryview(buf)
+                while view:
+                    written = os.write(fd, view)
+                    view = view[written:]
+            copied += len(buf)
+            throttle.consume(len(buf) * len(fds))
+            if progress is not None:
+                progress.add(len(buf))
+    finally:
+        for fd in fds:
+            os.close(fd)
+        os.close(fsrc)
+    for d in dsts:
+        shutil.copystat(src, d)
+    return copied, "fanout"
+
+
+def _clone_fd(fsrc: int, fdst: int) -> None:
+    if fcntl is None:
+        raise OSError(errno.EOPNOTSUPP, "reflinks are not supported on this platform")
+    fcntl.ioctl(fdst, FICLONE, fsrc)
+
+
+def _sample_file(root: str) -> Optional[str]:
+    """A regular file at or under ``root``, found within a bounded scan."""
+
+    if os.path.isfile(root):
+        return root
+    pending = [root]
+    seen = 0
+    while pending and seen < _PROBE_SCAN_LIMIT:
+        try:
+            with os.scandir(pending.pop(0)) as it:
+                for entry in it:
+                    seen += 1
+                    if entry.is_file(follow_symlinks=False):
+                        return entry.path
+                    if entry.is_dir(follow_symlinks=False):
+                        pending.append(entry.path)
+        except OSError:
+            continue
+    return None
+
+
+def _probe_reflink(src_dir: str, dst_dir: str) -> Optional[bool]:
+    """Clone an existing file under ``src_dir`` into a scratch file in ``dst_dir``.
+
+    The source side is only opened for reading, so read-only sources can be
+    probed and the source tree is left untouched. ``None`` means the probe
+    could not run (no readable file, or ``dst_dir`` is not writable).
+    """
+
+    sample = _sample_file(src_dir)
+    if sample is None:
+        return None
+    try:
+        fd_src = os.open(sample, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+    except OSError:
+        return None
+    try:
+        try:
+            fd_dst, name = tempfile.mkstemp(prefix=".slm-reflink-probe-", dir=dst_dir)
+        except OSError:
+            return None
+        try:
+            _clone_fd(fd_src, fd_dst)
+            return True
+        except OSError:
+            return False
+        finally:
+            os.close(fd_dst)
+            with suppress(OSError):
+                os.unlink(name)
+    finally:
+        os.close(fd_src)
+
+
+def _reflink_key(src_dir: Path, dst_dir: Path) -> Optional[Tuple[int, int]]:
+    try:
+        return (os.stat(src_dir).st_dev, os.stat(dst_dir).st_dev)
+    except OSError:
+        return None
+
+
+def reflink_known(src_dir: Path, dst_dir: Path) -> Optional[bool]:
+    """The cached :func:`reflink_supported` answer, or ``None`` if not probed yet.
+
+    Never touches either directory, so planning and dry runs can use it.
+    """
+
+    key = _reflink_key(src_dir, dst_dir)
+    if key is None:
+        return False
+    with _reflink_lock:
+        return _reflink_support.get(key)
+
+
+def reflink_supported(src_dir: Path, dst_dir: Path) -> bool:
+    """Whether files under ``src_dir`` can be reflinked into ``dst_dir``.
+
+    Both directories must exist. The first time a pair of devices is seen, a
+    file under ``src_dir`` is cloned into a scratch file in ``dst_dir``; the
+    answer is cached for the process. Call it only when about to copy:
+    planning uses :func:`reflink_known`.
+    """
+
+    key = _reflink_key(src_dir, dst_dir)
+    if key is None:
+        return False
+    with _reflink_lock:
+        cached = _reflink_support.get(key)
+    if cached is not None:
+        return cached
+    supported = _probe_reflink(str(src_dir), str(dst_dir))
+    if supported is None:
+        return False  # inconclusive: probe again next time
+    with _reflink_lock:
+        _reflink_support[key] = supported
+    return supported
+
+
+def clone_file(src: str, dst: str) -> Tuple[int, str]:
+    """Reflink ``src`` to ``dst`` (copy-on-write); copy instead if cloning fails."""
+
+    fsrc = os.open(src, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+    try:
+        fdst = os.open(
+            dst,
+            os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0),
+            0o666,
+        )
+        try:
+            _clone_fd(fsrc, fdst)
+            size = os.fstat(fsrc).st_size
+        except OSError as exc:
+            if exc.errno not in _FALLBACK_ERRNOS:
+                raise
+            size = -1
+        finally:
+            os.close(fdst)
+    finally:
+        os.close(fsrc)
+    if size < 0:
+        return copy_file(src, dst)
+    shutil.copystat(src, dst)
+    return size, "reflink"
+
+
+def link_or_copy_file(src: str, dst: str) -> Tuple[int, str]:
+    """Hard-link ``dst`` to ``src``; copy instead when the kernel refuses the link."""
+
+    try:
+        os.link(src, dst, follow_symlinks=False)
+    except OSError as exc:
+        if exc.errno not in _LINK_FALLBACK_ERRNOS:
+            raise
+        return copy_file(src, dst)
+    return os.lstat(src).st_size, "hardlink"
+
+
+def _remove_any(path: str) -> None:
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path)
+    else:
+        os.unlink(path)
+
+
+def copy_tree(
+    src: Path,
+    dst: Path,
+    *,
+    max_workers: int = DEFAULT_COPY_WORKERS,
+    journal: Optional[CopyJournal] = None,
+    reflink: Optional[bool] = None,
+    digests: Optional[Dict[str, str]] = None,
+    progress: Optional[ProgressTracker] = None,
+) -> CopyStats:
+    """Copy ``src`` to the new directory ``dst`` using the concurrent engine.
+
+    Directories are created by the walking thread in order; file copies run
+    on ``max_workers`` threads with a bounded number in flight. Errors are
+    collected and raised together as ``shutil.Error`` after the walk, the way
+    ``shutil.copytree`` reports them.
+
+    With a ``journal``, ``dst`` may already hold a partial copy: files the
+    journal lists with unchanged size, mtime and inode are skipped,
+    everything else is (re)copied and journaled as it completes.
+
+    ``reflink=None`` clones files when :func:`reflink_supported` says the
+    two locations allow it; ``True``/``False`` force the choice.
+
+    With a ``digests`` dict, every file copied through userspace is hashed
+    while it is copied and ``digests[relpath]`` receives the hex digest
+    (``DIGEST_ALGORITHM``). Cloned and journal-skipped files get no entry.
+
+    ``progress`` is advanced with the bytes of every file as it is copied
+    (cloned or skipped files count in one step) and by one per finished file.
+    """
+
+    src, dst = Path(src), Path(dst)
+    if reflink is None:
+        reflink = reflink_supported(src, _nearest_dir(dst))
+    return _replicate_tree(
+        src,
+        [dst],
+        max_workers,
+        journal,
+        reflink=reflink,
+        digests=digests,
+        progress=progress,
+    )
+
+
+def fan_out_copy_tree(
+    src: Path,
+    dsts: Sequence[Path],
+    *,
+    max_workers: int = DEFAULT_COPY_WORKERS,
+    reflink: Optional[bool] = None,
+    digests: Optional[Dict[str, str]] = None,
+    progress: Optional[ProgressTracker] = None,
+) -> CopyStats:
+    """Copy ``src`` into several new directories while reading it only once.
+
+    ``stats.bytes`` counts bytes read from the source; each destination
+    receives that many bytes. When every destination can take reflinks
+    (``reflink=None`` probes), each file is cloned into every destination
+    instead and nothing is read at all. ``digests`` and ``progress`` work
+    as in :func:`copy_tree`; progress counts each source file once.
+    """
+
+    if not dsts:
+        return CopyStats()
+    src = Path(src)
+    targets = [Path(d) for d in dsts]
+    if reflink is None:
+        reflink = all(reflink_supported(src, _nearest_dir(d)) for d in targets)
+    return _replicate_tree(
+        src,
+        targets,
+        max_workers,
+        None,
+        reflink=reflink,
+        digests=digests,
+        progress=progress,
+    )
+
+
+def hardlink_tree(
+    src: Path,
+    dst: Path,
+    *,
+    max_workers: int = DEFAULT_COPY_WORKERS,
+    progress: Optional[ProgressTracker] = None,
+) -> CopyStats:
+    """Build ``dst`` as a directory tree whose files are hard links into ``src``.
+
+    Directories and symlinks are real new entries; regular files share inodes
+    with the source, so writing to one shows up in the other. Files that
+    cannot be linked are copied (see ``stats.strategies``).
+    """
+
+    return _replicate_tree(
+        Path(src), [Path(dst)], max_workers, None, hardlink=True, progress=progress
+    )
+
+
+def _nearest_dir(path: Path) -> Path:
+    """``path`` if it is a directory, else its nearest existing ancestor."""
+
+    path = Path(path)
+    while not path.is_dir() and path != path.parent:
+        path = path.parent
+    return path
+
+
+def _replicate_tree(
+    src: Path,
+    dsts: List[Path],
+    max_workers: int,
+    journal: Optional[CopyJournal],
+    *,
+    hardlink: bool = False,
+    reflink: bool = False,
+    digests: Optional[Dict[str, str]] = None,
+    progress: Optional[ProgressTracker] = None,
+) -> CopyStats:
+    stats = CopyStats()
+    errors: List[Tuple[str, str, str]] = []
+    errors_lock = threading.Lock()
+    started = time.monotonic()
+    slots = threading.BoundedSemaphore(max(1, max_workers) * 4)
+    single = len(dsts) == 1
+
+    def _error(s: str, d: str, exc: object) -> None:
+        with errors_lock:
+            errors.append((s, d, str(exc)))
+
+    def _copy_one(s: str, ds: List[str], rel: str, st: os.stat_result) -> None:
+        try:
+            throttle.consume(files=len(ds))
+            # Bytes the streaming copies already added to ``progress``.
+            streamed = 0
+            if progress is not None:
+                progress.current = s
+            if hardlink:
+                size, strategy = link_or_copy_file(s, ds[0])
+            elif reflink:
+                for d in ds:
+                    size, strategy = clone_file(s, d)
+            elif digests is not None:
+                h = hashlib.new(DIGEST_ALGORITHM)
+                size, _ = copy_file_fanout(s, ds, h, progress)
+                streamed = size
+                strategy = "hashed"
+                digests[rel] = h.hexdigest()
+            elif single:
+                size, strategy = copy_file(s, ds[0], progress)
+                streamed = size
+            else:
+                size, strategy = copy_file_fanout(s, ds, progress=progress)
+                streamed = size
+            stats.add_file(size, strategy)
+            if progress is not None:
+                progress.add(size - streamed, files=1)
+            if journal is not None:
+                journal.record(rel, st)
+        except Exception as exc:
+            _error(s, ds[0], exc)
+        finally:
+            slots.release()
+
+    # (src_dir, dst_dirs) in creation order; copystat runs in reverse so a
+    # parent's mtime is set after its children have been written.
+    root = str(src)
+    top = [str(d) for d in dsts]
+    created: List[Tuple[str, List[str]]] = []
+    try:
+        with ThreadPoolExecutor(
+            max_workers=max(1, max_workers), thread_name_prefix="slm-copy"
+        ) as pool:
+            for d in top:
+                os.makedirs(d, exist_ok=journal is not None)
+            created.append((root, top))
+            stack = [(root, top)]
+            while stack:
+                sdir, ddirs = stack.pop()
+                try:
+                    with os.scandir(sdir) as it:
+                        entries = list(it)
+                except OSError as exc:
+                    _error(sdir, ddirs[0], exc)
+                    continue
+                for entry in entries:
+                    s = entry.path
+                    ds = [os.path.join(ddir, entry.name) for ddir in ddirs]
+                    try:
+                        if entry.is_symlink():
+                            linkto = os.readlink(s)
+                            for d in ds:
+                                if journal is not None and os.path.lexists(d):
+                                    _remove_any(d)
+                                os.symlink(linkto, d)
+                                shutil.copystat(s, d, follow_symlinks=False)
+                            stats.symlinks += 1
+                        elif entry.is_dir(follow_symlinks=False):
+                            for d in ds:
+                                if journal is None or not os.path.isdir(d):
+                                    os.mkdir(d)
+                            stats.dirs += 1
+                            created.append((s, ds))
+                            stack.append((s, ds))
+                        elif entry.is_file(follow_symlinks=False):
+                            st = entry.stat(follow_symlinks=False)
+                            rel = os.path.relpath(s, root)
+                            if journal is not None and journal.is_done(rel, st, ds[0]):
+                                stats.skipped += 1
+                                if progress is not None:
+                                    progress.add(st.st_size, files=1)
+                                continue
+                            slots.acquire()
+                            pool.submit(_copy_one, s, ds, rel, st)
+                        else:
+                            _error(s, ds[0], "special file not copied")
+                    except OSError as exc:
+                        _error(s, ds[0], exc)
+        for s, ds in reversed(created):
+            for d in ds:
+                try:
+                    shutil.copystat(s, d)
+                except OSError as exc:
+                    _error(s, d, exc)
+    finally:
+        if journal is not None:
+            journal.close()
+    stats.seconds = time.monotonic() - started
+    if errors:
+        raise shutil.Error(errors)
+    return stats
+
+
+__all__ = [
+    "CopyJournal",
+    "CopyStats",
+    "DEFAULT_COPY_WORKERS",
+    "DIGEST_ALGORITHM",
+    "clone_file",
+    "copy_file",
+    "copy_file_fanout",
+    "copy_tree",
+    "fan_out_copy_tree",
+    "hardlink_tree",
+    "link_or_copy_file",
+    "reflink_known",
+    "reflink_supported",
+]
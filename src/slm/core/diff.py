@@ -0,0 +1,155 @@
+"""Streaming tree comparison used by ``lk diff`` and post-copy verification."""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import stat
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+
+HASH_CHUNK = 1024 * 1024
+
+
+@dataclass(frozen=True)
+class DiffEntry:
+    """One difference between tree ``a`` and tree ``b``.
+
+    Attributes:
+        kind: ``added`` (only in b), ``removed`` (only in a) or ``changed``.
+        path: Path relative to both roots, using ``/`` separators.
+        reason: For ``changed`` entries: ``type``, ``size``, ``mtime``,
+            ``hash``, ``link`` or (from merges) ``appeared``; ``None``
+            otherwise.
+    """
+
+    kind: str
+    path: str
+    reason: Optional[str] = None
+
+    def __str__(self) -> str:
+        marker = {"added": "+", "removed": "-", "changed": "~"}[self.kind]
+        suffix = f" ({self.reason})" if self.reason else ""
+        return f"{marker} {self.path}{suffix}"
+
+
+def _list_sorted(d: str) -> List[Tuple[str, os.stat_result]]:
+    entries: List[Tuple[str, os.stat_result]] = []
+    try:
+        with os.scandir(d) as it:
+            for entry in it:
+                try:
+                    entries.append((entry.name, entry.stat(follow_symlinks=False)))
+                except FileNotFoundError:
+                    continue
+    except (FileNotFoundError, NotADirectoryError):
+        return []
+    entries.sort(key=lambda e: e[0])
+    return entries
+
+
+def _kind(st: os.stat_result) -> str:
+    if stat.S_ISLNK(st.st_mode):
+        return "link"
+    if stat.S_ISDIR(st.st_mode):
+        return "dir"
+    if stat.S_ISREG(st.st_mode):
+        return "file"
+    return "other"
+
+
+def file_digest(path: str, algorithm: str = "sha256") -> str:
+    h = hashlib.new(algorithm)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _compare(
+    a_path: str,
+    b_path: str,
+    a_st: os.stat_result,
+    b_st: os.stat_result,
+    compare_hash: bool,
+    mtime_window: float,
+) -> Optional[str]:
+    a_kind, b_kind = _kind(a_st), _kind(b_st)
+    if a_kind != b_kind:
+        return "type"
+    if a_kind == "link":
+        return None if os.readlink(a_path) == os.readlink(b_path) else "link"
+    if a_kind != "file":
+        return None
+    if a_st.st_size != b_st.st_size:
+        return "size"
+    if abs(a_st.st_mtime_ns - b_st.st_mtime_ns) > mtime_window * 1e9:
+        return "mtime"
+    if compare_hash and file_digest(a_path) != file_digest(b_path):
+        return "hash"
+    return None
+
+
+def iter_tree_diff(
+    a: Path,
+    b: Path,
+    *,
+    compare_hash: bool = False,
+    mtime_window: float = 0.0,
+) -> Iterator[DiffEntry]:
+    """Yield differences between two trees as a sorted merge join.
+
+    Both sides are listed one directory at a time in name order, so memory is
+    bounded by directory width times depth rather than by tree size. A
+    directory present on only one side is reported once, not per file.
+    Directory metadata is not compared.
+    """
+
+    stack: List[str] = [""]
+    root_a, root_b = str(a), str(b)
+    while stack:
+        rel = stack.pop()
+        da = os.path.join(root_a, rel) if rel else root_a
+        db = os.path.join(root_b, rel) if rel else root_b
+        left = _list_sorted(da)
+        right = _list_sorted(db)
+        subdirs: List[str] = []
+        i = j = 0
+        while i < len(left) or j < len(right):
+            if j >= len(right) or (i < len(left) and left[i][0] < right[j][0]):
+                name = left[i][0]
+                yield DiffEntry("removed", _join(rel, name))
+                i += 1
+                continue
+            if i >= len(left) or right[j][0] < left[i][0]:
+                name = right[j][0]
+                yield DiffEntry("added", _join(rel, name))
+                j += 1
+                continue
+            name, a_st = left[i]
+            b_st = right[j][1]
+            i += 1
+            j += 1
+            child = _join(rel, name)
+            reason = _compare(
+                os.path.join(da, name),
+                os.path.join(db, name),
+                a_st,
+                b_st,
+                compare_hash,
+                mtime_window,
+            )
+            if reason:
+                yield DiffEntry("changed", child, reason)
+            elif stat.S_ISDIR(a_st.st_mode):
+                subdirs.append(child)
+        # Reverse so the next pop continues in name order.
+        stack.extend(reversed(subdirs))
+
+
+def _join(rel: str, name: str) -> str:
+    return f"{rel}/{name}" if rel else name
+
+
+__all__ = ["DiffEntry", "file_digest", "iter_tree_diff"]
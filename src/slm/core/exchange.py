@@ -0,0 +1,104 @@
+"""Atomic exchange of two paths with Linux ``renameat2(RENAME_EXCHANGE)``.
+
+Both paths must exist and live on the same filesystem; after the call each
+name refers to what the other did, with no moment where either is missing.
+The call is made through ctypes (glibc 2.28+). Elsewhere
+:func:`rename_exchange` raises ``ENOSYS`` and callers fall back to two
+ordinary renames. :func:`rename_noreplace` uses the same call with
+``RENAME_NOREPLACE``: a rename that fails instead of replacing the target.
+"""
+
+from __future__ import annotations
+
+import ctypes
+import errno
+import os
+import sys
+import threading
+from pathlib import Path
+from typing import Any, Optional
+
+RENAME_NOREPLACE = 1 << 0
+RENAME_EXCHANGE = 1 << 1
+_AT_FDCWD = -100
+# errno values meaning "this kernel/filesystem cannot exchange", as opposed
+# to a real failure such as a missing path.
+UNSUPPORTED_ERRNOS = frozenset(
+    {errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.ENOTSUP}
+)
+
+_lock = threading.Lock()
+_renameat2: Optional[Any] = None
+_looked_up = False
+
+
+def _function() -> Optional[Any]:
+    global _renameat2, _looked_up
+    with _lock:
+        if not _looked_up:
+            _looked_up = True
+            if sys.platform.startswith("linux"):
+                try:
+                    fn = ctypes.CDLL(None, use_errno=True).renameat2
+                except (AttributeError, OSError):
+                    fn = None
+                if fn is not None:
+                    fn.argtypes = [
+                        ctypes.c_int,
+                        ctypes.c_char_p,
+                        ctypes.c_int,
+                        ctypes.c_char_p,
+                        ctypes.c_uint,
+                    ]
+                    fn.restype = ctypes.c_int
+                _renameat2 = fn
+        return _renameat2
+
+
+def exchange_supported() -> bool:
+    """Whether ``renameat2`` is callable here (the filesystem may still refuse)."""
+
+    return _function() is not None
+
+
+def rename_exchange(a: Path, b: Path) -> None:
+    """Atomically swap ``a`` and ``b``; raises ``OSError`` on failure.
+
+    ``errno`` is in :data:`UNSUPPORTED_ERRNOS` when the platform, kernel or
+    filesystem lacks the operation; nothing has changed in that case.
+    """
+
+    fn = _function()
+    if fn is None:
+        raise OSError(errno.ENOSYS, "renameat2 is not available", str(a), None, str(b))
+    if fn(_AT_FDCWD, os.fsencode(a), _AT_FDCWD, os.fsencode(b), RENAME_EXCHANGE):
+        err = ctypes.get_errno()
+        raise OSError(err, os.strerror(err), str(a), None, str(b))
+
+
+def rename_noreplace(src: Path, dst: Path) -> None:
+    """Rename ``src`` to ``dst`` unless ``dst`` exists (``EEXIST`` then).
+
+    ``errno`` is in :data:`UNSUPPORTED_ERRNOS` when the platform, kernel or
+    filesystem lacks the flag; nothing has changed in that case.
+    """
+
+    fn = _function()
+    if fn is None:
+        raise OSError(
+            errno.ENOSYS, "renameat2 is not available", str(src), None, str(dst)
+        )
+    flags = RENAME_NOREPLACE
+    if fn(_AT_FDCWD, os.fsencode(src), _AT_FDCWD, os.fsencode(dst), flags):
+        err = ctypes.get_errno()
+        raise OSError(err, os.strerror(err), str(src), None, str(dst))
+
+
+__all__ = [
+    "RENAME_EXCHANGE",
+    "RENAME_NOREPLACE",
+    "UNSUPPORTED_ERRNOS",
+    "exchange_supported",
+    "rename_exchange",
+    "rename_noreplace",
+]
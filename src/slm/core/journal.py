@@ -0,0 +1,274 @@
+"""Write-ahead journal of a migration, so a failed or unwanted one can be undone.
+
+Before anything changes, :meth:`MigrationJournal.begin` records every step
+the plan will take (backup, move, link updates) together with each link's
+current text, and fsyncs it; :meth:`MigrationJournal.begin_links` does the
+same for operations that only rewrite links, which may append further
+links with :meth:`MigrationJournal.add_links` before changing them, one
+batch at a time. A ``done`` marker is appended
+after each step completes; an atomic exchange is announced with an
+``exchange`` record first, since it moves two paths at once.
+``rollback_journal`` in :mod:`slm.core.migration` reads it back with
+:meth:`JournalState.read` and undoes the steps newest first, appending
+``undone`` markers so an interrupted rollback can simply be run again.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from .plan import MigrationPlan
+
+JOURNAL_VERSION = 1
+# Step names, in execution order.
+BACKUP = "backup"
+MOVE = "move"
+LINKS = "links"
+
+
+def _read_text(link: Path) -> Optional[str]:
+    try:
+        return os.readlink(link)
+    except OSError:
+        return None
+
+
+def _link_records(links: Iterable[Path]) -> Iterator[Dict[str, Any]]:
+    for link in links:
+        yield {"type": "link", "link": str(link), "old": _read_text(link)}
+
+
+def _append(path: Path, records: Iterable[Dict[str, Any]], mode: str = "a") -> None:
+    with Path(path).open(mode, encoding="utf-8") as fh:
+        for record in records:
+            fh.write(json.dumps(record, ensure_ascii=False) + "\n")
+        fh.flush()
+        os.fsync(fh.fileno())
+
+
+@dataclass
+class JournalState:
+    """What a journal says was planned, done and already undone.
+
+    Attributes:
+        path: The journal file.
+        current_target: Where the data was before the migration.
+        new_target: Where it was moved to.
+        backup_path: Where an existing destination was set aside, if anywhere.
+        link_mode: The plan's link mode.
+        merge: The move merged into an existing destination.
+        links: ``(link, text before the migration)``; ``None`` if it was not
+            a symlink then.
+        steps: Steps the migration intended, in order.
+        done: Steps with a completion marker.
+        undone: Steps a rollback already reverted.
+        exchange_source: (device, inode) of ``current_target`` when an atomic
+            exchange with ``new_target`` was about to start, if one was.
+        finished: The migration ran to the end.
+        rolled_back: A rollback ran to the end.
+    """
+
+    path: Path
+    current_target: Path
+    new_target: Path
+    backup_path: Optional[Path] = None
+    link_mode: str = "relative"
+    merge: bool = False
+    links: List[Tuple[Path, Optional[str]]] = field(default_factory=list)
+    steps: List[str] = field(default_factory=list)
+    done: Set[str] = field(default_factory=set)
+    undone: Set[str] = field(default_factory=set)
+    exchange_source: Optional[Tuple[int, int]] = None
+    finished: bool = False
+    rolled_back: bool = False
+
+    @classmethod
+    def read(cls, path: Path) -> "JournalState":
+        """Parse a journal; raises ``ValueError`` if it is not one."""
+
+        path = Path(path).expanduser()
+        with path.open("r", encoding="utf-8") as fh:
+            try:
+                header = json.loads(fh.readline())
+            except ValueError:
+                header = None
+            if not isinstance(header, dict) or header.get("type") != "begin":
+                raise ValueError(f"Not a migration journal: {path}")
+            if header.get("version") != JOURNAL_VERSION:
+                raise ValueError(
+                    f"Unsupported journal version: {header.get('version')}"
+                )
+            state = cls(
+                path=path,
+                current_target=Path(header["from"]),
+                new_target=Path(header["to"]),
+                link_mode=header.get("link_mode", "relative"),
+            )
+            for line in fh:
+                try:
+                    rec = json.loads(line)
+                    kind = rec["type"]
+                except (ValueError, KeyError, TypeError):
+                    # A torn last line from a crash; its marker never landed.
+                    continue
+                if kind == "step":
+                    state.steps.append(rec["action"])
+                    if rec["action"] == BACKUP:
+                        state.backup_path = Path(rec["to"])
+                    elif rec["action"] == MOVE:
+                        state.merge = bool(rec.get("merge"))
+                elif kind == "link":
+                    state.links.append((Path(rec["link"]), rec.get("old")))
+                elif kind == "exchange":
+                    state.exchange_source = (int(rec["dev"]), int(rec["ino"]))
+                elif kind == "done":
+                    state.done.add(rec["action"])
+                elif kind == "undone":
+                    state.undone.add(rec["action"])
+                elif kind == "end":
+                    state.finished = True
+                elif kind == "rolled-back":
+                    state.rolled_back = True
+        return state
+
+
+class MigrationJournal:
+    """Appends the records of one migration's journal, fsyncing each write.
+
+    Markers are few (one per step), so each is written by reopening the file
+    in append mode; a failing migration never leaves a handle open.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path).expanduser()
+
+    @classmethod
+    def begin(cls, path: Path, plan: MigrationPlan) -> "MigrationJournal":
+        """Write the header and every intended step of ``plan`` before execution."""
+
+        journal = cls(path)
+        journal.path.parent.mkdir(parents=True, exist_ok=True)
+        ts = time.time()
+
+        def _records() -> Iterable[Dict[str, Any]]:
+            yield {
+                "type": "begin",
+                "version": JOURNAL_VERSION,
+                "operation": plan.operation,
+                "from": str(plan.current_target),
+                "to": str(plan.new_target),
+                "link_mode": plan.link_mode,
+                "ts": ts,
+            }
+            if plan.backup_path is not None:
+                yield {
+                    "type": "step",
+                    "action": BACKUP,
+                    "from": str(plan.new_target),
+                    "to": str(plan.backup_path),
+                }
+            yield {
+                "type": "step",
+                "action": MOVE,
+                "from": str(plan.current_target),
+                "to": str(plan.new_target),
+                "merge": plan.merge is not None,
+            }
+            if plan.links:
+                yield {"type": "step", "action": LINKS, "count": len(plan.links)}
+            yield from _link_records(plan.links)
+
+        _append(journal.path, _records(), mode="w")
+        return journal
+
+    @classmethod
+    def begin_links(
+        cls,
+        path: Path,
+        *,
+        operation: str,
+        target: Path,
+        link_mode: str,
+        links: Iterable[Path] = (),
+    ) -> "MigrationJournal":
+        """Journal an operation that only rewrites ``links``; no data moves.
+
+        Used by inline materialization and relative-only rewrites: a single
+        ``links`` step with each link's current text, written as ``links``
+        is consumed. ``target`` stands in for both ends of the move, so a
+        rollback only restores links.
+        """
+
+        journal = cls(path)
+        journal.path.parent.mkdir(parents=True, exist_ok=True)
+
+        def _records() -> Iterable[Dict[str, Any]]:
+            yield {
+                "type": "begin",
+                "version": JOURNAL_VERSION,
+                "operation": operation,
+                "from": str(target),
+                "to": str(target),
+                "link_mode": link_mode,
+                "ts": time.time(),
+            }
+            yield {"type": "step", "action": LINKS}
+            yield from _link_records(links)
+
+        _append(journal.path, _records(), mode="w")
+        return journal
+
+    def add_links(self, links: Iterable[Path]) -> None:
+        """Record the current text of more ``links`` before they are changed."""
+
+        _append(self.path, _link_records(links))
+
+    def done(self, *actions: str) -> None:
+        ts = time.time()
+        _append(self.path, ({"type": "done", "action": a, "ts": ts} for a in actions))
+
+    def exchanging(self, source: Path) -> None:
+        """Record ``source``'s identity before it is exchanged with the destination.
+
+        A crash after the exchange but before the backup rename leaves the old
+        destination at ``source``; the identity lets a rollback tell the two
+        apart and swap them back.
+        """
+
+        st = os.lstat(source)
+        _append(
+            self.path,
+            [
+                {
+                    "type": "exchange",
+                    "from": str(source),
+                    "dev": st.st_dev,
+                    "ino": st.st_ino,
+                    "ts": time.time(),
+                }
+            ],
+        )
+
+    def finish(self) -> None:
+        _append(self.path, [{"type": "end", "ts": time.time()}])
+
+    def undone(self, action: str) -> None:
+        _append(self.path, [{"type": "undone", "action": action, "ts": time.time()}])
+
+    def rolled_back(self) -> None:
+        _append(self.path, [{"type": "rolled-back", "ts": time.time()}])
+
+
+__all__ = [
+    "BACKUP",
+    "JOURNAL_VERSION",
+    "JournalState",
+    "LINKS",
+    "MOVE",
+    "MigrationJournal",
+]
@@ -0,0 +1,192 @@
+"""Merge planning for the ``merge`` conflict strategy.
+
+A merge moves a source tree into an existing destination directory. Entries
+missing from the destination are transferred, entries already there are
+skipped, and a same-name entry with different content is a conflict that
+stops the merge before anything is written. Like rsync's quick check, size
+and mtime decide "already there"; content is hashed only when the sizes
+match but the mtimes do not. Missing entries are renamed into place when
+source and destination share a filesystem and copied otherwise.
+"""
+
+from __future__ import annotations
+
+import errno
+import os
+import shutil
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from .copier import CopyStats, copy_file, copy_tree
+from .diff import DiffEntry, file_digest, iter_tree_diff
+from .exchange import UNSUPPORTED_ERRNOS, rename_noreplace
+from .progress import ProgressTracker
+from .summary import SummaryCache, fast_tree_summary, format_bytes
+from .verify import DEFAULT_MTIME_WINDOW
+
+
+class MergeConflict(ValueError):
+    """A same-name entry differs between source and destination."""
+
+    def __init__(self, entry: DiffEntry) -> None:
+        super().__init__(f"Merge conflict: {entry}")
+        self.entry = entry
+
+
+@dataclass
+class MergePlan:
+    """What :func:`plan_merge` found.
+
+    Attributes:
+        source: Tree being merged in.
+        destination: Existing directory it is merged into.
+        missing: Top-most source-relative paths absent from the destination;
+            a missing directory is listed once, not per file.
+        files: Regular files under ``missing``.
+        bytes: Their total size.
+        identical: Same-name files with equal size and mtime, or equal content.
+        retouch: Files with equal content but a different mtime; only their
+            metadata is copied.
+    """
+
+    source: Path
+    destination: Path
+    missing: List[str] = field(default_factory=list)
+    files: int = 0
+    bytes: int = 0
+    identical: int = 0
+    retouch: List[str] = field(default_factory=list)
+
+    def describe(self) -> str:
+        return (
+            f"transfer {len(self.missing)} entries ({self.files} files, "
+            f"{format_bytes(self.bytes)}), skip {self.identical} identical files, "
+            f"retouch {len(self.retouch)}"
+        )
+
+
+def _count_files(source: Path, rel: str) -> Tuple[int, int]:
+    """``(files, bytes)`` of regular files at or under ``source/rel``."""
+
+    path = source / rel
+    if path.is_symlink():
+        return 0, 0
+    if path.is_dir():
+        return fast_tree_summary(path)
+    return 1, os.lstat(path).st_size
+
+
+def plan_merge(
+    source: Path, destination: Path, *, cache: Optional[SummaryCache] = None
+) -> MergePlan:
+    """Compare ``source`` with ``destination`` and plan a conflict-free merge.
+
+    Raises :class:`MergeConflict` on the first same-name entry whose type,
+    size, symlink text or content differs. Entries only in the destination
+    are kept and never reported. ``cache`` supplies the source's file count.
+    """
+
+    source = Path(source)
+    destination = Path(destination)
+    plan = MergePlan(source=source, destination=destination)
+    for entry in iter_tree_diff(source, destination):
+        if entry.kind == "added":
+            continue
+        if entry.kind == "removed":
+            plan.missing.append(entry.path)
+            files, nbytes = _count_files(source, entry.path)
+            plan.files += files
+            plan.bytes += nbytes
+            continue
+        if entry.reason != "mtime":
+            raise MergeConflict(entry)
+        if file_digest(str(source / entry.path)) != file_digest(
+            str(destination / entry.path)
+        ):
+            raise MergeConflict(DiffEntry("changed", entry.path, "hash"))
+        plan.retouch.append(entry.path)
+    total_files, _ = fast_tree_summary(source, cache=cache)
+    plan.identical = max(0, total_files - plan.files - len(plan.retouch))
+    return plan
+
+
+def _rename_noreplace(src: Path, dst: Path) -> None:
+    """Rename ``src`` to ``dst``, failing with ``EEXIST`` rather than replacing.
+
+    Without ``RENAME_NOREPLACE`` the target is checked just before an
+    ordinary rename, which leaves only a tiny window.
+    """
+
+    try:
+        rename_noreplace(src, dst)
+        return
+    except OSError as exc:
+        if exc.errno not in UNSUPPORTED_ERRNOS:
+            raise
+    if os.path.lexists(dst):
+        raise FileExistsError(errno.EEXIST, os.strerror(errno.EEXIST), str(dst))
+    os.rename(src, dst)
+
+
+def apply_merge(
+    plan: MergePlan,
+    *,
+    compare_hash: bool = False,
+    progress: Optional[ProgressTracker] = None,
+) -> CopyStats:
+    """Transfer ``plan.missing`` and retouch metadata, then check the result.
+
+    Afterwards every entry still in the source must match the destination
+    (mtimes within :data:`~slm.core.verify.DEFAULT_MTIME_WINDOW`, by content
+    too with ``compare_hash``); otherwise :class:`MergeConflict`
+    is raised and the source is left for the caller to inspect. An entry
+    that appeared in the destination after planning is never replaced: it
+    raises :class:`MergeConflict` with reason ``appeared``. Copied entries
+    advance ``progress``; renamed ones are not counted.
+    """
+
+    stats = CopyStats()
+    renamed = 0
+    for rel in plan.missing:
+        src = plan.source / rel
+        dst = plan.destination / rel
+        try:
+            _rename_noreplace(src, dst)
+            renamed += 1
+            continue
+        except FileExistsError:
+            raise MergeConflict(DiffEntry("changed", rel, "appeared")) from None
+        except OSError as exc:
+            if exc.errno != errno.EXDEV:
+                raise
+        if os.path.lexists(dst):
+            raise MergeConflict(DiffEntry("changed", rel, "appeared"))
+        if src.is_symlink():
+            os.symlink(os.readlink(src), dst)
+            shutil.copystat(src, dst, follow_symlinks=False)
+            stats.symlinks += 1
+        elif src.is_dir():
+            stats.merge(copy_tree(src, dst, progress=progress))
+        else:
+            if progress is not None:
+                progress.current = str(src)
+            stats.add_file(*copy_file(str(src), str(dst), progress))
+            if progress is not None:
+                progress.add(files=1)
+    if renamed:
+        stats.strategies["rename"] = renamed
+    for rel in plan.retouch:
+        shutil.copystat(plan.source / rel, plan.destination / rel)
+    for entry in iter_tree_diff(
+        plan.source,
+        plan.destination,
+        compare_hash=compare_hash,
+        mtime_window=DEFAULT_MTIME_WINDOW,
+    ):
+        if entry.kind != "added":
+            raise MergeConflict(entry)
+    return stats
+
+
+__all__ = ["MergeConflict", "MergePlan", "apply_merge", "plan_merge"]
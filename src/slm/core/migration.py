@@ -2,44 +2,287 @@
 
 from __future__ import annotations
 
+import errno
+import itertools
 import os
-import shutil
 import time
 import uuid
 from pathlib import Path
-from typing import Iterable, List, Optional
-
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from .copier import (
+    CopyJournal,
+    CopyStats,
+    _remove_any,
+    copy_tree,
+    fan_out_copy_tree,
+    hardlink_tree,
+    reflink_known,
+    reflink_supported,
+)
+from . import throttle
+from .exchange import UNSUPPORTED_ERRNOS, exchange_supported, rename_exchange
+from .journal import BACKUP, LINKS, MOVE, JournalState, MigrationJournal
+from .preflight import check_capacity
+from .relink import (
+    CHUNK_SIZE,
+    DEFAULT_RETARGET_WORKERS,
+    RetargetError,
+    link_text,
+    restore_links,
+    retarget_links,
+    split_unchanged,
+    verify_links,
+)
+from .remover import (
+    RemoveStats,
+    remove_tree,
+    remove_tree_in_background,
+    rename_aside,
+)
+from .diff import iter_tree_diff
+from .merge import MergeConflict, MergePlan, apply_merge, plan_merge
+from .plan import MOVE_ONLY, ActionLines, MigrationPlan, materialize_line
+from .progress import Progress, track
 from .scanner import SymlinkInfo
+from .summary import SummaryCache, fast_tree_summary, format_bytes
+from .tarstream import FILES, TAR, choose_copy_backend, tar_copy_tree
+from .verify import (
+    DEFAULT_CONFIDENCE,
+    VERIFY_MODES,
+    VerificationReport,
+    verify_tree_copy,
+)
+
 
 class MigrationError(RuntimeError):
     pass
 
 
-def _materialize_link(source: Path, link: Path) -> None:
+# Link modes that replace symlinks with real directories.
+INLINE_MODES = ("inline", "inline-hardlink")
+
+
+def _materialize_link(
+    source: Path,
+    link: Path,
+    on_progress: Optional[Callable[[Progress], None]] = None,
+) -> None:
     """Atomically replace a symlink with a copy of source data.
 
     Uses a temp directory + rename strategy to ensure atomicity.
     The source data is preserved (not moved).
     """
-    if not link.is_symlink():
-        raise MigrationError(f"Not a symlink: {link}")
+    _materialize_links(source, [link], on_progress=on_progress)
 
-    temp_dir = link.parent / f".{link.name}.slm_tmp_{uuid.uuid4().hex[:8]}"
 
+def _same_device(a: Path, b: Path) -> bool:
+    """Whether ``a`` and ``b`` (or their nearest existing ancestors) share a device."""
+
+    a = a if a.exists() else _existing_parent(a)
+    b = b if b.exists() else _existing_parent(b)
+    try:
+        return os.stat(a).st_dev == os.stat(b).st_dev
+    except OSError:
+        return False
+
+
+def _materialize_links(
+    source: Path,
+    links: Sequence[Path],
+    *,
+    require_symlink: bool = True,
+    hardlink: bool = False,
+    verify: str = "metadata",
+    verify_confidence: float = DEFAULT_CONFIDENCE,
+    on_progress: Optional[Callable[[Progress], None]] = None,
+    source_summary: Optional[Tuple[int, int]] = None,
+) -> CopyStats:
+    """Replace every link with its own copy of ``source``, reading it once.
+
+    All copies are written in one fan-out pass into per-link temp dirs; each
+    link is then swapped with a rename, so every link is still replaced
+    atomically. With ``require_symlink=False`` a missing link path is created
+    as well (used by inline migrations). With ``hardlink=True`` links on the
+    source's device get hard-linked trees instead. Links whose location
+    supports reflinks from the source get copy-on-write clones; the rest are
+    copied. Every cloned or copied temp dir is checked against ``source``
+    with ``verify`` before any link is swapped; in ``full`` mode the source
+    side is hashed during the copy itself.
+
+    ``on_progress`` receives ``inline`` snapshots across all passes over the
+    source; ``source_summary`` (files, bytes) of one pass sets the totals.
+    """
+    for link in links:
+        if link.is_symlink():
+            continue
+        if require_symlink:
+            raise MigrationError(f"Not a symlink: {link}")
+        if link.exists():
+            raise MigrationError(f"Cannot inline over existing path: {link}")
+
+    temps = [
+        link.parent / f".{link.name}.slm_tmp_{uuid.uuid4().hex[:8]}" for link in links
+    ]
+    current: Optional[Path] = None
+    stats = CopyStats()
     try:
-        shutil.copytree(source, temp_dir, symlinks=True)
-        link.unlink()
-        temp_dir.rename(link)
+        hardlink_temps: List[Path] = []
+        clone_temps: List[Path] = []
+        copy_temps: List[Path] = []
+        digests: Optional[Dict[str, str]] = {} if verify == "full" else None
+        for link, temp in zip(links, temps):
+            strategy = _materialize_strategy(source, link, hardlink)
+            if strategy == "hardlink":
+                hardlink_temps.append(temp)
+            elif strategy == "reflink":
+                clone_temps.append(temp)
+            else:
+                copy_temps.append(temp)
+        # Each hard-linked tree and each fan-out group walks the source once.
+        passes = len(hardlink_temps) + bool(clone_temps) + bool(copy_temps)
+        files_total, bytes_total = source_summary or (None, None)
+        progress = track(
+            "inline",
+            on_progress,
+            None if files_total is None else files_total * passes,
+            None if bytes_total is None else bytes_total * passes,
+        )
+        for temp in hardlink_temps:
+            stats.merge(hardlink_tree(source, temp, progress=progress))
+        stats.merge(
+            fan_out_copy_tree(source, clone_temps, reflink=True, progress=progress)
+        )
+        stats.merge(
+            fan_out_copy_tree(
+                source,
+                copy_temps,
+                reflink=False,
+                digests=digests,
+                progress=progress,
+            )
+        )
+        if progress is not None:
+            progress.finish()
+        for temp in clone_temps + copy_temps:
+            report = verify_tree_copy(
+                source,
+                temp,
+                mode=verify,
+                confidence=verify_confidence,
+                source_digests=digests,
+            )
+            if not report.ok:
+                raise MigrationError(f"copy verification failed: {report.mismatches[0]}")
+        for link, temp in zip(links, temps):
+            current = link
+            if link.is_symlink():
+                link.unlink()
+            temp.rename(link)
     except Exception as e:
-        if temp_dir.exists():
-            shutil.rmtree(temp_dir, ignore_errors=True)
-        raise MigrationError(f"Failed to materialize {link}: {e}") from e
+        for temp in temps:
+            if temp.exists():
+                remove_tree(temp, ignore_errors=True)
+        failed = current if current is not None else ", ".join(str(p) for p in links)
+        raise MigrationError(f"Failed to materialize {failed}: {e}") from e
+    return stats
+
+
+def _existing_parent(path: Path) -> Path:
+    """Nearest existing ancestor of ``path`` (where its temp dir will live)."""
+
+    parent = path.parent
+    while not parent.exists() and parent != parent.parent:
+        parent = parent.parent
+    return parent
+
+
+def _materialize_strategy(
+    source: Path, link: Path, hardlink: bool, probe: bool = True
+) -> str:
+    """How ``link`` gets its data: ``hardlink``, ``reflink`` or ``copy``.
+
+    ``source`` may not exist yet when planning an inline migration; its
+    nearest existing ancestor stands in for it then. With ``probe=False``
+    (planning) nothing is written anywhere: a device pair whose reflink
+    support has not been probed yet gives ``auto``, decided when copying.
+    """
+
+    parent = _existing_parent(link)
+    if hardlink and _same_device(source, parent):
+        return "hardlink"
+    origin = source if source.is_dir() else _existing_parent(source)
+    if probe:
+        return "reflink" if reflink_supported(origin, parent) else "copy"
+    known = reflink_known(origin, parent)
+    if known is None:
+        return "auto"
+    return "reflink" if known else "copy"
 
 
-def _safe_move_dir(old: Path, new: Path) -> None:
-    """Safe directory move; auto-creates parent directories; cross-device fallback."""
+def _move_actions(
+    current_target: Path, new_target: Path, two_phase: bool = False
+) -> List[str]:
+    """Plan lines for the data move, naming the copy strategy if it cannot be a rename."""
+
+    dest_parent = _existing_parent(new_target)
+    if _same_device(current_target, dest_parent):
+        return [f"Move: {current_target} -> {new_target}"]
+    known = reflink_known(current_target, dest_parent)
+    if known is None:
+        strategy = "copy, reflink if supported"
+    else:
+        strategy = "reflink" if known else "copy"
+    if not two_phase:
+        return [f"Move: {current_target} -> {new_target} (cross-device {strategy})"]
+    return [
+        f"Pre-copy: {current_target} -> {new_target} "
+        f"(cross-device {strategy}; source stays live)",
+        f"Final sync: {current_target} -> {new_target} "
+        "(only files changed since pre-copy by size/mtime/inode; "
+        "links switch after this phase)",
+    ]
+
+
+def _safe_move_dir(
+    old: Path,
+    new: Path,
+    *,
+    verify: str = "metadata",
+    verify_confidence: float = DEFAULT_CONFIDENCE,
+    on_copied: Optional[Callable[[CopyStats], None]] = None,
+    background_delete: bool = False,
+    two_phase: bool = False,
+    on_precopied: Optional[Callable[[CopyStats], None]] = None,
+    copy_backend: str = FILES,
+    on_progress: Optional[Callable[[Progress], None]] = None,
+    source_summary: Optional[Tuple[int, int]] = None,
+) -> Optional[VerificationReport]:
+    """Safe directory move; auto-creates parent directories; cross-device fallback.
+
+    Returns the verification report when the cross-device copy path was
+    taken, ``None`` for a plain rename. ``on_copied`` receives the copy
+    engine's counters and throughput in that case. With
+    ``background_delete`` the copied source is renamed aside and deleted by
+    a detached process instead of before this function returns.
+
+    ``two_phase`` splits the cross-device copy into a bulk pre-copy, during
+    which the source may still change, and a final delta sync of whatever
+    changed since; ``on_precopied`` runs between the two (e.g. to let the
+    operator stop writers), so only the delta needs a quiet source.
+
+    ``copy_backend=TAR`` streams a fresh cross-device copy as one tar archive
+    (see :mod:`slm.core.tarstream`); resumed and two-phase copies always use
+    the per-file engine, whose journal they rely on.
+
+    ``on_progress`` receives snapshots of the cross-device copy (``copy``,
+    or ``precopy`` then ``sync``) and of the source's ``delete``;
+    ``source_summary`` is the ``(files, bytes)`` of ``old`` used as their
+    totals.
+    """
 
-    if new.exists():
+    resuming = has_resumable_copy(old, new)
+    if new.exists() and not resuming:
         raise MigrationError(f"Destination exists: {new}")
 
     try:
@@ -47,85 +290,797 @@ def _safe_move_dir(old: Path, new: Path) -> None:
     except Exception as e:
         raise MigrationError(f"Cannot create parent directory {new.parent}: {e}") from e
 
+    if not resuming:
+        try:
+            old.rename(new)
+            return None
+        except OSError as e:
+            if not (getattr(e, "errno", None) == 18 or "cross-device" in str(e).lower()):
+                raise
+    return _copy_across_devices(
+        old,
+        new,
+        verify,
+        verify_confidence,
+        on_copied,
+        background_delete=background_delete,
+        two_phase=two_phase,
+        on_precopied=on_precopied,
+        copy_backend=FILES if resuming or two_phase else copy_backend,
+        on_progress=on_progress,
+        source_summary=source_summary,
+        resumed=resuming,
+    )
+
+
+def has_resumable_copy(old: Path, new: Path) -> bool:
+    """True when ``new`` is a partial cross-device copy of ``old`` with a journal."""
+
+    if not Path(new).is_dir():
+        return False
+    recorded = CopyJournal.read_source(CopyJournal.path_for(new))
+    return recorded is not None and recorded == Path(old).resolve()
+
+
+def _copy_across_devices(
+    old: Path,
+    new: Path,
+    verify: str,
+    verify_confidence: float,
+    on_copied: Optional[Callable[[CopyStats], None]],
+    *,
+    background_delete: bool = False,
+    two_phase: bool = False,
+    on_precopied: Optional[Callable[[CopyStats], None]] = None,
+    copy_backend: str = FILES,
+    on_progress: Optional[Callable[[Progress], None]] = None,
+    source_summary: Optional[Tuple[int, int]] = None,
+    resumed: bool = False,
+) -> VerificationReport:
+    """Journaled copy + verify; the source is deleted only after both succeed.
+
+    If the process dies part-way, the journal next to ``new`` lets the same
+    migration pick up where it stopped instead of failing on an existing
+    destination. The two-phase final sync reuses that journal: a second
+    journaled pass skips every file whose size, mtime and inode are
+    unchanged since the pre-copy.
+
+    The journal is removed once the copy is verified and before the source
+    is deleted, so an interrupted delete is never mistaken for a copy to
+    resume. A ``resumed`` copy that fails verification is left in place:
+    it may hold data the source no longer has.
+    """
+
+    try:
+        journal = CopyJournal.open(Path(old).resolve(), new)
+    except (OSError, ValueError) as e:
+        raise MigrationError(f"Cannot open copy journal for {new}: {e}") from e
+    # A full check would otherwise read the source twice; hash it while copying.
+    digests: Optional[Dict[str, str]] = {} if verify == "full" else None
+    limiter = throttle.current()
+    if limiter is not None and limiter.limits.files_per_sec:
+        # A tar process cannot be held to a file rate; the engine can.
+        copy_backend = FILES
+    if copy_backend == TAR and reflink_supported(old, _existing_parent(new)):
+        # Planned without probing; clones beat any stream.
+        copy_backend = FILES
+    if source_summary is None and on_progress is not None:
+        # Planned as a rename (nothing summarised) but the kernel said EXDEV.
+        source_summary = fast_tree_summary(old)
+    totals = source_summary or (None, None)
+    # Journal-skipped files count as done, so a resumed copy or the final
+    # sync starts part-way and shares the totals of a full copy.
+    progress = track("precopy" if two_phase else "copy", on_progress, *totals)
+    try:
+        if copy_backend == TAR:
+            # The journal keeps only its header: an interrupted stream is
+            # resumed by the per-file engine, which recopies what it finds.
+            journal.close()
+            digests = None
+            stats = tar_copy_tree(old, new, progress=progress)
+        else:
+            stats = copy_tree(
+                old, new, journal=journal, digests=digests, progress=progress
+            )
+        if progress is not None:
+            progress.finish()
+        if two_phase:
+            if on_precopied is not None:
+                on_precopied(stats)
+            journal = CopyJournal.open(Path(old).resolve(), new)
+            _prune_stale_entries(old, new)
+            progress = track("sync", on_progress, *totals)
+            stats = copy_tree(
+                old, new, journal=journal, digests=digests, progress=progress
+            )
+            if progress is not None:
+                progress.finish()
+    except OSError as e:
+        raise MigrationError(
+            f"Cross-device copy to {new} failed; re-run the same migration to resume: {e}"
+        ) from e
+    if on_copied is not None:
+        on_copied(stats)
+    try:
+        report = _verify_copy(
+            old, new, verify, verify_confidence, digests, discard=not resumed
+        )
+    except MigrationError:
+        if not resumed:
+            journal.remove()
+        raise
+    # From here on ``new`` is the complete copy: drop the journal first so a
+    # re-run after an interrupted delete cannot "resume" and discard it.
+    journal.remove()
+    _delete_source(old, new, background_delete, on_progress, totals[0])
+    return report
+
+
+def _delete_source(
+    old: Path,
+    new: Path,
+    background_delete: bool,
+    on_progress: Optional[Callable[[Progress], None]] = None,
+    files_total: Optional[int] = None,
+) -> None:
+    """Delete a source whose data now lives in ``new``; failures are reported.
+
+    A foreground delete reports ``delete`` snapshots counting removed
+    entries against ``files_total``; a background one reports nothing.
+    """
+
     try:
-        old.rename(new)
+        if background_delete:
+            remove_tree_in_background(old)
+            return
+        progress = track("delete", on_progress, files_total)
+        if progress is None:
+            remove_tree(old)
+            return
+        removed = 0
+
+        def _advance(stats: RemoveStats) -> None:
+            nonlocal removed
+            progress.add(files=stats.files - removed)
+            removed = stats.files
+
+        progress.current = str(old)
+        remove_tree(old, on_progress=_advance)
+        progress.finish()
     except OSError as e:
-        if getattr(e, "errno", None) == 18 or "cross-device" in str(e).lower():
-            shutil.copytree(old, new)
-            shutil.rmtree(old)
+        raise MigrationError(
+            f"Data is complete at {new}, but deleting the source {old} failed "
+            f"part-way; delete what is left of it by hand: {e}"
+        ) from e
+
+
+def _prune_stale_entries(old: Path, new: Path) -> None:
+    """Remove what the pre-copy wrote that no longer exists in ``old`` as such.
+
+    Covers entries deleted from the source and entries whose type changed
+    (file <-> dir <-> symlink); the journaled delta pass handles the rest.
+    """
+
+    for entry in iter_tree_diff(old, new):
+        if entry.kind == "added" or entry.reason == "type":
+            _remove_any(str(new / entry.path))
+
+
+def _verify_copy(
+    old: Path,
+    new: Path,
+    verify: str = "metadata",
+    verify_confidence: float = DEFAULT_CONFIDENCE,
+    source_digests: Optional[Dict[str, str]] = None,
+    *,
+    discard: bool = True,
+) -> VerificationReport:
+    """Check a fresh cross-device copy against its source before the source goes.
+
+    On the first difference the copy is removed (kept with ``discard=False``)
+    and the source is left untouched.
+    """
+
+    report = verify_tree_copy(
+        old,
+        new,
+        mode=verify,
+        confidence=verify_confidence,
+        source_digests=source_digests,
+    )
+    if not report.ok:
+        kept = ""
+        if discard:
+            remove_tree(new, ignore_errors=True)
         else:
-            raise
+            kept = f"; {new} was kept, compare it with {old} before deleting either"
+        raise MigrationError(
+            f"Copy verification failed for {new}: {report.mismatches[0]}{kept}"
+        )
+    return report
 
 
-def move_and_delete_links(
+def _check_verify_options(verify: str, verify_confidence: float) -> None:
+    if verify not in VERIFY_MODES:
+        raise MigrationError(f"Invalid verify mode: {verify}")
+    if not 0 < verify_confidence < 1:
+        raise MigrationError(f"Invalid verify confidence: {verify_confidence}")
+
+
+def _verify_action(verify: str, verify_confidence: float) -> Optional[str]:
+    if verify == "sampled":
+        return (
+            f"Verify: sampled content check (confidence={verify_confidence}) "
+            "if copied across devices"
+        )
+    if verify == "full":
+        return "Verify: full content check if copied across devices"
+    return None
+
+
+def _tree_need(path: Path, cache: Optional[SummaryCache]) -> Tuple[int, int]:
+    """``(bytes, files)`` a full copy of ``path`` writes."""
+
+    files, nbytes = fast_tree_summary(path, cache=cache)
+    return nbytes, files
+
+
+def _move_needs(
     current_target: Path,
     new_target: Path,
+    resuming: bool,
+    cache: Optional[SummaryCache],
+    merge: Optional[MergePlan] = None,
+) -> List[Tuple[Path, int, int]]:
+    """Space a move needs on the destination device: nothing for a rename."""
+
+    if not resuming and _same_device(current_target, new_target):
+        return []
+    if merge is not None:
+        return [(new_target, merge.bytes, merge.files)]
+    nbytes, files = _tree_need(current_target, cache)
+    if resuming:
+        done_files, done_bytes = fast_tree_summary(new_target)
+        nbytes = max(0, nbytes - done_bytes)
+        files = max(0, files - done_files)
+    return [(new_target, nbytes, files)]
+
+
+def _materialize_needs(
+    source: Path,
     links: Iterable[Path],
-    dry_run: bool = True,
+    hardlink: bool,
+    need: Tuple[int, int],
+    strategies: Optional[Dict[str, str]] = None,
+) -> List[Tuple[Path, int, int]]:
+    """One ``need`` per link that gets a copy; reflinked copies only need inodes.
+
+    Needs are summed per link directory, whose strategy is decided once (and
+    recorded in ``strategies`` when given).
+    """
+
+    strategies = {} if strategies is None else strategies
+    counts: Dict[str, int] = {}
+    for link in links:
+        parent = str(link.parent)
+        if parent not in strategies:
+            strategies[parent] = _materialize_strategy(
+                source, link, hardlink, probe=False
+            )
+        counts[parent] = counts.get(parent, 0) + 1
+    needs: List[Tuple[Path, int, int]] = []
+    for parent, count in counts.items():
+        if strategies[parent] in ("copy", "auto"):
+            needs.append((Path(parent), need[0] * count, need[1] * count))
+        elif strategies[parent] == "reflink":
+            needs.append((Path(parent), 0, need[1] * count))
+    return needs
+
+
+def _plan_merge(
+    current_target: Path, new_target: Path, cache: Optional[SummaryCache]
+) -> MergePlan:
+    if new_target.is_symlink() or not new_target.is_dir():
+        raise MigrationError(f"Cannot merge into a non-directory: {new_target}")
+    try:
+        return plan_merge(current_target, new_target, cache=cache)
+    except MergeConflict as e:
+        raise MigrationError(f"{e} (between {current_target} and {new_target})") from e
+    except OSError as e:
+        raise MigrationError(
+            f"Cannot compare {current_target} with {new_target}: {e}"
+        ) from e
+
+
+def _merge_dirs(
+    merge: MergePlan,
+    verify: str,
+    on_copied: Optional[Callable[[CopyStats], None]],
+    background_delete: bool,
+    on_progress: Optional[Callable[[Progress], None]] = None,
+) -> None:
+    """Apply a merge plan, then delete what is left of the source.
+
+    Whatever was already transferred stays in the destination if the merge
+    fails; the remaining source entries are left untouched.
+    """
+
+    progress = track("merge", on_progress, merge.files, merge.bytes)
+    try:
+        stats = apply_merge(merge, compare_hash=verify == "full", progress=progress)
+    except MergeConflict as e:
+        raise MigrationError(f"{e}; source left in place: {merge.source}") from e
+    except OSError as e:
+        raise MigrationError(f"Merge into {merge.destination} failed: {e}") from e
+    if progress is not None:
+        progress.finish()
+    if on_copied is not None and (stats.files or stats.dirs or stats.symlinks):
+        on_copied(stats)
+    _delete_source(merge.source, merge.destination, background_delete, on_progress)
+
+
+def _preflight_actions(needs: List[Tuple[Path, int, int]]) -> List[str]:
+    """Check ``needs`` against free bytes/inodes per device before anything is copied.
+
+    Returns one plan line per device; raises with the shortfall instead of
+    letting the copy run out of space part-way.
+    """
+
+    if not needs:
+        return []
+    try:
+        report = check_capacity(needs)
+    except OSError as e:
+        raise MigrationError(f"Preflight capacity check failed: {e}") from e
+    if not report.ok:
+        raise MigrationError("Not enough space: " + "; ".join(report.shortfalls()))
+    return [f"Preflight: {device.describe()}" for device in report.devices]
+
+
+def _resolve_new_target(new_target: Path, data_root: Optional[Path]) -> Path:
+    new_target = Path(new_target).expanduser()
+    if not new_target.is_absolute() and data_root:
+        return (Path(data_root).resolve() / new_target).resolve()
+    return new_target.resolve()
+
+
+def plan_migration(
+    current_target: Path,
+    new_target: Path,
+    links: Iterable[Path],
+    *,
+    link_mode: str = "relative",
     conflict_strategy: str = "abort",
     backup_path: Optional[Path] = None,
     data_root: Optional[Path] = None,
-) -> List[str]:
-    """Move data to a new location and delete all associated symlinks."""
-
-    actions: List[str] = []
-    current_target = current_target.resolve()
-    new_target = Path(new_target).expanduser()
-    links_list = list(links)
+    verify: str = "metadata",
+    verify_confidence: float = DEFAULT_CONFIDENCE,
+    background_delete: bool = False,
+    two_phase: bool = False,
+    summary_cache: Optional[SummaryCache] = None,
+) -> MigrationPlan:
+    """Check a migration and decide everything about it without touching disk.
+
+    ``link_mode`` is ``relative``/``absolute`` to retarget the links, one of
+    ``INLINE_MODES`` to replace them with copies, or ``MOVE_ONLY`` to delete
+    them. The returned plan records the lstat identity of every path it
+    depends on (one snapshot per link directory for the links) so
+    :func:`execute_plan` can refuse to run it once they change. ``links``
+    is kept as the plan's list without copying when it is one.
+    """
 
-    if not new_target.is_absolute():
-        if data_root:
-            new_target = (Path(data_root).resolve() / new_target).resolve()
-        else:
-            new_target = new_target.resolve()
-    else:
-        new_target = new_target.resolve()
+    _check_verify_options(verify, verify_confidence)
+    if link_mode not in {"relative", "absolute", MOVE_ONLY, *INLINE_MODES}:
+        raise MigrationError(f"Invalid link_mode: {link_mode}")
+    current_target = Path(current_target).resolve()
+    new_target = _resolve_new_target(new_target, data_root)
+    links_list = links if isinstance(links, list) else list(links)
+    materialize = link_mode in INLINE_MODES
+    hardlink = link_mode == "inline-hardlink"
+    if summary_cache is None:
+        # The source is walked at most once, for preflight and the summary.
+        summary_cache = SummaryCache()
 
     if current_target == new_target:
         raise MigrationError("New target equals current target.")
     if str(new_target).startswith(str(current_target) + os.sep):
         raise MigrationError("New target cannot be inside current target.")
 
-    backup_in_use: Optional[Path] = None
-    if new_target.exists():
+    plan = MigrationPlan(
+        current_target=current_target,
+        new_target=new_target,
+        links=links_list,
+        link_mode=link_mode,
+        conflict_strategy=conflict_strategy,
+        verify=verify,
+        verify_confidence=verify_confidence,
+        two_phase=two_phase,
+        background_delete=background_delete,
+    )
+    actions = plan.actions
+    plan.resuming = has_resumable_copy(current_target, new_target)
+    if new_target.exists() and not plan.resuming:
         if conflict_strategy == "abort":
             raise MigrationError(f"Destination exists: {new_target}")
-        if conflict_strategy != "backup":
+        if conflict_strategy == "merge":
+            plan.merge = _plan_merge(current_target, new_target, summary_cache)
+            actions.append(
+                f"Merge: {current_target} -> {new_target} ({plan.merge.describe()})"
+            )
+        elif conflict_strategy != "backup":
             raise MigrationError(f"Unsupported conflict strategy: {conflict_strategy}")
-        backup_in_use = backup_path or _derive_backup_path(new_target)
-        actions.append(f"Backup: {new_target} -> {backup_in_use}")
-
-    actions.append(f"Move: {current_target} -> {new_target}")
-    for link in links_list:
-        actions.append(f"Delete link: {link}")
-
-    if dry_run:
-        return actions
+        else:
+            plan.backup_path = backup_path or _derive_backup_path(new_target)
+            note = ""
+            if exchange_supported() and _same_device(current_target, new_target):
+                note = (
+                    f" (atomic exchange: {new_target} is never missing; the old "
+                    f"one sits at {current_target} until it is renamed to the "
+                    "backup, a window a journal rollback swaps back)"
+                )
+            actions.append(f"Backup: {new_target} -> {plan.backup_path}{note}")
+
+    if plan.resuming:
+        actions.append(
+            f"Resume copy: {current_target} -> {new_target} "
+            f"(journal: {CopyJournal.path_for(new_target)})"
+        )
+    elif plan.merge is None:
+        actions.extend(_move_actions(current_target, new_target, two_phase))
+    needs = _move_needs(
+        current_target, new_target, plan.resuming, summary_cache, plan.merge
+    )
+    summary = summary_cache.get(current_target)
+    if summary is not None:
+        plan.source_files, plan.source_bytes = summary
+    if needs and plan.merge is None and not plan.resuming and not two_phase:
+        # Unprobed reflink support may still turn this into per-file clones.
+        if not reflink_known(current_target, _existing_parent(new_target)):
+            plan.copy_backend = choose_copy_backend(
+                plan.source_files, plan.source_bytes
+            )
+    if plan.copy_backend == TAR:
+        average = format_bytes((plan.source_bytes or 0) // (plan.source_files or 1))
+        actions.append(
+            f"Copy backend: tar stream ({plan.source_files} files, "
+            f"{average} on average)"
+        )
+    verify_line = _verify_action(verify, verify_confidence)
+    if verify_line:
+        actions.append(verify_line)
+    if background_delete:
+        actions.append(
+            "Delete source: rename aside and delete in background "
+            "if copied across devices"
+        )
+    if materialize:
+        needs += _materialize_needs(
+            new_target,
+            (link for link in links_list if link != new_target),
+            hardlink,
+            _tree_need(current_target, summary_cache),
+            plan.link_strategies,
+        )
+    plan.checks.extend(_preflight_actions(needs))
+    plan.snapshot()
+    return plan
+
+
+def execute_plan(
+    plan: MigrationPlan,
+    *,
+    on_verified: Optional[Callable[[VerificationReport], None]] = None,
+    on_copied: Optional[Callable[[CopyStats], None]] = None,
+    on_precopied: Optional[Callable[[CopyStats], None]] = None,
+    journal: Optional[Path] = None,
+    on_progress: Optional[Callable[[Progress], None]] = None,
+    summary_cache: Optional[SummaryCache] = None,
+) -> ActionLines:
+    """Carry out a plan from :func:`plan_migration` (possibly loaded from disk).
+
+    Raises before changing anything if a path the plan depends on was
+    replaced, retargeted, created or removed since the plan was made.
+    With ``journal``, the intended steps are written there first and marked
+    as each completes, so :func:`rollback_journal` can undo the migration.
+    ``on_progress`` receives :class:`~slm.core.progress.Progress` snapshots
+    of every copy (cross-device move, merge, inline copies) and of deleting
+    a copied source, measured against the source summary recorded in the
+    plan. Entries for the paths it changes are dropped from
+    ``summary_cache``, even if it fails part-way. Returns the plan's action
+    lines as a lazy :class:`~slm.core.plan.ActionLines`.
+    """
 
-    if backup_in_use:
-        if backup_in_use.exists():
-            raise MigrationError(f"Backup destination exists: {backup_in_use}")
+    stale = plan.stale_reasons()
+    if stale:
+        raise MigrationError("Plan is stale: " + "; ".join(stale))
+    wal: Optional[MigrationJournal] = None
+    if journal is not None:
         try:
-            new_target.rename(backup_in_use)
+            wal = MigrationJournal.begin(journal, plan)
         except OSError as exc:
-            raise MigrationError(f"Failed to backup existing destination: {exc}") from exc
-
-    _safe_move_dir(current_target, new_target)
+            raise MigrationError(f"Cannot write journal {journal}: {exc}") from exc
+
+    def _done(*steps: str) -> None:
+        if wal is not None:
+            wal.done(*steps)
+    current_target = plan.current_target
+    new_target = plan.new_target
+    links_list = plan.links
+    materialize = plan.link_mode in INLINE_MODES
+    summary: Optional[Tuple[int, int]] = None
+    if plan.source_files is not None and plan.source_bytes is not None:
+        summary = (plan.source_files, plan.source_bytes)
 
-    for link in links_list:
-        if not link.exists():
-            continue
-        if not link.is_symlink():
-            raise MigrationError(f"Not a symlink: {link}")
-        link.unlink()
-
-    if not new_target.exists():
-        raise MigrationError(f"Move failed, missing: {new_target}")
+    try:
+        exchanged = False
+        if plan.backup_path is not None:
+            if plan.backup_path.exists():
+                raise MigrationError(f"Backup destination exists: {plan.backup_path}")
+            if not plan.resuming and _same_device(current_target, new_target):
+                if wal is not None:
+                    try:
+                        wal.exchanging(current_target)
+                    except OSError as exc:
+                        raise MigrationError(
+                            f"Cannot write journal {journal}: {exc}"
+                        ) from exc
+                exchanged = _exchange_into(current_target, new_target, plan.backup_path)
+            if not exchanged:
+                try:
+                    new_target.rename(plan.backup_path)
+                except OSError as exc:
+                    raise MigrationError(
+                        f"Failed to backup existing destination: {exc}"
+                    ) from exc
+            _done(*((BACKUP, MOVE) if exchanged else (BACKUP,)))
+
+        report: Optional[VerificationReport] = None
+        if plan.merge is not None:
+            _merge_dirs(
+                plan.merge, plan.verify, on_copied, plan.background_delete, on_progress
+            )
+        elif not exchanged:
+            report = _safe_move_dir(
+                current_target,
+                new_target,
+                verify=plan.verify,
+                verify_confidence=plan.verify_confidence,
+                on_copied=on_copied,
+                background_delete=plan.background_delete,
+                two_phase=plan.two_phase,
+                on_precopied=on_precopied,
+                copy_backend=plan.copy_backend,
+                on_progress=on_progress,
+                source_summary=summary,
+            )
+        if not exchanged:
+            _done(MOVE)
+        if report is not None and on_verified is not None:
+            on_verified(report)
+
+        if plan.link_mode == MOVE_ONLY:
+            for link in links_list:
+                if not link.exists():
+                    continue
+                if not link.is_symlink():
+                    raise MigrationError(f"Not a symlink: {link}")
+                link.unlink()
+        elif materialize:
+            # When new_target shares the same path as one of the links, the move
+            # above already materialised it; skip copying in that case.
+            _materialize_links(
+                new_target,
+                [link for link in links_list if link != new_target],
+                require_symlink=False,
+                hardlink=plan.link_mode == "inline-hardlink",
+                verify=plan.verify,
+                verify_confidence=plan.verify_confidence,
+                on_progress=on_progress,
+                source_summary=summary,
+            )
+        else:
+            relative = plan.link_mode == "relative"
+            _retarget_links(
+                links_list, lambda link: link_text(link, new_target, relative=relative)
+            )
+        if links_list:
+            _done(LINKS)
+
+        if not new_target.exists():
+            raise MigrationError(f"Move failed, missing: {new_target}")
+        if plan.link_mode == MOVE_ONLY:
+            for link in links_list:
+                if link.exists():
+                    raise MigrationError(f"Link still exists after deletion: {link}")
+        elif materialize:
+            for link in links_list:
+                if not link.exists():
+                    raise MigrationError(f"Materialized path missing: {link}")
+                if link.is_symlink():
+                    raise MigrationError(f"Materialized path still a symlink: {link}")
+                if not link.is_dir():
+                    raise MigrationError(
+                        f"Materialized path is not a directory: {link}"
+                    )
+        if wal is not None:
+            wal.finish()
+        return plan.lines()
+    finally:
+        if summary_cache is not None:
+            # Totals of the moved tree, its old and new parents and any
+            # materialized copies no longer hold.
+            changed = [current_target, new_target]
+            if materialize:
+                changed.extend(links_list)
+            for path in changed:
+                summary_cache.invalidate(path)
+
+
+def _exchange_into(source: Path, destination: Path, backup: Path) -> bool:
+    """Swap ``source`` into ``destination``, then move the old one to ``backup``.
+
+    Returns ``False`` without changing anything when the kernel or
+    filesystem cannot exchange, so the caller can fall back to two renames.
+    """
 
-    for link in links_list:
-        if link.exists():
-            raise MigrationError(f"Link still exists after deletion: {link}")
+    try:
+        rename_exchange(source, destination)
+    except OSError as exc:
+        if exc.errno in UNSUPPORTED_ERRNOS or exc.errno == errno.EXDEV:
+            return False
+        raise MigrationError(f"Failed to exchange {source} with {destination}: {exc}") from exc
+    try:
+        os.rename(source, backup)
+    except OSError as exc:
+        # ``source`` now holds the old destination; swap back so nothing moved.
+        try:
+            rename_exchange(source, destination)
+        except OSError:
+            raise MigrationError(
+                f"Failed to move the old destination (now at {source}) to {backup}: {exc}"
+            ) from exc
+        raise MigrationError(f"Failed to backup existing destination: {exc}") from exc
+    return True
+
+
+def _interrupted_exchange(state: JournalState) -> bool:
+    """Whether ``current_target`` and ``new_target`` are exchanged but not backed up."""
+
+    if state.exchange_source is None or BACKUP in state.done:
+        return False
+    if state.backup_path is not None and os.path.lexists(state.backup_path):
+        return False
+    try:
+        at_new = os.lstat(state.new_target)
+        at_current = os.lstat(state.current_target)
+    except OSError:
+        return False
+    source = state.exchange_source
+    at_new_id = (at_new.st_dev, at_new.st_ino)
+    return at_new_id == source and (at_current.st_dev, at_current.st_ino) != source
+
+
+def rollback_journal(
+    journal: Path,
+    *,
+    dry_run: bool = False,
+    max_workers: int = DEFAULT_RETARGET_WORKERS,
+) -> List[str]:
+    """Undo the migration recorded in ``journal``, newest step first.
+
+    Links get their recorded text back (missing ones are recreated, inline
+    copies are replaced by the symlink again), the data is moved back (a
+    rename when both sides share a device) and a backed-up destination is
+    restored. A crash inside an atomic exchange (paths swapped, old
+    destination not yet renamed to the backup) is undone by swapping them
+    back. Steps that never ran are skipped. Each reverted step is marked
+    in the journal, so an interrupted rollback can simply be run again.
+    Returns the rollback's action lines.
+    """
 
+    try:
+        state = JournalState.read(journal)
+    except (OSError, ValueError, KeyError) as exc:
+        raise MigrationError(f"Cannot read journal {journal}: {exc}") from exc
+    if state.rolled_back:
+        return [f"Already rolled back: {state.current_target}"]
+    current, new, backup = state.current_target, state.new_target, state.backup_path
+    wal = MigrationJournal(state.path)
+    actions: List[str] = []
+    if _interrupted_exchange(state):
+        # Crashed between the exchange and the backup rename: the data is
+        # at ``new`` and the old destination at ``current``.
+        actions.append(f"Swap back: {new} <-> {current} (interrupted exchange)")
+        if not dry_run:
+            try:
+                rename_exchange(new, current)
+            except OSError as exc:
+                raise MigrationError(
+                    f"Failed to swap {new} back with {current}: {exc}"
+                ) from exc
+    # A crash between a rename and its marker still counts as moved.
+    moved = MOVE in state.done or (not os.path.lexists(current) and new.exists())
+    if state.merge and moved and MOVE not in state.undone:
+        raise MigrationError(
+            f"A merge cannot be rolled back; the merged data is in {new}"
+        )
+    if not moved and current.exists() and has_resumable_copy(current, new):
+        raise MigrationError(
+            f"Copy to {new} was interrupted; re-run the migration to finish it, "
+            "or delete the partial copy, then roll back again"
+        )
+
+    restore: List[Tuple[Path, str]] = []
+    after_move: List[Tuple[Path, str]] = []
+    asides: List[Path] = []
+    unchanged = 0
+    if LINKS in state.steps and LINKS not in state.undone:
+        for link, old in state.links:
+            if old is None:
+                continue
+            if link == new:
+                # The moved data itself sits there; it becomes a link again
+                # once the data is moved back.
+                after_move.append((link, old))
+            elif link.is_symlink():
+                if os.readlink(link) == old:
+                    unchanged += 1
+                else:
+                    restore.append((link, old))
+            elif not os.path.lexists(link):
+                restore.append((link, old))
+            elif link.is_dir() and state.link_mode in INLINE_MODES:
+                asides.append(link)
+                restore.append((link, old))
+            else:
+                raise MigrationError(f"Not a symlink: {link}")
+        actions.append(
+            f"Restore links: {len(restore) + len(after_move)} to their previous "
+            f"targets, {unchanged} unchanged"
+        )
+        actions.extend(f"Remove inline copy: {link}" for link in asides)
+        if not dry_run:
+            try:
+                trash = [rename_aside(link) for link in asides]
+                restore_links(restore, max_workers=max_workers)
+            except (OSError, RetargetError) as exc:
+                raise MigrationError(f"Failed to restore links: {exc}") from exc
+            bad = verify_links(restore, max_workers=max_workers)
+            if bad:
+                raise MigrationError(f"Verification failed for symlink: {bad[0]}")
+            for path in trash:
+                remove_tree(path)
+
+    if MOVE not in state.undone and moved:
+        actions.append(f"Move back: {new} -> {current}")
+        if not dry_run:
+            try:
+                _safe_move_dir(new, current)
+            except OSError as exc:
+                raise MigrationError(f"Failed to move {new} back: {exc}") from exc
+            wal.undone(MOVE)
+    if after_move and not dry_run:
+        try:
+            restore_links(after_move)
+        except RetargetError as exc:
+            raise MigrationError(f"Failed to restore links: {exc}") from exc
+    if LINKS in state.steps and LINKS not in state.undone and not dry_run:
+        wal.undone(LINKS)
+
+    if backup is not None and BACKUP not in state.undone:
+        if BACKUP in state.done or os.path.lexists(backup):
+            actions.append(f"Restore backup: {backup} -> {new}")
+            if not dry_run:
+                if os.path.lexists(new):
+                    raise MigrationError(f"Cannot restore backup, path exists: {new}")
+                try:
+                    os.rename(backup, new)
+                except OSError as exc:
+                    raise MigrationError(f"Failed to restore backup: {exc}") from exc
+                wal.undone(BACKUP)
+
+    if not dry_run:
+        wal.rolled_back()
     return actions
 
 
@@ -140,17 +1095,79 @@ def _derive_backup_path(target: Path, now: Optional[float] = None) -> Path:
     return candidate
 
 
+def _retarget_links(links: Sequence[Path], text: Callable[[Path], str]) -> None:
+    """Atomically set each link to ``text(link)``, then check it with ``readlink``.
+
+    The ``(link, text)`` pairs are generated on the fly for both passes, so
+    memory does not grow with the number of links.
+    """
+
+    try:
+        retarget_links((link, text(link)) for link in links)
+    except RetargetError as e:
+        raise MigrationError(f"Failed to retarget {e}") from e
+    bad = verify_links((link, text(link)) for link in links)
+    if bad:
+        raise MigrationError(f"Verification failed for symlink: {bad[0]}")
+
+
 def _retarget_symlink(link: Path, new_target: Path, *, make_relative: bool) -> None:
+    """Point one link at ``new_target``; a link already in that form is left alone."""
+
     if not link.is_symlink():
         raise MigrationError(f"Not a symlink: {link}")
-    link.unlink()
-    target_for_link = str(new_target)
-    if make_relative:
-        try:
-            target_for_link = os.path.relpath(str(new_target), start=str(link.parent))
-        except Exception:
-            target_for_link = str(new_target)
-    os.symlink(target_for_link, str(link))
+    text = link_text(link, new_target, relative=make_relative)
+    changed, _ = next(split_unchanged([(link, text)]))
+    if changed:
+        _retarget_links([link], lambda _: text)
+
+
+def move_and_delete_links(
+    current_target: Path,
+    new_target: Path,
+    links: Iterable[Path],
+    dry_run: bool = True,
+    conflict_strategy: str = "abort",
+    backup_path: Optional[Path] = None,
+    data_root: Optional[Path] = None,
+    verify: str = "metadata",
+    verify_confidence: float = DEFAULT_CONFIDENCE,
+    on_verified: Optional[Callable[[VerificationReport], None]] = None,
+    on_copied: Optional[Callable[[CopyStats], None]] = None,
+    background_delete: bool = False,
+    summary_cache: Optional[SummaryCache] = None,
+    two_phase: bool = False,
+    on_precopied: Optional[Callable[[CopyStats], None]] = None,
+    on_progress: Optional[Callable[[Progress], None]] = None,
+) -> ActionLines:
+    """Move data to a new location and delete all associated symlinks.
+
+    Returns the plan's action lines, built lazily per link.
+    """
+
+    plan = plan_migration(
+        current_target,
+        new_target,
+        links,
+        link_mode=MOVE_ONLY,
+        conflict_strategy=conflict_strategy,
+        backup_path=backup_path,
+        data_root=data_root,
+        verify=verify,
+        verify_confidence=verify_confidence,
+        background_delete=background_delete,
+        two_phase=two_phase,
+        summary_cache=summary_cache,
+    )
+    if dry_run:
+        return plan.lines()
+    return execute_plan(
+        plan,
+        on_verified=on_verified,
+        on_copied=on_copied,
+        on_precopied=on_precopied,
+        on_progress=on_progress,
+    )
 
 
 def migrate_target_and_update_links(
@@ -162,162 +1179,255 @@ def migrate_target_and_update_links(
     backup_path: Optional[Path] = None,
     data_root: Optional[Path] = None,
     link_mode: str = "relative",
-) -> List[str]:
-    actions: List[str] = []
-    current_target = current_target.resolve()
-    new_target = new_target.expanduser()
-    links_list = list(links)
-
-    valid_modes = {"relative", "absolute", "inline"}
-    if link_mode not in valid_modes:
+    verify: str = "metadata",
+    verify_confidence: float = DEFAULT_CONFIDENCE,
+    on_verified: Optional[Callable[[VerificationReport], None]] = None,
+    on_copied: Optional[Callable[[CopyStats], None]] = None,
+    background_delete: bool = False,
+    summary_cache: Optional[SummaryCache] = None,
+    two_phase: bool = False,
+    on_precopied: Optional[Callable[[CopyStats], None]] = None,
+    on_progress: Optional[Callable[[Progress], None]] = None,
+) -> ActionLines:
+    if link_mode == MOVE_ONLY:
         raise MigrationError(f"Invalid link_mode: {link_mode}")
-    use_relative_links = link_mode == "relative"
-    materialize_links = link_mode == "inline"
+    plan = plan_migration(
+        current_target,
+        new_target,
+        links,
+        link_mode=link_mode,
+        conflict_strategy=conflict_strategy,
+        backup_path=backup_path,
+        data_root=data_root,
+        verify=verify,
+        verify_confidence=verify_confidence,
+        background_delete=background_delete,
+        two_phase=two_phase,
+        summary_cache=summary_cache,
+    )
+    if dry_run:
+        return plan.lines()
+    return execute_plan(
+        plan,
+        on_verified=on_verified,
+        on_copied=on_copied,
+        on_precopied=on_precopied,
+        on_progress=on_progress,
+    )
 
-    if not new_target.is_absolute():
-        if data_root:
-            new_target = (Path(data_root).resolve() / new_target).resolve()
-        else:
-            new_target = new_target.resolve()
-    else:
-        new_target = new_target.resolve()
 
-    if current_target == new_target:
-        raise MigrationError("New target equals current target.")
+def _relative_rewrite(info: SymlinkInfo) -> Tuple[SymlinkInfo, str]:
     try:
-        current_target.relative_to("/")
-        new_target.relative_to("/")
-    except Exception:
-        pass
-    if str(new_target).startswith(str(current_target) + os.sep):
-        raise MigrationError("New target cannot be inside current target.")
-
-    backup_in_use: Optional[Path] = None
-    if new_target.exists():
-        if conflict_strategy == "abort":
-            raise MigrationError(f"Destination exists: {new_target}")
-        if conflict_strategy != "backup":
-            raise MigrationError(f"Unsupported conflict strategy: {conflict_strategy}")
-        backup_in_use = backup_path or _derive_backup_path(new_target)
-        actions.append(f"Backup: {new_target} -> {backup_in_use}")
-
-    actions.append(f"Move: {current_target} -> {new_target}")
-    if materialize_links:
-        for link in links_list:
-            actions.append(f"Inline: {link} <= {new_target}")
-    else:
-        suffix = " (relative)" if use_relative_links else " (absolute)"
-        for link in links_list:
-            actions.append(f"Link: {link} -> {new_target}{suffix}")
-
-    if dry_run:
-        return actions
-
-    if backup_in_use:
-        if backup_in_use.exists():
-            raise MigrationError(f"Backup destination exists: {backup_in_use}")
-        try:
-            new_target.rename(backup_in_use)
-        except OSError as exc:
-            raise MigrationError(f"Failed to backup existing destination: {exc}") from exc
+        rel = os.path.relpath(info.target, start=info.source.parent)
+    except Exception as exc:
+        raise MigrationError(
+            f"无法计算相对路径: {info.source} -> {info.target}: {exc}"
+        ) from exc
+    return info, rel
+
+
+def relative_rewrites(
+    infos: Iterable[SymlinkInfo],
+) -> Iterator[Tuple[List[Tuple[SymlinkInfo, str]], List[Tuple[SymlinkInfo, str]]]]:
+    """Pair each link with its relative text; yield ``(changed, unchanged)``.
+
+    ``infos`` is consumed lazily, one chunk of links at a time, and each
+    chunk is split as soon as its links were read. A link is unchanged when
+    its ``readlink`` text already equals the text that would be written.
+    """
 
-    _safe_move_dir(current_target, new_target)
-    if materialize_links:
-        for link in links_list:
-            if link.is_symlink():
-                link.unlink()
-            elif link.exists() and not link.is_dir():
-                raise MigrationError(f"Cannot inline over existing non-dir: {link}")
-            # When new_target shares the same path as one of the links, the move
-            # above already materialised it; skip copying in that case.
-            if link == new_target:
-                continue
-            shutil.copytree(new_target, link)
-    else:
-        for link in links_list:
-            _retarget_symlink(link, new_target, make_relative=use_relative_links)
-
-    if not new_target.exists():
-        raise MigrationError(f"Move failed, missing: {new_target}")
-    if materialize_links:
-        for link in links_list:
-            if not link.exists():
-                raise MigrationError(f"Materialized path missing: {link}")
-            if link.is_symlink():
-                raise MigrationError(f"Materialized path still a symlink: {link}")
-            if not link.is_dir():
-                raise MigrationError(f"Materialized path is not a directory: {link}")
-    else:
-        for link in links_list:
-            if Path(link).resolve(strict=True) != new_target:
-                raise MigrationError(f"Verification failed for symlink: {link}")
-    return actions
+    rewrites = (_relative_rewrite(info) for info in infos)
+    while True:
+        chunk = {
+            info.source: (info, rel)
+            for info, rel in itertools.islice(rewrites, CHUNK_SIZE)
+        }
+        if not chunk:
+            return
+        pairs = ((link, rel) for link, (_, rel) in chunk.items())
+        for changed, unchanged in split_unchanged(pairs):
+            yield (
+                [chunk[link] for link, _ in changed],
+                [chunk[link] for link, _ in unchanged],
+            )
+
+
+def _common_target(infos: Iterable[SymlinkInfo]) -> Path:
+    common: Optional[str] = None
+    for info in infos:
+        target = str(info.target)
+        common = target if common is None else os.path.commonpath([common, target])
+    return Path(common or os.sep)
 
 
 def rewrite_links_to_relative(
-    infos: Iterable[SymlinkInfo], *, dry_run: bool = True
+    infos: Iterable[SymlinkInfo],
+    *,
+    dry_run: bool = True,
+    journal: Optional[Path] = None,
+    limit: Optional[int] = None,
+    on_rewritten: Optional[Callable[[List[SymlinkInfo]], None]] = None,
 ) -> List[str]:
-    """Rewrite discovered symlinks to relative targets without moving data."""
+    """Rewrite discovered symlinks to relative targets without moving data.
+
+    Links are read, journaled and rewritten one chunk at a time. Links
+    that are already exactly relative are reported as unchanged and not
+    touched; the last action line counts both. With ``limit``, at most that
+    many per-link lines are returned, followed by one line counting the
+    rest. With ``journal``, the old text of each chunk of links to rewrite
+    is journaled before the chunk changes, so :func:`rollback_journal` can
+    restore it. ``on_rewritten`` receives each chunk once it is rewritten.
+    """
 
-    infos_list = list(infos)
+    if journal is not None and iter(infos) is infos:
+        # The journal header names the targets' common parent: one more pass.
+        infos = list(infos)
     actions: List[str] = []
+    shown = hidden = rewritten = kept = 0
+    wal: Optional[MigrationJournal] = None
+
+    def _show(line: str) -> None:
+        nonlocal shown, hidden
+        if limit is None or shown < limit:
+            actions.append(line)
+            shown += 1
+        else:
+            hidden += 1
+
+    for changed, unchanged in relative_rewrites(infos):
+        rewritten += len(changed)
+        kept += len(unchanged)
+        for info, rel in changed:
+            _show(f"Retarget: {info.source} -> {rel} (target={info.target})")
+        for info, rel in unchanged:
+            _show(f"Unchanged: {info.source} -> {rel}")
+        if dry_run or not changed:
+            continue
+        texts = {info.source: rel for info, rel in changed}
+        if journal is not None:
+            if wal is None:
+                # No data moves; the targets' common parent names the "move".
+                wal = _begin_links_journal(
+                    journal, "relative-only", _common_target(infos), "relative", ()
+                )
+            try:
+                wal.add_links(texts)
+            except OSError as exc:
+                raise MigrationError(f"Cannot write journal {journal}: {exc}") from exc
+        _retarget_links(list(texts), texts.__getitem__)
+        if on_rewritten is not None:
+            on_rewritten([info for info, _ in changed])
+    if hidden:
+        actions.append(f"... and {hidden} more links")
+    actions.append(f"Summary: {rewritten} links to rewrite, {kept} unchanged")
+    if wal is not None:
+        wal.done(LINKS)
+        wal.finish()
+    return actions
 
-    def _compute_relative(link: Path, target: Path) -> str:
-        try:
-            return os.path.relpath(target, start=link.parent)
-        except Exception as exc:
-            raise MigrationError(f"无法计算相对路径: {link} -> {target}: {exc}") from exc
-
-    for info in infos_list:
-        rel = _compute_relative(info.source, info.target)
-        actions.append(f"Retarget: {info.source} -> {rel} (target={info.target})")
-
-    if dry_run:
-        return actions
-
-    for info in infos_list:
-        _retarget_symlink(info.source, info.target, make_relative=True)
-
-    for info in infos_list:
-        if Path(info.source).resolve(strict=True) != info.target.resolve():
-            raise MigrationError(f"Verification failed for symlink: {info.source}")
-        raw = os.readlink(info.source)
-        if os.path.isabs(raw):
-            raise MigrationError(f"Link is still absolute: {info.source}")
 
-    return actions
+def _begin_links_journal(
+    journal: Path, operation: str, target: Path, link_mode: str, links: Iterable[Path]
+) -> MigrationJournal:
+    try:
+        return MigrationJournal.begin_links(
+            journal,
+            operation=operation,
+            target=target,
+            link_mode=link_mode,
+            links=links,
+        )
+    except OSError as exc:
+        raise MigrationError(f"Cannot write journal {journal}: {exc}") from exc
 
 
 def materialize_links_in_place(
     source_target: Path,
     links: Iterable[Path],
     dry_run: bool = True,
-) -> List[str]:
+    link_mode: str = "inline",
+    verify: str = "metadata",
+    verify_confidence: float = DEFAULT_CONFIDENCE,
+    summary_cache: Optional[SummaryCache] = None,
+    on_progress: Optional[Callable[[Progress], None]] = None,
+    journal: Optional[Path] = None,
+) -> ActionLines:
     """Replace symlinks with copies of source data, preserving the original.
 
     This is the non-destructive "inline" mode: source data stays in place,
-    and each symlink is replaced with a full copy of the data.
+    and each symlink is replaced with a full copy of the data. The source is
+    read once no matter how many links are materialized.
 
     Args:
         source_target: The directory that symlinks currently point to (preserved).
-        links: Symlinks to materialize.
+        links: Symlinks to materialize; a one-shot iterator is collected into
+            a list, since the links are walked more than once.
         dry_run: If True, only return planned actions without executing.
+        link_mode: ``inline`` for independent copies, or ``inline-hardlink`` to
+            build hard-linked trees that share inodes with the source (falls
+            back to copying for links on another device).
+        verify: How each copy is checked against the source before its link
+            is swapped (see ``VERIFY_MODES``); ``full`` hashes the source
+            while copying, so the source is still read only once.
+        verify_confidence: Detection confidence for ``sampled`` checks.
+        on_progress: Receives progress snapshots of the copies, measured
+            against the source summary.
+        summary_cache: Supplies the source summary; entries for the links
+            (and their ancestors) are dropped once they are materialized.
+        journal: Write-ahead journal of the links' current text, written
+            before any link changes; undo with :func:`rollback_journal`.
 
     Returns:
-        List of action descriptions.
+        Action descriptions; per-link lines are built as they are read.
     """
-    actions: List[str] = []
+    if link_mode not in INLINE_MODES:
+        raise MigrationError(f"Invalid link_mode for materialize: {link_mode}")
+    _check_verify_options(verify, verify_confidence)
+    hardlink = link_mode == "inline-hardlink"
     source_target = source_target.resolve()
-    links_list = list(links)
-
-    for link in links_list:
-        actions.append(f"Materialize: {link} <= copy from {source_target}")
+    links_list = links if isinstance(links, Sequence) else list(links)
+
+    checks: List[str] = []
+    if verify != "metadata":
+        checks.append(
+            f"Verify: {verify} content check of each copy before its link is swapped"
+        )
+    need = _tree_need(source_target, summary_cache)
+    strategies: Dict[str, str] = {}
+    checks.extend(
+        _preflight_actions(
+            _materialize_needs(source_target, links_list, hardlink, need, strategies)
+        )
+    )
+
+    def _line(link: Path) -> str:
+        strategy = strategies[str(link.parent)]
+        return materialize_line("Materialize", source_target, link, strategy, hardlink)
+
+    actions = ActionLines([], links_list, _line, checks)
 
     if dry_run:
         return actions
 
-    for link in links_list:
-        _materialize_link(source_target, link)
+    wal = None
+    if journal is not None:
+        wal = _begin_links_journal(
+            journal, "materialize", source_target, link_mode, links_list
+        )
+    try:
+        _materialize_links(
+            source_target,
+            links_list,
+            hardlink=hardlink,
+            verify=verify,
+            verify_confidence=verify_confidence,
+            on_progress=on_progress,
+            source_summary=(need[1], need[0]),
+        )
+    finally:
+        if summary_cache is not None:
+            for link in links_list:
+                summary_cache.invalidate(link)
 
     if not source_target.exists():
         raise MigrationError(f"Source unexpectedly missing after materialize: {source_target}")
@@ -328,17 +1438,26 @@ def materialize_links_in_place(
             raise MigrationError(f"Materialized path still a symlink: {link}")
         if not link.is_dir():
             raise MigrationError(f"Materialized path is not a directory: {link}")
+    if wal is not None:
+        wal.done(LINKS)
+        wal.finish()
 
     return actions
 
 
 __all__ = [
+    "INLINE_MODES",
     "MigrationError",
     "_safe_move_dir",
     "_derive_backup_path",
     "_materialize_link",
+    "execute_plan",
+    "has_resumable_copy",
     "move_and_delete_links",
     "migrate_target_and_update_links",
+    "plan_migration",
+    "relative_rewrites",
     "rewrite_links_to_relative",
+    "rollback_journal",
     "materialize_links_in_place",
 ]
@@ -0,0 +1,473 @@
+"""Typed migration plans: computed once, then rendered, saved, logged and executed."""
+
+from __future__ import annotations
+
+import json
+import os
+import stat
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence
+
+from .merge import MergePlan
+from .tarstream import FILES
+from .verify import DEFAULT_CONFIDENCE
+
+PLAN_VERSION = 2
+# ``MigrationPlan.link_mode`` of a move that deletes the links instead of
+# updating them.
+MOVE_ONLY = "move-only"
+
+
+@dataclass(frozen=True)
+class PathSnapshot:
+    """lstat-level identity of a path when the plan was made.
+
+    Revalidation compares only what a single ``lstat`` (plus ``readlink`` for
+    symlinks) returns, so checking a saved plan never walks a tree.
+    """
+
+    path: Path
+    kind: str
+    dev: int = 0
+    ino: int = 0
+    link: Optional[str] = None
+
+    @classmethod
+    def take(cls, path: Path) -> "PathSnapshot":
+        path = Path(path)
+        try:
+            st = os.lstat(path)
+        except FileNotFoundError:
+            return cls(path, "missing")
+        if stat.S_ISLNK(st.st_mode):
+            return cls(path, "link", st.st_dev, st.st_ino, os.readlink(path))
+        kind = "dir" if stat.S_ISDIR(st.st_mode) else "file"
+        if kind == "file" and not stat.S_ISREG(st.st_mode):
+            kind = "other"
+        return cls(path, kind, st.st_dev, st.st_ino)
+
+    def describe(self) -> str:
+        if self.kind == "link":
+            return f"symlink -> {self.link}"
+        return self.kind
+
+
+@dataclass(frozen=True)
+class DirSnapshot:
+    """Identity and mtime of a directory holding planned links.
+
+    Symlinks cannot be changed in place: retargeting, removing or replacing
+    one rewrites its directory entry, which bumps the directory's mtime. So
+    a directory whose snapshot still matches vouches for all of its links,
+    and only the links of changed directories are looked at again.
+    """
+
+    path: Path
+    dev: int = 0
+    ino: int = 0
+    mtime_ns: int = 0
+
+    @classmethod
+    def take(cls, path: Path) -> "DirSnapshot":
+        path = Path(path)
+        try:
+            st = os.stat(path)
+        except OSError:
+            return cls(path)
+        return cls(path, st.st_dev, st.st_ino, st.st_mtime_ns)
+
+
+class ActionLines(Sequence[str]):
+    """Read-only list of action lines whose per-item lines are built on demand.
+
+    ``head`` and ``tail`` are stored lines; between them comes
+    ``line(item)`` for each of ``items``. Indexing, slicing, ``len`` and
+    iteration never hold more than the requested lines.
+    """
+
+    def __init__(
+        self,
+        head: Sequence[str],
+        items: Sequence[Any],
+        line: Callable[[Any], str],
+        tail: Sequence[str] = (),
+    ) -> None:
+        self._head = head
+        self._items = items
+        self._line = line
+        self._tail = tail
+
+    def __len__(self) -> int:
+        return len(self._head) + len(self._items) + len(self._tail)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("action line index out of range")
+        if index < len(self._head):
+            return self._head[index]
+        index -= len(self._head)
+        if index < len(self._items):
+            return self._line(self._items[index])
+        return self._tail[index - len(self._items)]
+
+    def __iter__(self) -> Iterator[str]:
+        yield from self._head
+        for item in self._items:
+            yield self._line(item)
+        yield from self._tail
+
+    def __repr__(self) -> str:
+        return f"<ActionLines: {len(self)} lines>"
+
+
+def materialize_line(
+    verb: str, source: Path, link: Path, strategy: str, hardlink: bool
+) -> str:
+    """Plan line for a link that gets its own copy of ``source``."""
+
+    if strategy == "hardlink":
+        return (
+            f"{verb}: {link} <= hard links to {source} "
+            "(shares inodes: edits show in both)"
+        )
+    if strategy == "reflink":
+        note = "other device, " if hardlink else ""
+        return (
+            f"{verb}: {link} <= reflink clone of {source} "
+            f"({note}copy-on-write: shares extents until modified)"
+        )
+    # ``auto``: reflink support is probed when copying, not while planning.
+    maybe = "; reflink if supported" if strategy == "auto" else ""
+    if hardlink:
+        return (
+            f"{verb}: {link} <= copy from {source} "
+            f"(other device, hard links impossible{maybe})"
+        )
+    if maybe:
+        return f"{verb}: {link} <= copy from {source} (reflink if supported)"
+    return f"{verb}: {link} <= copy from {source}"
+
+
+@dataclass
+class MigrationPlan:
+    """Everything decided while planning a migration or move-only operation.
+
+    Attributes:
+        current_target: Resolved directory the links point at now.
+        new_target: Resolved destination.
+        links: Symlinks to update (or delete for ``MOVE_ONLY``).
+        link_mode: ``relative``, ``absolute``, an inline mode or ``MOVE_ONLY``.
+        conflict_strategy: How an existing destination is handled.
+        backup_path: Where an existing destination is renamed to, if backing up.
+        resuming: A journaled partial copy at ``new_target`` will be resumed.
+        merge: The merge plan when merging into an existing destination.
+        verify: Copy verification mode (see ``VERIFY_MODES``).
+        verify_confidence: Confidence for ``sampled`` verification.
+        two_phase: Pre-copy plus final delta sync for cross-device moves.
+        background_delete: Delete a copied source in the background.
+        copy_backend: ``files`` (per-file engine) or ``tar`` (one streamed
+            archive) for a cross-device copy.
+        source_files: Regular files in the source, when it was summarised.
+        source_bytes: Their total size.
+        actions: Plan lines before the per-link lines.
+        checks: Plan lines after them (preflight results).
+        link_strategies: For inline modes, ``hardlink``/``reflink``/``copy``
+            (``auto`` when reflinks were not probed yet) per link directory;
+            per-link lines are generated from it.
+        snapshots: lstat identities revalidated before execution.
+        link_dirs: Identity and mtime of each directory holding links; a
+            changed one gets its links re-checked before execution.
+        created: Unix time the plan was made.
+    """
+
+    current_target: Path
+    new_target: Path
+    links: List[Path]
+    link_mode: str = "relative"
+    conflict_strategy: str = "abort"
+    backup_path: Optional[Path] = None
+    resuming: bool = False
+    merge: Optional[MergePlan] = None
+    verify: str = "metadata"
+    verify_confidence: float = DEFAULT_CONFIDENCE
+    two_phase: bool = False
+    background_delete: bool = False
+    copy_backend: str = FILES
+    source_files: Optional[int] = None
+    source_bytes: Optional[int] = None
+    actions: List[str] = field(default_factory=list)
+    checks: List[str] = field(default_factory=list)
+    link_strategies: Dict[str, str] = field(default_factory=dict)
+    snapshots: List[PathSnapshot] = field(default_factory=list)
+    link_dirs: List[DirSnapshot] = field(default_factory=list)
+    created: float = field(default_factory=time.time)
+
+    @property
+    def operation(self) -> str:
+        return "move-only" if self.link_mode == MOVE_ONLY else "migrate"
+
+    def link_line(self, link: Path) -> str:
+        if self.link_mode == MOVE_ONLY:
+            return f"Delete link: {link}"
+        if self.link_mode.startswith("inline"):
+            return materialize_line(
+                "Inline",
+                self.new_target,
+                link,
+                self.link_strategies.get(str(link.parent), "copy"),
+                self.link_mode == "inline-hardlink",
+            )
+        return f"Link: {link} -> {self.new_target} ({self.link_mode})"
+
+    def iter_actions(self, limit: Optional[int] = None) -> Iterator[str]:
+        """Plan lines, generated lazily; per-link lines are built on demand.
+
+        With ``limit``, at most that many per-link lines are yielded, followed
+        by one line counting the rest.
+        """
+
+        yield from self.actions
+        for index, link in enumerate(self.links):
+            if limit is not None and index >= limit:
+                yield f"... and {len(self.links) - limit} more links"
+                break
+            yield self.link_line(link)
+        yield from self.checks
+
+    def render(self) -> List[str]:
+        return list(self.iter_actions())
+
+    def lines(self) -> ActionLines:
+        """All plan lines as a lazy sequence; per-link lines are built on access."""
+
+        return ActionLines(self.actions, self.links, self.link_line, self.checks)
+
+    def snapshot(self) -> None:
+        """Record the identity of every path execution depends on.
+
+        Links are covered by one :class:`DirSnapshot` per link directory
+        rather than one snapshot each.
+        """
+
+        paths = [self.current_target, self.new_target]
+        if self.backup_path is not None:
+            paths.append(self.backup_path)
+        self.snapshots = [PathSnapshot.take(p) for p in paths]
+        parents = dict.fromkeys(Path(link).parent for link in self.links)
+        self.link_dirs = [DirSnapshot.take(parent) for parent in parents]
+
+    def _link_reason(self, link: Path) -> Optional[str]:
+        """Why ``link`` no longer points at ``current_target``, if it does not."""
+
+        now = PathSnapshot.take(link)
+        if now.kind == "link":
+            if Path(os.path.realpath(link)) == self.current_target:
+                return None
+        return f"{link}: was symlink -> {self.current_target}, now {now.describe()}"
+
+    def stale_reasons(self) -> List[str]:
+        """Paths whose lstat identity changed since :meth:`snapshot`.
+
+        The links of a directory whose mtime moved are checked one by one:
+        each must still be a symlink resolving to ``current_target``.
+        """
+
+        reasons = []
+        for old in self.snapshots:
+            now = PathSnapshot.take(old.path)
+            if now != old:
+                reasons.append(
+                    f"{old.path}: was {old.describe()}, now {now.describe()}"
+                )
+        changed = {d.path for d in self.link_dirs if DirSnapshot.take(d.path) != d}
+        if changed:
+            for link in self.links:
+                if Path(link).parent in changed:
+                    reason = self._link_reason(Path(link))
+                    if reason is not None:
+                        reasons.append(reason)
+        return reasons
+
+    def log_records(
+        self, phase: str, ts: Optional[float] = None
+    ) -> List[Dict[str, Any]]:
+        return list(self.iter_log_records(phase, ts))
+
+    def iter_log_records(
+        self, phase: str, ts: Optional[float] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """JSON Lines records for ``--log-json``, one per effect, generated lazily."""
+
+        ts = time.time() if ts is None else ts
+        if self.backup_path is not None:
+            yield {
+                "phase": phase,
+                "type": "backup",
+                "from": str(self.new_target),
+                "to": str(self.backup_path),
+                "ts": ts,
+            }
+        move: Dict[str, Any] = {
+            "phase": phase,
+            "type": "move",
+            "from": str(self.current_target),
+            "to": str(self.new_target),
+            "link_mode": self.link_mode,
+            "ts": ts,
+        }
+        if self.merge is not None:
+            move["conflict_strategy"] = "merge"
+        yield move
+        if self.link_mode == MOVE_ONLY:
+            for link in self.links:
+                yield {"phase": phase, "type": "unlink", "link": str(link), "ts": ts}
+            return
+        inline = self.link_mode.startswith("inline")
+        record_type = "materialize" if inline else "retarget"
+        for link in self.links:
+            yield {
+                "phase": phase,
+                "type": record_type,
+                "link": str(link),
+                "to": str(self.new_target),
+                "link_mode": self.link_mode,
+                "ts": ts,
+            }
+
+    def to_dict(self) -> Dict[str, Any]:
+        merge = None
+        if self.merge is not None:
+            merge = {
+                "source": str(self.merge.source),
+                "destination": str(self.merge.destination),
+                "missing": list(self.merge.missing),
+                "files": self.merge.files,
+                "bytes": self.merge.bytes,
+                "identical": self.merge.identical,
+                "retouch": list(self.merge.retouch),
+            }
+        return {
+            "version": PLAN_VERSION,
+            "current_target": str(self.current_target),
+            "new_target": str(self.new_target),
+            "links": [str(p) for p in self.links],
+            "link_mode": self.link_mode,
+            "conflict_strategy": self.conflict_strategy,
+            "backup_path": None if self.backup_path is None else str(self.backup_path),
+            "resuming": self.resuming,
+            "merge": merge,
+            "verify": self.verify,
+            "verify_confidence": self.verify_confidence,
+            "two_phase": self.two_phase,
+            "background_delete": self.background_delete,
+            "copy_backend": self.copy_backend,
+            "source_files": self.source_files,
+            "source_bytes": self.source_bytes,
+            "actions": list(self.actions),
+            "checks": list(self.checks),
+            "link_strategies": dict(self.link_strategies),
+            "snapshots": [
+                {
+                    "path": str(s.path),
+                    "kind": s.kind,
+                    "dev": s.dev,
+                    "ino": s.ino,
+                    "link": s.link,
+                }
+                for s in self.snapshots
+            ],
+            "link_dirs": [
+                {
+                    "path": str(d.path),
+                    "dev": d.dev,
+                    "ino": d.ino,
+                    "mtime_ns": d.mtime_ns,
+                }
+                for d in self.link_dirs
+            ],
+            "created": self.created,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "MigrationPlan":
+        if data.get("version") != PLAN_VERSION:
+            raise ValueError(f"Unsupported plan version: {data.get('version')}")
+        merge = None
+        if data.get("merge"):
+            m = data["merge"]
+            merge = MergePlan(
+                source=Path(m["source"]),
+                destination=Path(m["destination"]),
+                missing=list(m["missing"]),
+                files=int(m["files"]),
+                bytes=int(m["bytes"]),
+                identical=int(m["identical"]),
+                retouch=list(m["retouch"]),
+            )
+        return cls(
+            current_target=Path(data["current_target"]),
+            new_target=Path(data["new_target"]),
+            links=[Path(p) for p in data["links"]],
+            link_mode=data["link_mode"],
+            conflict_strategy=data["conflict_strategy"],
+            backup_path=Path(data["backup_path"]) if data.get("backup_path") else None,
+            resuming=bool(data["resuming"]),
+            merge=merge,
+            verify=data["verify"],
+            verify_confidence=float(data["verify_confidence"]),
+            two_phase=bool(data["two_phase"]),
+            background_delete=bool(data["background_delete"]),
+            copy_backend=data.get("copy_backend", FILES),
+            source_files=data.get("source_files"),
+            source_bytes=data.get("source_bytes"),
+            actions=list(data["actions"]),
+            checks=list(data["checks"]),
+            link_strategies=dict(data["link_strategies"]),
+            snapshots=[
+                PathSnapshot(
+                    Path(s["path"]),
+                    s["kind"],
+                    int(s["dev"]),
+                    int(s["ino"]),
+                    s.get("link"),
+                )
+                for s in data["snapshots"]
+            ],
+            link_dirs=[
+                DirSnapshot(
+                    Path(d["path"]), int(d["dev"]), int(d["ino"]), int(d["mtime_ns"])
+                )
+                for d in data.get("link_dirs", [])
+            ],
+            created=float(data["created"]),
+        )
+
+    def save(self, path: Path) -> None:
+        path = Path(path).expanduser()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(
+            json.dumps(self.to_dict(), ensure_ascii=False, indent=2) + "\n",
+            encoding="utf-8",
+        )
+
+    @classmethod
+    def load(cls, path: Path) -> "MigrationPlan":
+        text = Path(path).expanduser().read_text(encoding="utf-8")
+        return cls.from_dict(json.loads(text))
+
+
+__all__ = [
+    "ActionLines",
+    "DirSnapshot",
+    "MOVE_ONLY",
+    "MigrationPlan",
+    "PLAN_VERSION",
+    "PathSnapshot",
+    "materialize_line",
+]
@@ -0,0 +1,112 @@
+"""Free-space and free-inode checks run before any data is copied."""
+
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .summary import format_bytes
+
+
+@dataclass
+class DeviceCapacity:
+    """What one destination device must hold versus what it has free.
+
+    Attributes:
+        device: ``st_dev`` shared by every destination counted here.
+        path: First existing directory seen on the device (used for statvfs).
+        bytes: Bytes that will be written to the device.
+        inodes: Files that will be created on the device.
+        free_bytes: Bytes available to unprivileged users.
+        free_inodes: Inodes available, or ``None`` when the filesystem does
+            not report a fixed inode count (btrfs, many network mounts).
+    """
+
+    device: int
+    path: Path
+    bytes: int = 0
+    inodes: int = 0
+    free_bytes: int = 0
+    free_inodes: Optional[int] = None
+
+    @property
+    def shortfall_bytes(self) -> int:
+        return max(0, self.bytes - self.free_bytes)
+
+    @property
+    def shortfall_inodes(self) -> int:
+        if self.free_inodes is None:
+            return 0
+        return max(0, self.inodes - self.free_inodes)
+
+    @property
+    def ok(self) -> bool:
+        return not self.shortfall_bytes and not self.shortfall_inodes
+
+    def describe(self) -> str:
+        inodes = "?" if self.free_inodes is None else str(self.free_inodes)
+        text = (
+            f"{self.path}: needs {format_bytes(self.bytes)}/{self.inodes} inodes, "
+            f"free {format_bytes(self.free_bytes)}/{inodes} inodes"
+        )
+        short = []
+        if self.shortfall_bytes:
+            short.append(
+                f"{format_bytes(self.shortfall_bytes)} ({self.shortfall_bytes} bytes)"
+            )
+        if self.shortfall_inodes:
+            short.append(f"{self.shortfall_inodes} inodes")
+        return text + (f" — short by {' and '.join(short)}" if short else "")
+
+
+@dataclass
+class CapacityReport:
+    """Per-device outcome of :func:`check_capacity`."""
+
+    devices: List[DeviceCapacity]
+
+    @property
+    def ok(self) -> bool:
+        return all(d.ok for d in self.devices)
+
+    def shortfalls(self) -> List[str]:
+        return [d.describe() for d in self.devices if not d.ok]
+
+
+def _existing_dir(path: Path) -> Path:
+    path = Path(path)
+    while not path.is_dir() and path != path.parent:
+        path = path.parent
+    return path
+
+
+def check_capacity(needs: Iterable[Tuple[Path, int, int]]) -> CapacityReport:
+    """Sum ``(destination, bytes, inodes)`` needs per device and compare to statvfs.
+
+    Destinations need not exist yet; their nearest existing ancestor decides
+    the device. Needs are lower bounds: directories and block rounding are
+    not counted, so a device that passes can still be very nearly full.
+    Without ``os.statvfs`` (Windows) nothing is checked.
+    """
+
+    if not hasattr(os, "statvfs"):
+        return CapacityReport([])
+    devices: Dict[int, DeviceCapacity] = {}
+    for dest, nbytes, inodes in needs:
+        where = _existing_dir(dest)
+        dev = os.stat(where).st_dev
+        entry = devices.get(dev)
+        if entry is None:
+            entry = devices[dev] = DeviceCapacity(device=dev, path=where)
+        entry.bytes += nbytes
+        entry.inodes += inodes
+    for entry in devices.values():
+        vfs = os.statvfs(entry.path)
+        entry.free_bytes = vfs.f_bavail * vfs.f_frsize
+        entry.free_inodes = vfs.f_favail if vfs.f_files else None
+    return CapacityReport(list(devices.values()))
+
+
+__all__ = ["CapacityReport", "DeviceCapacity", "check_capacity"]
@@ -0,0 +1,208 @@
+"""Progress reporting for long-running copies (moves, inline copies, merges).
+
+The copy engines advance a :class:`ProgressTracker` as bytes are transferred
+and files finish; the tracker turns those counters into :class:`Progress`
+snapshots (done vs. total, current file, rate, ETA) and hands them to a
+callback at most every ``interval`` seconds, plus once when the step ends.
+Totals come from the tree summary computed while planning; without one the
+snapshots still count but have no fraction or ETA.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional
+
+from .summary import format_bytes
+
+# Seconds between callbacks; copies update counters far more often.
+DEFAULT_PROGRESS_INTERVAL = 0.5
+
+
+@dataclass(frozen=True)
+class Progress:
+    """One snapshot of a step; ``*_total`` are ``None`` when unknown."""
+
+    phase: str
+    files_done: int
+    bytes_done: int
+    files_total: Optional[int]
+    bytes_total: Optional[int]
+    current: Optional[str]
+    elapsed: float
+    finished: bool = False
+
+    @property
+    def rate(self) -> float:
+        """Bytes per second since the step started."""
+
+        return self.bytes_done / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def fraction(self) -> Optional[float]:
+        """Share done by bytes (by files if there are none), ``None`` without totals."""
+
+        if self.finished:
+            return 1.0
+        if self.bytes_total:
+            return min(1.0, self.bytes_done / self.bytes_total)
+        if self.files_total:
+            return min(1.0, self.files_done / self.files_total)
+        return None
+
+    @property
+    def eta(self) -> Optional[float]:
+        """Seconds left at the average rate so far, ``None`` when unknown."""
+
+        if self.finished:
+            return 0.0
+        fraction = self.fraction
+        if not fraction or self.elapsed <= 0:
+            return None
+        return self.elapsed * (1 - fraction) / fraction
+
+    def describe(self) -> str:
+        parts = [self.phase]
+        fraction = self.fraction
+        if fraction is not None:
+            parts.append(f"{fraction:.0%}")
+        size = format_bytes(self.bytes_done)
+        if self.bytes_total:
+            size += f"/{format_bytes(self.bytes_total)}"
+        files = f"{self.files_done}"
+        if self.files_total:
+            files += f"/{self.files_total}"
+        parts.append(f"{size}, {files} files, {format_bytes(int(self.rate))}/s")
+        if self.eta is not None and not self.finished:
+            parts.append(f"ETA {format_duration(self.eta)}")
+        return " ".join(parts)
+
+    def to_record(self) -> Dict[str, Any]:
+        """JSON-friendly fields, as written to ``--log-json``."""
+
+        return {
+            "type": "progress",
+            "step": self.phase,
+            "files": self.files_done,
+            "bytes": self.bytes_done,
+            "files_total": self.files_total,
+            "bytes_total": self.bytes_total,
+            "current": self.current,
+            "rate": round(self.rate, 1),
+            "eta": None if self.eta is None else round(self.eta, 1),
+            "elapsed": round(self.elapsed, 3),
+            "finished": self.finished,
+        }
+
+
+def format_duration(seconds: float) -> str:
+    """``75`` -> ``1:15``, ``3725`` -> ``1:02:05``."""
+
+    minutes, secs = divmod(int(round(seconds)), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{secs:02d}"
+    return f"{minutes}:{secs:02d}"
+
+
+class ProgressTracker:
+    """Counters for one step, shared by the copy worker threads.
+
+    ``callback`` runs on whichever thread crosses the interval (one at a
+    time), so it should be quick. Done counts may overshoot stale totals;
+    the fraction is capped at 100%.
+    """
+
+    def __init__(
+        self,
+        phase: str,
+        callback: Callable[[Progress], None],
+        *,
+        files_total: Optional[int] = None,
+        bytes_total: Optional[int] = None,
+        interval: float = DEFAULT_PROGRESS_INTERVAL,
+    ) -> None:
+        self.phase = phase
+        self.callback = callback
+        self.files_total = files_total
+        self.bytes_total = bytes_total
+        self.interval = interval
+        self.files = 0
+        self.bytes = 0
+        # Last file started by any worker; plain assignment, no lock needed.
+        self.current: Optional[str] = None
+        self._lock = threading.Lock()
+        self._emit_lock = threading.Lock()
+        self._started = time.monotonic()
+        self._last = self._started
+
+    def add(self, nbytes: int = 0, files: int = 0) -> None:
+        """Count work just done and report if the interval has passed."""
+
+        now = time.monotonic()
+        with self._lock:
+            self.bytes += nbytes
+            self.files += files
+            due = now - self._last >= self.interval
+            if due:
+                self._last = now
+        if due:
+            self._emit()
+
+    def snapshot(self, finished: bool = False) -> Progress:
+        with self._lock:
+            return Progress(
+                phase=self.phase,
+                files_done=self.files,
+                bytes_done=self.bytes,
+                files_total=self.files_total,
+                bytes_total=self.bytes_total,
+                current=self.current,
+                elapsed=time.monotonic() - self._started,
+                finished=finished,
+            )
+
+    def finish(self) -> None:
+        """Report the final snapshot; call once, after the step succeeded."""
+
+        self.current = None
+        with self._emit_lock:
+            self.callback(self.snapshot(finished=True))
+
+    def _emit(self) -> None:
+        if not self._emit_lock.acquire(blocking=False):
+            return  # another thread is reporting right now
+        try:
+            self.callback(self.snapshot())
+        finally:
+            self._emit_lock.release()
+
+
+def track(
+    phase: str,
+    callback: Optional[Callable[[Progress], None]],
+    files_total: Optional[int] = None,
+    bytes_total: Optional[int] = None,
+) -> Optional[ProgressTracker]:
+    """A tracker for ``phase``, or ``None`` when nobody listens."""
+
+    if callback is None:
+        return None
+    return ProgressTracker(
+        phase,
+        callback,
+        files_total=files_total,
+        bytes_total=bytes_total,
+        interval=DEFAULT_PROGRESS_INTERVAL,
+    )
+
+
+__all__ = [
+    "DEFAULT_PROGRESS_INTERVAL",
+    "Progress",
+    "ProgressTracker",
+    "format_duration",
+    "track",
+]
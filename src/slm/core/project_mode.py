@@ -38,10 +38,12 @@ from .migration import (
     MigrationError,
     _retarget_symlink,
     _materialize_link,
+    _materialize_links,
 )
 
-# Type alias for link modes
-LinkMode = Literal["relative", "absolute", "inline", "missing"]
+# Type alias for link modes. "inline-hardlink" is only a target for
+# set_project_data_mode; the resulting directory reports as "inline".
+LinkMode = Literal["relative", "absolute", "inline", "inline-hardlink", "missing"]
 
 # Fixed data directory name (per [#Q15] decision)
 DATA_DIR_NAME = "data"
@@ -195,7 +197,9 @@ def set_project_data_mode(
     Args:
         project_root: The project's root directory.
         data_root: The root directory where data folders are stored.
-        mode: Target mode - 'relative', 'absolute', or 'inline'.
+        mode: Target mode - 'relative', 'absolute', 'inline', or
+            'inline-hardlink' (hard links sharing inodes with the target when
+            on the same device, a copy otherwise).
         dry_run: If True, only return what would happen without making changes.
 
     Returns:
@@ -222,8 +226,11 @@ def set_project_data_mode(
             f"Cannot set mode: data directory does not exist at {data_path}"
         )
 
+    # Both inline variants end up as a real directory
+    resulting_mode: LinkMode = "inline" if mode == "inline-hardlink" else mode
+
     # Already in target mode
-    if current_status.mode == mode:
+    if current_status.mode == resulting_mode:
         return current_status
 
     if dry_run:
@@ -231,7 +238,7 @@ def set_project_data_mode(
         return ProjectDataStatus(
             project_root=project_root,
             data_path=data_path,
-            mode=mode,
+            mode=resulting_mode,
             link_text=current_status.link_text,
             target_path=current_status.target_path,
             shared_with=current_status.shared_with,
@@ -242,6 +249,9 @@ def set_project_data_mode(
         # Convert symlink to real directory
         if current_status.mode in ("relative", "absolute"):
             _materialize_link(current_status.target_path, data_path)
+    elif mode == "inline-hardlink":
+        if current_status.mode in ("relative", "absolute"):
+            _materialize_links(current_status.target_path, [data_path], hardlink=True)
     elif mode in ("relative", "absolute"):
         if current_status.mode == "inline":
             # Cannot convert inline to symlink without specifying target
@@ -0,0 +1,235 @@
+"""Atomic, parallel symlink retargeting.
+
+Each link is replaced by creating the new symlink under a temporary name in
+the same directory and renaming it over the old one, so the link never
+disappears: readers see the old target or the new one. Links are grouped
+by directory; each group is handled by one worker through a directory fd,
+and verification compares ``readlink`` text instead of resolving paths.
+"""
+
+from __future__ import annotations
+
+import functools
+import itertools
+import os
+import stat
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+DEFAULT_RETARGET_WORKERS = 8
+# Links grouped and dispatched at a time, so memory does not grow with the
+# total number of links.
+CHUNK_SIZE = 4096
+_O_DIR = os.O_RDONLY | getattr(os, "O_DIRECTORY", 0)
+_HAVE_DIR_FD = {os.open, os.stat, os.symlink, os.readlink, os.unlink} <= (
+    os.supports_dir_fd
+)
+
+
+class RetargetError(OSError):
+    """One or more links could not be retargeted.
+
+    ``failures`` lists ``(link, exception)`` for every link that kept its old
+    target; all other links were switched.
+    """
+
+    def __init__(self, failures: List[Tuple[Path, BaseException]]) -> None:
+        link, exc = failures[0]
+        more = f" (and {len(failures) - 1} more)" if len(failures) > 1 else ""
+        super().__init__(f"{link}: {exc}{more}")
+        self.failures = failures
+
+
+def link_text(link: Path, target: Path, *, relative: bool) -> str:
+    """What ``link`` should contain to point at ``target``."""
+
+    if relative:
+        try:
+            return os.path.relpath(str(target), start=str(link.parent))
+        except ValueError:
+            pass
+    return str(target)
+
+
+def _group(pairs: Iterable[Tuple[Path, str]]) -> Dict[Path, List[Tuple[str, str]]]:
+    groups: Dict[Path, List[Tuple[str, str]]] = {}
+    for link, text in pairs:
+        link = Path(link)
+        groups.setdefault(link.parent, []).append((link.name, text))
+    return groups
+
+
+def _chunks(
+    pairs: Iterable[Tuple[Path, str]]
+) -> Iterator[Dict[Path, List[Tuple[str, str]]]]:
+    it = iter(pairs)
+    while True:
+        chunk = list(itertools.islice(it, CHUNK_SIZE))
+        if not chunk:
+            return
+        yield _group(chunk)
+
+
+def _run_groups(groups, worker, max_workers: int) -> List:
+    """Apply ``worker(parent, items)`` to each group; concatenate its results."""
+
+    if max_workers <= 1 or len(groups) <= 1:
+        results = [worker(parent, items) for parent, items in groups.items()]
+    else:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(groups))) as pool:
+            results = list(pool.map(lambda g: worker(*g), groups.items()))
+    return [item for result in results for item in result]
+
+
+def _open_dir(parent: Path) -> Optional[int]:
+    return os.open(parent, _O_DIR) if _HAVE_DIR_FD else None
+
+
+def _replace_in_dir(
+    parent: Path, items: List[Tuple[str, str]], *, missing_ok: bool = False
+) -> List[Tuple[Path, BaseException]]:
+    failures: List[Tuple[Path, BaseException]] = []
+    try:
+        fd = _open_dir(parent)
+    except OSError as exc:
+        return [(parent / name, exc) for name, _ in items]
+
+    def at(name: str) -> str:
+        return name if fd is not None else str(parent / name)
+
+    try:
+        for name, text in items:
+            temp = f".{name}.slm-link-{uuid.uuid4().hex[:8]}"
+            try:
+                try:
+                    st = os.stat(at(name), dir_fd=fd, follow_symlinks=False)
+                except FileNotFoundError:
+                    if not missing_ok:
+                        raise
+                else:
+                    if not stat.S_ISLNK(st.st_mode):
+                        raise ValueError("Not a symlink")
+                os.symlink(text, at(temp), dir_fd=fd)
+                try:
+                    os.replace(at(temp), at(name), src_dir_fd=fd, dst_dir_fd=fd)
+                except OSError:
+                    os.unlink(at(temp), dir_fd=fd)
+                    raise
+            except (OSError, ValueError) as exc:
+                failures.append((parent / name, exc))
+    finally:
+        if fd is not None:
+            os.close(fd)
+    return failures
+
+
+def _check_in_dir(parent: Path, items: List[Tuple[str, str]]) -> List[Path]:
+    try:
+        fd = _open_dir(parent)
+    except OSError:
+        return [parent / name for name, _ in items]
+    bad: List[Path] = []
+    try:
+        for name, text in items:
+            try:
+                if fd is not None:
+                    actual = os.readlink(name, dir_fd=fd)
+                else:
+                    actual = os.readlink(parent / name)
+            except OSError:
+                actual = None
+            if actual != text:
+                bad.append(parent / name)
+    finally:
+        if fd is not None:
+            os.close(fd)
+    return bad
+
+
+def split_unchanged(
+    pairs: Iterable[Tuple[Path, str]],
+    *,
+    max_workers: int = DEFAULT_RETARGET_WORKERS,
+) -> Iterator[Tuple[List[Tuple[Path, str]], List[Tuple[Path, str]]]]:
+    """Yield ``(changed, unchanged)`` by current ``readlink`` text, per chunk.
+
+    ``pairs`` is consumed lazily, :data:`CHUNK_SIZE` links at a time, and
+    each chunk is split as soon as its links were read. Unchanged links
+    already hold exactly the text that would be written; rewriting them
+    would only churn their directories' mtimes.
+    """
+
+    it = iter(pairs)
+    while True:
+        chunk = list(itertools.islice(it, CHUNK_SIZE))
+        if not chunk:
+            return
+        stale = set(verify_links(chunk, max_workers=max_workers))
+        changed = [pair for pair in chunk if Path(pair[0]) in stale]
+        unchanged = [pair for pair in chunk if Path(pair[0]) not in stale]
+        yield changed, unchanged
+
+
+def retarget_links(
+    pairs: Iterable[Tuple[Path, str]],
+    *,
+    max_workers: int = DEFAULT_RETARGET_WORKERS,
+) -> None:
+    """Atomically set every existing symlink ``link`` to ``text``.
+
+    ``pairs`` is consumed lazily, :data:`CHUNK_SIZE` links at a time.
+    Directories are processed concurrently, the links within one directory
+    in order. Raises :class:`RetargetError` after all directories were
+    processed if any link (including a path that is not a symlink) failed.
+    """
+
+    failures: List[Tuple[Path, BaseException]] = []
+    for groups in _chunks(pairs):
+        failures.extend(_run_groups(groups, _replace_in_dir, max_workers))
+    if failures:
+        raise RetargetError(failures)
+
+
+def restore_links(
+    pairs: Iterable[Tuple[Path, str]],
+    *,
+    max_workers: int = DEFAULT_RETARGET_WORKERS,
+) -> None:
+    """Like :func:`retarget_links`, but also recreates links that are missing.
+
+    Used to put deleted or replaced links back; an existing path that is not
+    a symlink still fails instead of being overwritten.
+    """
+
+    worker = functools.partial(_replace_in_dir, missing_ok=True)
+    failures: List[Tuple[Path, BaseException]] = []
+    for groups in _chunks(pairs):
+        failures.extend(_run_groups(groups, worker, max_workers))
+    if failures:
+        raise RetargetError(failures)
+
+
+def verify_links(
+    pairs: Iterable[Tuple[Path, str]],
+    *,
+    max_workers: int = DEFAULT_RETARGET_WORKERS,
+) -> List[Path]:
+    """Links whose ``readlink`` text is not the expected one (or unreadable)."""
+
+    bad: List[Path] = []
+    for groups in _chunks(pairs):
+        bad.extend(_run_groups(groups, _check_in_dir, max_workers))
+    return bad
+
+
+__all__ = [
+    "DEFAULT_RETARGET_WORKERS",
+    "RetargetError",
+    "link_text",
+    "restore_links",
+    "retarget_links",
+    "split_unchanged",
+    "verify_links",
+]
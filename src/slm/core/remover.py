@@ -0,0 +1,278 @@
+"""Parallel directory deletion used after cross-device copies and for temp cleanup.
+
+Each directory is opened by the worker that empties it, with
+``O_NOFOLLOW``, and checked against the identity (device, inode) its parent
+listed, so a directory swapped for a symlink mid-delete is never followed;
+its entries are listed through that descriptor and removed with
+``unlink(name, dir_fd=fd)``. Only the workers hold descriptors, so wide
+trees never run into the open-file limit. Sibling subtrees are emptied on a
+thread pool; the now-empty directories are removed by path, deepest first,
+at the end (``rmdir`` only ever removes empty directories).
+"""
+
+from __future__ import annotations
+
+import errno
+import os
+import shutil
+import stat
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from contextlib import suppress
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, List, Optional, Set, Tuple
+
+from . import throttle
+
+DEFAULT_REMOVE_WORKERS = 8
+_O_DIR = os.O_RDONLY | getattr(os, "O_DIRECTORY", 0) | getattr(os, "O_NOFOLLOW", 0)
+_HAVE_DIR_FD = (
+    {os.open, os.unlink, os.rmdir} <= os.supports_dir_fd
+    and os.scandir in os.supports_fd
+)
+
+
+@dataclass
+class RemoveStats:
+    """Counters for one deletion run; safe to update from worker threads."""
+
+    files: int = 0
+    dirs: int = 0
+    seconds: float = 0.0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def _add(self, files: int = 0, dirs: int = 0) -> None:
+        with self._lock:
+            self.files += files
+            self.dirs += dirs
+
+    def describe(self) -> str:
+        rate = self.files / self.seconds if self.seconds > 0 else 0.0
+        return (
+            f"removed files={self.files} dirs={self.dirs} "
+            f"in {self.seconds:.2f}s ({rate:.0f} files/s)"
+        )
+
+
+def _empty_dir(
+    path: str, identity: Optional[Tuple[int, int]], stats: RemoveStats
+) -> Tuple[List[Tuple[str, Tuple[int, int]]], List[Tuple[str, BaseException]]]:
+    """Open ``path``, unlink every non-directory in it and list its subdirectories.
+
+    ``identity`` is the (device, inode) the parent listed for ``path``; a
+    directory that no longer matches it is reported, not emptied. Returns
+    the subdirectories (with their identities) for the caller to schedule,
+    plus any errors. The descriptor is closed before returning.
+    """
+
+    subdirs: List[Tuple[str, Tuple[int, int]]] = []
+    errors: List[Tuple[str, BaseException]] = []
+    unlinked = 0
+    try:
+        fd = os.open(path, _O_DIR)
+    except FileNotFoundError:
+        return subdirs, errors
+    except OSError as exc:
+        return subdirs, [(path, exc)]
+    try:
+        st = os.fstat(fd)
+        if identity is not None and (st.st_dev, st.st_ino) != identity:
+            raise OSError(errno.ESTALE, "directory was replaced during deletion")
+        with os.scandir(fd) as it:
+            entries = list(it)
+        for entry in entries:
+            child = os.path.join(path, entry.name)
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    child_st = entry.stat(follow_symlinks=False)
+                    subdirs.append((child, (child_st.st_dev, child_st.st_ino)))
+                else:
+                    throttle.consume(files=1)
+                    os.unlink(entry.name, dir_fd=fd)
+                    unlinked += 1
+            except FileNotFoundError:
+                continue
+            except OSError as exc:
+                errors.append((child, exc))
+    except OSError as exc:
+        errors.append((path, exc))
+    finally:
+        os.close(fd)
+    stats._add(files=unlinked)
+    return subdirs, errors
+
+
+def remove_tree(
+    path: Path,
+    *,
+    max_workers: int = DEFAULT_REMOVE_WORKERS,
+    ignore_errors: bool = False,
+    on_progress: Optional[Callable[[RemoveStats], None]] = None,
+    progress_interval: float = 0.5,
+) -> RemoveStats:
+    """Delete the directory tree at ``path``, like ``shutil.rmtree``.
+
+    ``on_progress`` is called from the calling thread at most every
+    ``progress_interval`` seconds, and once at the end. Errors are collected
+    and raised together as ``shutil.Error`` unless ``ignore_errors``. A
+    symlink at ``path`` itself is refused, as ``shutil.rmtree`` does. Falls
+    back to ``shutil.rmtree`` where ``dir_fd`` calls are unavailable.
+    """
+
+    path = Path(path)
+    stats = RemoveStats()
+    started = time.monotonic()
+    if not _HAVE_DIR_FD:
+        shutil.rmtree(path, ignore_errors=ignore_errors)
+        stats.seconds = time.monotonic() - started
+        return stats
+
+    errors: List[Tuple[str, BaseException]] = []
+    try:
+        st = os.lstat(path)
+        if stat.S_ISLNK(st.st_mode):
+            raise OSError(f"Cannot call remove_tree on a symbolic link: {path}")
+        if not stat.S_ISDIR(st.st_mode):
+            raise NotADirectoryError(errno.ENOTDIR, "Not a directory", str(path))
+    except OSError:
+        if ignore_errors:
+            return stats
+        raise
+
+    # Every directory that was listed, for the deepest-first rmdir pass.
+    emptied: List[str] = [str(path)]
+    last_report = started
+    with ThreadPoolExecutor(
+        max_workers=max(1, max_workers), thread_name_prefix="slm-rm"
+    ) as pool:
+        root = (st.st_dev, st.st_ino)
+        pending: Set[Future] = {pool.submit(_empty_dir, str(path), root, stats)}
+        while pending:
+            done, pending = wait(
+                pending, timeout=progress_interval, return_when="FIRST_COMPLETED"
+            )
+            for fut in done:
+                subdirs, errs = fut.result()
+                errors.extend(errs)
+                for child, identity in subdirs:
+                    emptied.append(child)
+                    pending.add(pool.submit(_empty_dir, child, identity, stats))
+            now = time.monotonic()
+            if on_progress is not None and now - last_report >= progress_interval:
+                stats.seconds = now - started
+                on_progress(stats)
+                last_report = now
+
+    # Deeper paths sort after their parents, so reversing removes leaves first.
+    for d in sorted(emptied, key=lambda p: p.count(os.sep), reverse=True):
+        try:
+            os.rmdir(d)
+            stats._add(dirs=1)
+        except FileNotFoundError:
+            continue
+        except OSError as exc:
+            errors.append((d, exc))
+    stats.seconds = time.monotonic() - started
+    if on_progress is not None:
+        on_progress(stats)
+    if errors and not ignore_errors:
+        raise shutil.Error([(p, p, str(exc)) for p, exc in errors])
+    return stats
+
+
+def rename_aside(path: Path) -> Path:
+    """Atomically move ``path`` to a hidden sibling so it can be deleted later."""
+
+    path = Path(path)
+    trash = path.with_name(f".{path.name}.slm-trash-{uuid.uuid4().hex[:8]}")
+    os.rename(path, trash)
+    return trash
+
+
+@dataclass
+class BackgroundRemoval:
+    """Handle for a deletion started by :func:`remove_tree_in_background`."""
+
+    trash: Path
+    process: Optional[subprocess.Popen] = None
+    thread: Optional[threading.Thread] = None
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until the deletion finishes; returns whether it did."""
+
+        if self.process is not None:
+            with suppress(subprocess.TimeoutExpired):
+                self.process.wait(timeout)
+            return self.process.poll() is not None
+        if self.thread is not None:
+            self.thread.join(timeout)
+            return not self.thread.is_alive()
+        return True
+
+
+_DETACHED_REMOVE = (
+    "import sys\n"
+    "from slm.core.remover import remove_tree\n"
+    "from slm.core.throttle import Throttle, throttled\n"
+    "with throttled(Throttle.from_environment()):\n"
+    "    remove_tree(sys.argv[1], ignore_errors=True)\n"
+)
+
+
+def remove_tree_in_background(path: Path, *, detach: bool = True) -> BackgroundRemoval:
+    """Rename ``path`` aside, then delete it without blocking the caller.
+
+    The rename is synchronous, so ``path`` is free as soon as this returns.
+    With ``detach=True`` the deletion runs in its own session and outlives
+    this process (a CLI can exit right away); otherwise it runs on a daemon
+    thread. An interrupted deletion leaves a ``.<name>.slm-trash-*`` sibling
+    that is safe to remove by hand.
+    """
+
+    trash = rename_aside(path)
+    if detach:
+        # Make this copy of slm importable even when it is not installed.
+        package_root = str(Path(__file__).resolve().parents[2])
+        pythonpath = os.environ.get("PYTHONPATH")
+        env = dict(
+            os.environ,
+            PYTHONPATH=os.pathsep.join(filter(None, [package_root, pythonpath])),
+        )
+        limiter = throttle.current()
+        if limiter is not None:
+            # The IO priority is inherited; the caps travel in the environment.
+            env[throttle.ENV_VAR] = limiter.to_env()
+        process = subprocess.Popen(
+            [sys.executable, "-c", _DETACHED_REMOVE, str(trash)],
+            env=env,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True,
+            close_fds=True,
+        )
+        return BackgroundRemoval(trash, process=process)
+    thread = threading.Thread(
+        target=remove_tree,
+        args=(trash,),
+        kwargs={"ignore_errors": True},
+        name="slm-rm-background",
+        daemon=True,
+    )
+    thread.start()
+    return BackgroundRemoval(trash, thread=thread)
+
+
+__all__ = [
+    "BackgroundRemoval",
+    "DEFAULT_REMOVE_WORKERS",
+    "RemoveStats",
+    "remove_tree",
+    "remove_tree_in_background",
+    "rename_aside",
+]
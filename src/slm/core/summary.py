@@ -2,44 +2,490 @@
 
 from __future__ import annotations
 
+import heapq
+import math
 import os
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
 from contextlib import suppress
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import List, Tuple
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple, Union
 
+COMPUTING_LABEL = "computing…"
+# Shown instead of a summary whose background walk failed.
+UNAVAILABLE_LABEL = "n/a"
+DEFAULT_ESTIMATE_BUDGET = 2.0
+_Z95 = 1.96
+
+
+class SummaryCancelled(RuntimeError):
+    """Raised when a summary walk is stopped through its cancel event."""
+
+
+def _scan_dir(d: Path) -> Tuple[int, int, List[Path]]:
+    """Count regular files/bytes directly inside ``d`` and list its subdirs."""
+
+    files = 0
+    total_bytes = 0
+    subdirs: List[Path] = []
+    try:
+        with os.scandir(d) as it:
+            for entry in it:
+                with suppress(FileNotFoundError, PermissionError, OSError):
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(Path(entry.path))
+                        continue
+                    if entry.is_file(follow_symlinks=False):
+                        files += 1
+                        with suppress(FileNotFoundError, PermissionError, OSError):
+                            st = entry.stat(follow_symlinks=False)
+                            total_bytes += int(getattr(st, "st_size", 0))
+    except (FileNotFoundError, PermissionError, NotADirectoryError, OSError):
+        pass
+    return files, total_bytes, subdirs
+
+
+class SummaryCache:
+    """Thread-safe memo of exact ``(files, bytes)`` totals per directory.
+
+    Shared by the prefetcher, ``tree_size_breakdown`` and preflight checks so
+    a tree walked once is not walked again in the same process.
+    """
+
+    def __init__(self) -> None:
+        self._data: Dict[Path, Tuple[int, int]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, path: Path) -> Optional[Tuple[int, int]]:
+        with self._lock:
+            return self._data.get(Path(path))
+
+    def put(self, path: Path, summary: Tuple[int, int]) -> None:
+        with self._lock:
+            self._data[Path(path)] = (int(summary[0]), int(summary[1]))
+
+    def invalidate(self, path: Path) -> None:
+        """Drop ``path``, its descendants and its ancestors (their totals include it)."""
+
+        path = Path(path)
+        with self._lock:
+            for key in list(self._data):
+                if key == path or path in key.parents or key in path.parents:
+                    del self._data[key]
+
+    def __contains__(self, path: object) -> bool:
+        with self._lock:
+            return Path(path) in self._data  # type: ignore[arg-type]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
+
+
+class SummaryEstimate(NamedTuple):
+    """Approximate ``(files, bytes)`` with 95% confidence half-widths.
+
+    Indexes 0 and 1 match the exact summary tuple, so callers that only need
+    counts can treat an estimate like ``fast_tree_summary`` output.
+    """
+
+    files: int
+    bytes: int
+    files_ci: int
+    bytes_ci: int
+    probes: int
+    exact: bool
+
+
+def fast_tree_summary(
+    path: Path,
+    *,
+    cancel: Optional[threading.Event] = None,
+    approximate: bool = False,
+    time_budget: float = DEFAULT_ESTIMATE_BUDGET,
+    rng: Optional[random.Random] = None,
+    cache: Optional[SummaryCache] = None,
+) -> Union[Tuple[int, int], SummaryEstimate]:
+    """Return ``(files, bytes)`` for ``path``.
+
+    With ``approximate=True`` the walk is bounded by ``time_budget`` seconds
+    and a :class:`SummaryEstimate` is returned instead; the default exact
+    mode is what apply-phase checks rely on. Exact results are read from and
+    stored into ``cache`` when one is given.
+    """
 
-def fast_tree_summary(path: Path) -> Tuple[int, int]:
     path = Path(path)
     if not path.exists() or not path.is_dir():
+        if approximate:
+            return SummaryEstimate(0, 0, 0, 0, 0, True)
         return (0, 0)
+    cached = cache.get(path) if cache is not None else None
+    if cached is not None:
+        if approximate:
+            return SummaryEstimate(cached[0], cached[1], 0, 0, 0, True)
+        return cached
+    if approximate:
+        return _estimate_tree_summary(path, time_budget, cancel, rng)
 
     files = 0
     total_bytes = 0
     stack: List[Path] = [path]
     while stack:
-        d = stack.pop()
-        try:
-            with os.scandir(d) as it:
-                for entry in it:
-                    with suppress(FileNotFoundError, PermissionError, OSError):
-                        if entry.is_dir(follow_symlinks=False):
-                            stack.append(Path(entry.path))
-                            continue
-                        if entry.is_file(follow_symlinks=False):
-                            files += 1
-                            with suppress(FileNotFoundError, PermissionError, OSError):
-                                st = entry.stat(follow_symlinks=False)
-                                total_bytes += int(getattr(st, "st_size", 0))
-        except (FileNotFoundError, PermissionError, NotADirectoryError, OSError):
-            continue
+        if cancel is not None and cancel.is_set():
+            raise SummaryCancelled(f"Summary cancelled: {path}")
+        f, b, subdirs = _scan_dir(stack.pop())
+        files += f
+        total_bytes += b
+        stack.extend(subdirs)
+    if cache is not None:
+        cache.put(path, (files, total_bytes))
     return (files, total_bytes)
 
 
-def format_summary_pair(curr: Tuple[int, int], new: Tuple[int, int]) -> str:
-    return (
-        f"summary(current=files:{curr[0]} bytes:{curr[1]}, "
-        f"new=files:{new[0]} bytes:{new[1]})"
+def _estimate_tree_summary(
+    path: Path,
+    time_budget: float,
+    cancel: Optional[threading.Event],
+    rng: Optional[random.Random],
+) -> SummaryEstimate:
+    """Estimate tree totals by random root-to-leaf probes (Knuth's estimator).
+
+    Half of the budget goes to an exact walk, which covers small trees
+    completely. Otherwise each probe descends into a random subdirectory at
+    every level and weights what it sees by the product of branching factors;
+    the mean over probes is unbiased and its spread gives the interval.
+    """
+
+    rng = rng or random.Random()
+    deadline = time.monotonic() + max(time_budget, 0.0)
+    exact_deadline = time.monotonic() + max(time_budget, 0.0) / 2
+    listing: Dict[Path, Tuple[int, int, List[Path]]] = {}
+
+    def _listing(d: Path) -> Tuple[int, int, List[Path]]:
+        if d not in listing:
+            listing[d] = _scan_dir(d)
+        return listing[d]
+
+    files = 0
+    total_bytes = 0
+    stack: List[Path] = [path]
+    while stack and time.monotonic() < exact_deadline:
+        if cancel is not None and cancel.is_set():
+            raise SummaryCancelled(f"Summary cancelled: {path}")
+        f, b, subdirs = _listing(stack.pop())
+        files += f
+        total_bytes += b
+        stack.extend(subdirs)
+    if not stack:
+        return SummaryEstimate(files, total_bytes, 0, 0, 0, True)
+
+    samples: List[Tuple[float, float]] = []
+    while not samples or time.monotonic() < deadline:
+        if cancel is not None and cancel.is_set():
+            raise SummaryCancelled(f"Summary cancelled: {path}")
+        weight = 1
+        est_files = 0.0
+        est_bytes = 0.0
+        d = path
+        while True:
+            f, b, subdirs = _listing(d)
+            est_files += weight * f
+            est_bytes += weight * b
+            if not subdirs:
+                break
+            weight *= len(subdirs)
+            d = rng.choice(subdirs)
+        samples.append((est_files, est_bytes))
+
+    n = len(samples)
+    mean_files = sum(s[0] for s in samples) / n
+    mean_bytes = sum(s[1] for s in samples) / n
+    if n > 1:
+        var_files = sum((s[0] - mean_files) ** 2 for s in samples) / (n - 1)
+        var_bytes = sum((s[1] - mean_bytes) ** 2 for s in samples) / (n - 1)
+    else:
+        var_files = mean_files ** 2
+        var_bytes = mean_bytes ** 2
+    return SummaryEstimate(
+        files=int(round(mean_files)),
+        bytes=int(round(mean_bytes)),
+        files_ci=int(round(_Z95 * math.sqrt(var_files / n))),
+        bytes_ci=int(round(_Z95 * math.sqrt(var_bytes / n))),
+        probes=n,
+        exact=False,
     )
 
 
-__all__ = ["fast_tree_summary", "format_summary_pair"]
+def _fmt_counts(summary: Union[None, Tuple[int, ...], BaseException]) -> str:
+    if summary is None:
+        return COMPUTING_LABEL
+    if isinstance(summary, BaseException):
+        return f"{UNAVAILABLE_LABEL} ({summary})"
+    if isinstance(summary, SummaryEstimate) and not summary.exact:
+        return (
+            f"≈files:{summary.files}±{summary.files_ci} "
+            f"bytes:{summary.bytes}±{summary.bytes_ci} (estimate, 95% CI)"
+        )
+    return f"files:{summary[0]} bytes:{summary[1]}"
+
+
+def format_summary_pair(
+    curr: Union[None, Tuple[int, ...], BaseException],
+    new: Union[None, Tuple[int, ...], BaseException],
+) -> str:
+    """Render current/new summaries.
+
+    ``None`` means still being computed and an exception that the walk
+    failed (see :meth:`SummaryPrefetcher.status`); inexact
+    :class:`SummaryEstimate` values are marked as estimates with their
+    confidence interval.
+    """
+
+    return f"summary(current={_fmt_counts(curr)}, new={_fmt_counts(new)})"
+
+
+@dataclass
+class SizeNode:
+    """Aggregated size of one directory in a :func:`tree_size_breakdown` tree."""
+
+    path: Path
+    files: int = 0
+    bytes: int = 0
+    children: List["SizeNode"] = field(default_factory=list)
+
+    def iter_nodes(self) -> Iterator["SizeNode"]:
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            yield node
+            stack.extend(node.children)
+
+
+def _walk_sizes(
+    top: Path, max_depth: int, cache: Optional[SummaryCache]
+) -> SizeNode:
+    """Single pass over ``top``; keeps nodes down to ``max_depth`` levels.
+
+    Anything deeper is folded into its nearest kept ancestor, so memory is
+    bounded by the number of directories within ``max_depth``.
+    """
+
+    root = SizeNode(path=top)
+    kept: List[Tuple[SizeNode, Optional[SizeNode]]] = [(root, None)]
+    stack: List[Tuple[Path, SizeNode, int]] = [(top, root, 0)]
+    while stack:
+        d, owner, depth = stack.pop()
+        f, b, subdirs = _scan_dir(d)
+        owner.files += f
+        owner.bytes += b
+        for sub in subdirs:
+            if depth + 1 <= max_depth:
+                child = SizeNode(path=sub)
+                owner.children.append(child)
+                kept.append((child, owner))
+                cached = cache.get(sub) if cache is not None else None
+                if cached is not None and depth + 1 == max_depth:
+                    child.files, child.bytes = cached
+                    continue
+                stack.append((sub, child, depth + 1))
+            else:
+                stack.append((sub, owner, depth + 1))
+
+    # Children are always created after their parent, so a reverse sweep
+    # turns the per-node "own" counts into subtree totals.
+    for node, parent in reversed(kept):
+        if parent is not None:
+            parent.files += node.files
+            parent.bytes += node.bytes
+    if cache is not None:
+        for node, _ in kept:
+            cache.put(node.path, (node.files, node.bytes))
+    return root
+
+
+def tree_size_breakdown(
+    root: Path,
+    *,
+    max_depth: int = 2,
+    max_workers: int = 8,
+    cache: Optional[SummaryCache] = None,
+) -> SizeNode:
+    """Per-directory size tree for ``root`` computed in one parallel pass.
+
+    Each first-level subdirectory is walked on its own worker thread. Totals
+    of every kept node are stored into ``cache`` so later summaries of the
+    same targets are free.
+    """
+
+    root = Path(root)
+    node = SizeNode(path=root)
+    if not root.is_dir():
+        return node
+    files, total_bytes, subdirs = _scan_dir(root)
+    node.files, node.bytes = files, total_bytes
+    if max_depth <= 0:
+        node.files, node.bytes = fast_tree_summary(root, cache=cache)
+        return node
+    with ThreadPoolExecutor(
+        max_workers=max(1, max_workers), thread_name_prefix="slm-du"
+    ) as pool:
+        children = list(
+            pool.map(lambda sub: _walk_sizes(sub, max_depth - 1, cache), subdirs)
+        )
+    for child in children:
+        node.children.append(child)
+        node.files += child.files
+        node.bytes += child.bytes
+    if cache is not None:
+        cache.put(root, (node.files, node.bytes))
+    return node
+
+
+def top_heaviest(node: SizeNode, n: int = 20) -> List[SizeNode]:
+    """Return the ``n`` heaviest descendants of ``node`` (the node itself excluded)."""
+
+    entries = [x for x in node.iter_nodes() if x is not node]
+    return heapq.nlargest(n, entries, key=lambda x: (x.bytes, x.files))
+
+
+def format_bytes(num: int) -> str:
+    value = float(num)
+    for unit in ("B", "KiB", "MiB", "GiB", "TiB"):
+        if abs(value) < 1024 or unit == "TiB":
+            return f"{value:.0f} {unit}" if unit == "B" else f"{value:.1f} {unit}"
+        value /= 1024
+    return f"{num} B"  # pragma: no cover
+
+
+def _key(path: Path) -> Path:
+    # One entry per directory however it is spelled (symlinked parents, "..").
+    return Path(path).expanduser().resolve()
+
+
+class SummaryPrefetcher:
+    """Compute tree summaries on background threads while the operator is prompted.
+
+    Each directory is summarised at most once, keyed by its resolved path so
+    different spellings share one walk; ``peek`` never blocks and
+    ``close`` stops in-flight walks between directories. Passing
+    ``estimate_budget`` switches to time-bounded approximate summaries.
+    After ``close``, :meth:`result` walks synchronously instead.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 2,
+        estimate_budget: Optional[float] = None,
+        cache: Optional[SummaryCache] = None,
+    ) -> None:
+        self._estimate_budget = estimate_budget
+        self.cache = cache if cache is not None else SummaryCache()
+        self._cancel = threading.Event()
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="slm-summary"
+        )
+        self._futures: Dict[Path, Future] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def _time_budget(self) -> float:
+        # An explicit 0 means "one probe, no waiting", not the default.
+        if self._estimate_budget is None:
+            return DEFAULT_ESTIMATE_BUDGET
+        return self._estimate_budget
+
+    def submit(self, paths: Iterable[Path]) -> None:
+        with self._lock:
+            if self._cancel.is_set():
+                return
+            for raw in paths:
+                key = _key(raw)
+                if key in self._futures:
+                    continue
+                self._futures[key] = self._executor.submit(
+                    fast_tree_summary,
+                    key,
+                    cancel=self._cancel,
+                    approximate=self._estimate_budget is not None,
+                    time_budget=self._time_budget,
+                    cache=self.cache,
+                )
+
+    def peek(self, path: Path) -> Optional[Tuple[int, int]]:
+        """Return the summary if it is ready, otherwise ``None`` (also on failure)."""
+
+        status = self.status(path)
+        return None if isinstance(status, BaseException) else status
+
+    def status(self, path: Path) -> Union[None, Tuple[int, int], BaseException]:
+        """The summary, ``None`` while pending, or the exception the walk raised."""
+
+        with self._lock:
+            fut = self._futures.get(_key(path))
+        if fut is None or not fut.done() or fut.cancelled():
+            return None
+        exc = fut.exception()
+        if isinstance(exc, SummaryCancelled):
+            return None
+        return exc if exc is not None else fut.result()
+
+    def result(self, path: Path) -> Tuple[int, int]:
+        """Block until the summary for ``path`` is available.
+
+        Once the prefetcher is closed, a walk that never finished is redone
+        synchronously on the calling thread.
+        """
+
+        key = _key(path)
+        self.submit([key])
+        with self._lock:
+            fut = self._futures.get(key)
+        if fut is not None and not fut.cancelled():
+            try:
+                return fut.result()
+            except SummaryCancelled:
+                pass
+        return fast_tree_summary(
+            key,
+            approximate=self._estimate_budget is not None,
+            time_budget=self._time_budget,
+            cache=self.cache,
+        )
+
+    def describe(self, path: Path) -> str:
+        return _fmt_counts(self.status(path))
+
+    def close(self) -> None:
+        """Cancel pending and running walks and release worker threads."""
+
+        self._cancel.set()
+        with self._lock:
+            for fut in self._futures.values():
+                fut.cancel()
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self) -> "SummaryPrefetcher":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+__all__ = [
+    "COMPUTING_LABEL",
+    "DEFAULT_ESTIMATE_BUDGET",
+    "SizeNode",
+    "SummaryCache",
+    "SummaryCancelled",
+    "SummaryEstimate",
+    "SummaryPrefetcher",
+    "UNAVAILABLE_LABEL",
+    "fast_tree_summary",
+    "format_bytes",
+    "format_summary_pair",
+    "top_heaviest",
+    "tree_size_breakdown",
+]
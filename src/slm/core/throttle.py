@@ -0,0 +1,345 @@
+"""Bandwidth and file-rate caps for copies and deletions, adjustable while running.
+
+A :class:`Throttle` holds two token buckets, bytes per second and files per
+second, shared by every worker thread. The copy engine, the tar stream and
+the tree remover call :func:`consume` as they write bytes, create files and
+unlink entries; it returns immediately when no throttle is installed (see
+:func:`throttled`) and otherwise sleeps just long enough to stay under the
+caps.
+
+Caps can change mid-run. With a ``control_file``, the throttle re-reads it
+when its mtime changes (checked at most every ``poll_interval`` seconds)
+or right away after :func:`install_reload_signal`'s ``SIGHUP``. The file holds
+``key=value`` pairs such as ``bytes=20M files=500``; ``0`` or ``none``
+lifts a cap. :func:`set_io_priority` lowers the kernel IO priority (Linux
+``ioprio_set``) of the calling thread and of the threads and processes it
+starts afterwards.
+"""
+
+from __future__ import annotations
+
+import ctypes
+import os
+import platform
+import re
+import signal
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, Iterator, Optional
+
+from .summary import format_bytes
+
+# Passed to detached helper processes (background deletion) so they obey the
+# same caps and control file.
+ENV_VAR = "SLM_THROTTLE"
+# Largest wait per call; long pauses are taken in slices so new caps apply
+# promptly.
+_MAX_SLEEP = 0.25
+_MIN_CHUNK = 64 * 1024
+_UNITS = {"": 1, "k": 1 << 10, "m": 1 << 20, "g": 1 << 30, "t": 1 << 40}
+_SIZE_RE = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*([kmgt]?)(?:i?b)?\s*(?:/s)?\s*$", re.I)
+
+IO_PRIORITIES = ("normal", "low", "idle")
+# ioprio_set(2) syscall numbers by machine.
+_IOPRIO_SET = {
+    "x86_64": 251,
+    "amd64": 251,
+    "i386": 289,
+    "i686": 289,
+    "aarch64": 30,
+    "arm64": 30,
+    "riscv64": 30,
+    "armv7l": 314,
+    "ppc64le": 273,
+    "ppc64": 273,
+    "s390x": 282,
+}
+_IOPRIO_WHO_PROCESS = 1
+_IOPRIO_CLASS_SHIFT = 13
+# (class, level): best-effort 4 is the kernel default, 7 its lowest level;
+# class 3 only gets disk time nobody else wants.
+_IOPRIO_VALUES = {"normal": (2, 4), "low": (2, 7), "idle": (3, 0)}
+
+
+def parse_size(text: str) -> int:
+    """``"20M"``, ``"1.5GiB"``, ``"500k/s"`` -> bytes; ``0``/``none``/``off`` -> 0."""
+
+    if str(text).strip().lower() in ("", "none", "off", "unlimited"):
+        return 0
+    match = _SIZE_RE.match(str(text))
+    if not match:
+        raise ValueError(f"Invalid rate: {text!r}")
+    return int(float(match.group(1)) * _UNITS[match.group(2).lower()])
+
+
+@dataclass(frozen=True)
+class Limits:
+    """Caps in bytes and files per second; ``0`` means unlimited."""
+
+    bytes_per_sec: int = 0
+    files_per_sec: int = 0
+
+    @property
+    def unlimited(self) -> bool:
+        return not self.bytes_per_sec and not self.files_per_sec
+
+    @classmethod
+    def parse(cls, text: str) -> "Limits":
+        """Parse ``bytes=20M files=500`` (whitespace, commas or newlines apart)."""
+
+        values: Dict[str, int] = {}
+        for token in re.split(r"[\s,;]+", text.strip()):
+            if not token or token.startswith("#"):
+                continue
+            key, sep, value = token.partition("=")
+            key = key.strip().lower()
+            if not sep or key not in ("bytes", "files"):
+                raise ValueError(f"Expected bytes=<rate> or files=<rate>: {token!r}")
+            values[key] = parse_size(value)
+        return cls(values.get("bytes", 0), values.get("files", 0))
+
+    def describe(self) -> str:
+        parts = []
+        if self.bytes_per_sec:
+            parts.append(f"{format_bytes(self.bytes_per_sec)}/s")
+        if self.files_per_sec:
+            parts.append(f"{self.files_per_sec} files/s")
+        return ", ".join(parts) or "unlimited"
+
+    def to_text(self) -> str:
+        return f"bytes={self.bytes_per_sec} files={self.files_per_sec}"
+
+
+class _Bucket:
+    """Token bucket allowing one second of burst; debt is paid by sleeping."""
+
+    def __init__(self, rate: int) -> None:
+        self.rate = rate
+        self.tokens = float(rate)
+        self.last = time.monotonic()
+
+    def take(self, amount: int, now: float) -> float:
+        """Withdraw ``amount``; returns how long the caller should wait."""
+
+        if not self.rate:
+            return 0.0
+        self.tokens = min(self.rate, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+        self.tokens -= amount
+        return -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+
+class Throttle:
+    """Shared byte/file rate limiter; safe to use from many threads.
+
+    ``on_change`` is called with the new limits whenever the control file
+    changes them (from whichever worker thread noticed).
+    """
+
+    def __init__(
+        self,
+        limits: Limits = Limits(),
+        *,
+        control_file: Optional[Path] = None,
+        poll_interval: float = 1.0,
+        on_change: Optional[Callable[[Limits], None]] = None,
+    ) -> None:
+        self.control_file = Path(control_file).expanduser() if control_file else None
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._limits = limits
+        self._bytes = _Bucket(limits.bytes_per_sec)
+        self._files = _Bucket(limits.files_per_sec)
+        self._checked = 0.0
+        self._mtime: Optional[int] = None
+        self._reload_requested = False
+        self.on_change = None
+        if self.control_file is not None:
+            self.reload()
+        self.on_change = on_change
+
+    @property
+    def limits(self) -> Limits:
+        return self._limits
+
+    def set_limits(self, limits: Limits) -> None:
+        with self._lock:
+            changed = limits != self._limits
+            self._limits = limits
+            self._bytes = _Bucket(limits.bytes_per_sec)
+            self._files = _Bucket(limits.files_per_sec)
+        if changed and self.on_change is not None:
+            self.on_change(limits)
+
+    def request_reload(self) -> None:
+        """Re-read the control file at the next :meth:`consume` (signal-safe)."""
+
+        self._reload_requested = True
+
+    def reload(self) -> bool:
+        """Apply the control file if it changed; returns whether limits changed.
+
+        A missing file keeps the current caps; an unparsable one is ignored
+        until it is rewritten.
+        """
+
+        self._checked = time.monotonic()
+        self._reload_requested = False
+        if self.control_file is None:
+            return False
+        try:
+            st = self.control_file.stat()
+        except OSError:
+            return False
+        if st.st_mtime_ns == self._mtime:
+            return False
+        self._mtime = st.st_mtime_ns
+        try:
+            limits = Limits.parse(self.control_file.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return False
+        if limits == self._limits:
+            return False
+        self.set_limits(limits)
+        return True
+
+    def chunk_size(self, default: int) -> int:
+        """Transfer size per call that keeps each wait short under the byte cap."""
+
+        rate = self._limits.bytes_per_sec
+        if not rate:
+            return default
+        return max(_MIN_CHUNK, min(default, rate // 4))
+
+    def consume(self, nbytes: int = 0, files: int = 0) -> None:
+        """Account for work just done (or about to be), sleeping to honour the caps."""
+
+        now = time.monotonic()
+        if self._reload_requested or (
+            self.control_file is not None and now - self._checked >= self.poll_interval
+        ):
+            self.reload()
+        with self._lock:
+            wait = max(
+                self._bytes.take(nbytes, now) if nbytes else 0.0,
+                self._files.take(files, now) if files else 0.0,
+            )
+        while wait > 0:
+            step = min(wait, _MAX_SLEEP)
+            time.sleep(step)
+            wait -= step
+            if self._reload_requested or (
+                self.control_file is not None
+                and time.monotonic() - self._checked >= self.poll_interval
+            ):
+                if self.reload():
+                    return  # fresh buckets under the new caps
+
+    def to_env(self) -> str:
+        text = self._limits.to_text()
+        if self.control_file is not None:
+            text += f" control={self.control_file}"
+        return text
+
+    @classmethod
+    def from_environment(cls) -> Optional["Throttle"]:
+        """The throttle described by ``$SLM_THROTTLE``, if set."""
+
+        text = os.environ.get(ENV_VAR)
+        if not text:
+            return None
+        control = None
+        parts = []
+        for token in text.split():
+            if token.startswith("control="):
+                control = Path(token[len("control="):])
+            else:
+                parts.append(token)
+        return cls(Limits.parse(" ".join(parts)), control_file=control)
+
+
+_current: Optional[Throttle] = None
+
+
+def current() -> Optional[Throttle]:
+    """The installed throttle, or ``None`` when copies run unthrottled."""
+
+    return _current
+
+
+@contextmanager
+def throttled(throttle: Optional[Throttle]) -> Iterator[Optional[Throttle]]:
+    """Install ``throttle`` process-wide for the duration of the block."""
+
+    global _current
+    previous = _current
+    _current = throttle
+    try:
+        yield throttle
+    finally:
+        _current = previous
+
+
+def consume(nbytes: int = 0, files: int = 0) -> None:
+    """:meth:`Throttle.consume` on the installed throttle; no-op without one."""
+
+    throttle = _current
+    if throttle is not None:
+        throttle.consume(nbytes, files)
+
+
+def install_reload_signal(throttle: Throttle) -> bool:
+    """Make ``SIGHUP`` re-read the control file; returns whether it was installed.
+
+    Only possible from the main thread on platforms that have ``SIGHUP``.
+    """
+
+    if not hasattr(signal, "SIGHUP"):
+        return False
+    try:
+        signal.signal(signal.SIGHUP, lambda signum, frame: throttle.request_reload())
+    except ValueError:  # not the main thread
+        return False
+    return True
+
+
+def set_io_priority(level: str) -> bool:
+    """Set the kernel IO priority to ``normal``, ``low`` or ``idle``.
+
+    Applies to the calling thread and everything it starts afterwards, so
+    call it before worker pools exist. Returns ``False`` where Linux
+    ``ioprio_set`` is unavailable; the caps still apply there.
+    """
+
+    if level not in _IOPRIO_VALUES:
+        raise ValueError(f"Unsupported IO priority: {level}")
+    number = _IOPRIO_SET.get(platform.machine().lower())
+    if not sys.platform.startswith("linux") or number is None:
+        return False
+    klass, data = _IOPRIO_VALUES[level]
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        result = libc.syscall(
+            number, _IOPRIO_WHO_PROCESS, 0, (klass << _IOPRIO_CLASS_SHIFT) | data
+        )
+    except (AttributeError, OSError):
+        return False
+    return result == 0
+
+
+__all__ = [
+    "ENV_VAR",
+    "IO_PRIORITIES",
+    "Limits",
+    "Throttle",
+    "consume",
+    "current",
+    "install_reload_signal",
+    "parse_size",
+    "set_io_priority",
+    "throttled",
+]
@@ -0,0 +1,210 @@
+"""Post-copy verification: full metadata diff plus size-weighted content sampling."""
+
+from __future__ import annotations
+
+import heapq
+import math
+import os
+import random
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import List, Mapping, Optional, Tuple
+
+from .diff import file_digest, iter_tree_diff
+
+VERIFY_MODES = ("metadata", "sampled", "full")
+DEFAULT_CONFIDENCE = 0.99
+# Fraction of bytes that may be corrupt before sampling is expected to notice.
+DEFAULT_TOLERANCE = 0.01
+# Seconds copied mtimes may differ by: FAT/exFAT store 2 s steps, HFS+ and
+# many NFS/SMB mounts whole seconds, so an exact check fails good copies.
+DEFAULT_MTIME_WINDOW = 2.0
+
+
+@dataclass
+class VerificationReport:
+    """Outcome of :func:`verify_tree_copy`.
+
+    Attributes:
+        mode: One of ``VERIFY_MODES``.
+        source: Tree that was copied.
+        destination: The fresh copy.
+        files: Regular files in the source.
+        bytes: Total size of those files.
+        sampled: Relative paths whose content was hashed on both sides.
+        sampled_bytes: Bytes read per side for the content comparison.
+        confidence: Probability of catching ``tolerance`` worth of corrupt bytes.
+        tolerance: Corrupt byte fraction the sample size was derived from.
+        prehashed: Files whose source digest was taken during the copy, so
+            only their destination side was read here.
+        mismatches: Human-readable differences; empty when the copy is good.
+    """
+
+    mode: str
+    source: Path
+    destination: Path
+    files: int = 0
+    bytes: int = 0
+    sampled: List[str] = field(default_factory=list)
+    sampled_bytes: int = 0
+    confidence: Optional[float] = None
+    tolerance: Optional[float] = None
+    prehashed: int = 0
+    mismatches: List[str] = field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        return not self.mismatches
+
+
+def sample_size_for_confidence(
+    population: int,
+    confidence: float = DEFAULT_CONFIDENCE,
+    tolerance: float = DEFAULT_TOLERANCE,
+) -> int:
+    """Number of size-weighted draws needed to hit corrupt data.
+
+    If at least ``tolerance`` of all bytes are corrupt, each draw lands on a
+    corrupt file with probability >= ``tolerance``; ``n`` draws miss all of
+    them with probability ``(1 - tolerance) ** n``.
+    """
+
+    if population <= 0:
+        return 0
+    if not 0 < confidence < 1:
+        raise ValueError(f"confidence must be in (0, 1): {confidence}")
+    if not 0 < tolerance < 1:
+        raise ValueError(f"tolerance must be in (0, 1): {tolerance}")
+    n = math.ceil(math.log(1 - confidence) / math.log(1 - tolerance))
+    return min(population, max(1, n))
+
+
+def _iter_files(root: Path):
+    stack = [str(root)]
+    root_str = str(root)
+    while stack:
+        d = stack.pop()
+        with os.scandir(d) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    rel = os.path.relpath(entry.path, root_str)
+                    yield rel, entry.stat(follow_symlinks=False).st_size
+
+
+def _weighted_sample(
+    root: Path, k: int, rng: random.Random
+) -> Tuple[List[Tuple[str, int]], int, int]:
+    """Size-weighted sample without replacement in one streaming pass.
+
+    Uses Efraimidis–Spirakis keys ``u ** (1 / weight)`` with a k-sized heap, so
+    memory is bounded by the sample, not the tree. Empty files get weight 1 so
+    they can still be picked.
+    """
+
+    heap: List[Tuple[float, str, int]] = []
+    files = 0
+    total = 0
+    for rel, size in _iter_files(root):
+        files += 1
+        total += size
+        if k <= 0:
+            continue
+        key = rng.random() ** (1.0 / max(size, 1))
+        if len(heap) < k:
+            heapq.heappush(heap, (key, rel, size))
+        elif key > heap[0][0]:
+            heapq.heapreplace(heap, (key, rel, size))
+    picked = sorted((rel, size) for _, rel, size in heap)
+    return picked, files, total
+
+
+def verify_tree_copy(
+    source: Path,
+    destination: Path,
+    *,
+    mode: str = "metadata",
+    confidence: float = DEFAULT_CONFIDENCE,
+    tolerance: float = DEFAULT_TOLERANCE,
+    rng: Optional[random.Random] = None,
+    source_digests: Optional[Mapping[str, str]] = None,
+    mtime_window: float = DEFAULT_MTIME_WINDOW,
+) -> VerificationReport:
+    """Check ``destination`` against ``source`` before the source is deleted.
+
+    Every mode diffs the full tree by type, size, mtime and symlink text;
+    mtimes may differ by up to ``mtime_window`` seconds, since the
+    destination filesystem may store coarser timestamps than the source.
+    ``sampled`` additionally hashes a size-weighted random sample on both
+    sides, sized from ``confidence``/``tolerance``; ``full`` hashes every file.
+
+    ``source_digests`` maps source-relative paths to digests computed while
+    copying (see ``copy_tree(digests=...)``); those files are hashed on the
+    destination side only.
+    """
+
+    if mode not in VERIFY_MODES:
+        raise ValueError(f"Unsupported verify mode: {mode}")
+    source = Path(source)
+    destination = Path(destination)
+    report = VerificationReport(mode=mode, source=source, destination=destination)
+
+    digests = source_digests or {}
+    hash_in_diff = mode == "full" and not digests
+    for entry in iter_tree_diff(
+        source, destination, compare_hash=hash_in_diff, mtime_window=mtime_window
+    ):
+        report.mismatches.append(str(entry))
+        return report
+
+    if mode == "full" and digests:
+        for rel, size in _iter_files(source):
+            report.files += 1
+            report.bytes += size
+            expected = digests.get(rel)
+            if expected is None:
+                expected = file_digest(str(source / rel))
+            else:
+                report.prehashed += 1
+            if file_digest(str(destination / rel)) != expected:
+                report.mismatches.append(f"~ {rel.replace(os.sep, '/')} (hash)")
+                break
+        return report
+
+    if mode != "sampled":
+        for _, size in _iter_files(source):
+            report.files += 1
+            report.bytes += size
+        return report
+
+    rng = rng or random.Random()
+    report.confidence = confidence
+    report.tolerance = tolerance
+    # The required sample size does not depend on the population beyond the
+    # cap, so draw the uncapped size and let the reservoir hold at most that.
+    k = sample_size_for_confidence(1 << 62, confidence, tolerance)
+    picked, report.files, report.bytes = _weighted_sample(source, k, rng)
+    for rel, size in picked:
+        report.sampled.append(rel.replace(os.sep, "/"))
+        report.sampled_bytes += size
+        expected = digests.get(rel)
+        if expected is None:
+            expected = file_digest(str(source / rel))
+        else:
+            report.prehashed += 1
+        if file_digest(str(destination / rel)) != expected:
+            report.mismatches.append(f"~ {rel} (hash)")
+            break
+    return report
+
+
+__all__ = [
+    "DEFAULT_CONFIDENCE",
+    "DEFAULT_MTIME_WINDOW",
+    "DEFAULT_TOLERANCE",
+    "VERIFY_MODES",
+    "VerificationReport",
+    "sample_size_for_confidence",
+    "verify_tree_copy",
+]
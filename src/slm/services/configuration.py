@@ -2,6 +2,7 @@
 
 from __future__ import annotations
 
+import json
 from dataclasses import dataclass
 from pathlib import Path
 from typing import Any, Dict, Iterable, List, Optional, Tuple
@@ -79,10 +80,50 @@ def coerce_scan_roots(value: Any, *, context: str) -> List[str]:
     raise ConfigError(f"{context} 中的 scan_roots 类型不受支持。")
 
 
+def load_batch_mapping(path: Path) -> List[Tuple[str, str]]:
+    """Read a batch migration file: current target -> new location.
+
+    Accepts either a mapping (``/data/a: /archive/a``) or a list of
+    ``{from: ..., to: ...}`` objects, as YAML or (``.json``) JSON. Order is
+    preserved; paths are returned unresolved.
+    """
+
+    path = Path(path).expanduser()
+    try:
+        content = path.read_text(encoding="utf-8")
+    except OSError as exc:
+        raise ConfigError(f"无法读取批量迁移文件：{path}") from exc
+    try:
+        if path.suffix.lower() == ".json":
+            parsed = json.loads(content)
+        else:
+            _ensure_yaml_available()
+            parsed = yaml.safe_load(content)
+    except ConfigError:
+        raise
+    except Exception as exc:
+        raise ConfigError(f"解析批量迁移文件失败：{path}") from exc
+    if isinstance(parsed, dict):
+        pairs = list(parsed.items())
+    elif isinstance(parsed, list):
+        pairs = []
+        for item in parsed:
+            if not isinstance(item, dict) or "from" not in item or "to" not in item:
+                raise ConfigError(f"{path} 中的每一项必须包含 from 和 to。")
+            pairs.append((item["from"], item["to"]))
+    else:
+        raise ConfigError(f"批量迁移文件必须是映射或列表：{path}")
+    for src, dst in pairs:
+        if not isinstance(src, str) or not isinstance(dst, str):
+            raise ConfigError(f"{path} 中的路径必须是字符串：{src!r} -> {dst!r}")
+    return pairs
+
+
 __all__ = [
     "ConfigError",
     "DEFAULT_CONFIG_LOCATIONS",
     "LoadedConfig",
     "coerce_scan_roots",
+    "load_batch_mapping",
     "load_config",
 ]
@@ -0,0 +1,76 @@
+"""Shared fixtures: sample trees, forced cross-device moves and prompt answers."""
+
+import errno
+import os
+from pathlib import Path
+
+import pytest
+
+from slm import cli
+
+
+class DummyPrompt:
+    def __init__(self, value):
+        self._value = value
+
+    def ask(self):
+        return self._value
+
+
+@pytest.fixture
+def make_tree():
+    """Return a builder that lays out a sample tree under ``root``.
+
+    ``entries`` maps relative paths to contents (``str`` or ``bytes``);
+    ``files`` adds that many random ``size``-byte files, alternating between
+    ``root`` and ``root/sub``.
+    """
+
+    def build(root, entries=None, *, files=0, size=3000):
+        (root / "sub" if files else root).mkdir(parents=True, exist_ok=True)
+        for i in range(files):
+            name = f"sub/f{i}.bin" if i % 2 else f"f{i}.bin"
+            (root / name).write_bytes(os.urandom(size))
+        for rel, content in (entries or {}).items():
+            path = root / rel
+            path.parent.mkdir(parents=True, exist_ok=True)
+            if isinstance(content, bytes):
+                path.write_bytes(content)
+            else:
+                path.write_text(content)
+        return root
+
+    return build
+
+
+@pytest.fixture
+def force_cross_device(monkeypatch):
+    """Return a switch that makes every ``Path.rename`` fail with EXDEV.
+
+    Tests flip it after planning when the plan itself should still see a
+    same-device rename.
+    """
+
+    def cross_device(self, target):
+        raise OSError(errno.EXDEV, "Invalid cross-device link")
+
+    def force():
+        monkeypatch.setattr(Path, "rename", cross_device)
+
+    return force
+
+
+@pytest.fixture
+def answer_prompts(monkeypatch):
+    """Return a helper that answers every ``select``/``text``/``confirm`` prompt.
+
+    Each keyword is the value that kind of prompt returns; prompts without an
+    answer are left untouched.
+    """
+
+    def answer(**answers):
+        for kind, value in answers.items():
+            prompt = DummyPrompt(value)
+            monkeypatch.setattr(cli.questionary, kind, lambda *a, _p=prompt, **k: _p)
+
+    return answer
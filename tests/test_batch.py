@@ -0,0 +1,140 @@
+"""Tests for slm.core.batch (many targets per run, device-aware scheduling)."""
+
+import json
+import os
+import threading
+import time
+
+import pytest
+
+from slm import cli
+from slm.config import ConfigError, load_batch_mapping
+from slm.core import batch
+from slm.core.batch import plan_batch, run_batch
+from slm.core.migration import MigrationError
+
+
+def _targets(tmp_path, names=("a", "b", "c")):
+    data = tmp_path / "Data"
+    work = tmp_path / "work"
+    work.mkdir()
+    links = {}
+    for name in names:
+        target = data / name
+        target.mkdir(parents=True)
+        (target / "f.txt").write_text(name)
+        link = work / f"{name}-link"
+        link.symlink_to(target)
+        links[target.resolve()] = [link]
+    return data, work, links
+
+
+def test_batch_mapping_accepts_yaml_mapping_and_json_list(tmp_path):
+    yml = tmp_path / "batch.yml"
+    yml.write_text("a: archive/a\n/abs/b: /new/b\n")
+    js = tmp_path / "batch.json"
+    js.write_text(json.dumps([{"from": "a", "to": "archive/a"}]))
+    bad = tmp_path / "bad.json"
+    bad.write_text(json.dumps([{"from": "a"}]))
+
+    assert load_batch_mapping(yml) == [("a", "archive/a"), ("/abs/b", "/new/b")]
+    assert load_batch_mapping(js) == [("a", "archive/a")]
+    with pytest.raises(ConfigError):
+        load_batch_mapping(bad)
+
+
+def test_plan_batch_rejects_overlapping_items(tmp_path):
+    data, _, links = _targets(tmp_path)
+
+    with pytest.raises(MigrationError, match="overlap"):
+        plan_batch(
+            [("a", "archive/x"), ("b", "archive/x/inner")], links, data_root=data
+        )
+
+
+def test_run_batch_moves_every_item_and_keeps_going_after_failure(tmp_path):
+    data, work, links = _targets(tmp_path)
+    plans = plan_batch(
+        [("a", "archive/a"), ("b", "archive/b"), ("c", "archive/c")],
+        links,
+        data_root=data,
+    )
+    (data / "archive" / "b").mkdir(parents=True)  # makes item b stale
+    seen = []
+
+    results = run_batch(plans, on_result=seen.append)
+
+    assert [r.ok for r in results] == [True, False, True]
+    assert "Plan is stale" in results[1].error
+    assert len(seen) == 3
+    assert os.readlink(work / "a-link") == os.path.join("..", "Data", "archive", "a")
+    assert (data / "b" / "f.txt").exists()
+    assert [r["phase"] for r in results[1].iter_log_records()] == ["failed"]
+
+
+def test_run_batch_limits_copies_per_device(tmp_path, monkeypatch):
+    data, _, links = _targets(tmp_path, names=("a", "b", "c", "d", "e"))
+    plans = plan_batch(
+        [(n, f"archive/{n}") for n in "abcde"], links, data_root=data
+    )
+    devices = {"a": [1, 9], "b": [1, 9], "c": [1, 9], "d": [2, 8], "e": [3, 8]}
+    active = {}
+    peak = {}
+    lock = threading.Lock()
+    order = []
+
+    def fake_execute(plan, **kwargs):
+        devs = devices[plan.current_target.name]
+        with lock:
+            for dev in devs:
+                active[dev] = active.get(dev, 0) + 1
+                peak[dev] = max(peak.get(dev, 0), active[dev])
+        time.sleep(0 if plan.current_target.name == "e" else 0.05)
+        with lock:
+            for dev in devs:
+                active[dev] -= 1
+            order.append(plan.current_target.name)
+        return plan.render()
+
+    monkeypatch.setattr(batch, "needs_copy", lambda p: p.current_target.name != "e")
+    monkeypatch.setattr(batch, "_devices", lambda p: devices[p.current_target.name])
+    monkeypatch.setattr(batch, "execute_plan", fake_execute)
+
+    results = run_batch(plans, per_device=2)
+
+    assert all(r.ok for r in results)
+    assert [r.plan.current_target.name for r in results] == list("abcde")
+    assert order[0] == "e"  # the rename ran while copies were in flight
+    assert peak[1] == 2 and peak[9] == 2
+
+
+def test_lk_batch_applies_mapping_with_one_log(tmp_path):
+    data, work, _ = _targets(tmp_path, names=("a", "b"))
+    mapping = tmp_path / "batch.json"
+    mapping.write_text(json.dumps({"a": "archive/a", "b": "archive/b"}))
+    log = tmp_path / "batch.jsonl"
+
+    code = cli.main(
+        [
+            "batch",
+            str(mapping),
+            "--data-root",
+            str(data),
+            "--scan-roots",
+            str(work),
+            "--apply",
+            "--log-json",
+            str(log),
+        ]
+    )
+
+    assert code == 0
+    assert (work / "b-link").resolve() == (data / "archive" / "b").resolve()
+    records = [json.loads(line) for line in log.read_text().splitlines()]
+    assert [r["type"] for r in records if r["phase"] == "preview"] == [
+        "move",
+        "retarget",
+        "move",
+        "retarget",
+    ]
+    assert sum(r["phase"] == "applied" for r in records) == 4
@@ -1,3 +1,4 @@
+import json
 import os
 import time
 from pathlib import Path
@@ -5,7 +6,8 @@ from pathlib import Path
 import pytest
 
 from slm import cli
-from slm.cli import MigrationError, _derive_backup_path, _safe_move_dir, migrate_target_and_update_links
+from slm.cli import MigrationError, _derive_backup_path, _safe_move_dir
+from slm.core.migration import migrate_target_and_update_links
 from slm.config import LoadedConfig
 
 
@@ -344,6 +346,39 @@ def test_relative_only_mode_rewrites_symlinks(tmp_path, monkeypatch, capsys):
         assert not os.path.isabs(os.readlink(link))
 
 
+def test_relative_only_preview_counts_lines_past_the_limit(
+    tmp_path, monkeypatch, capsys, answer_prompts
+):
+    data_root = tmp_path / "Data"
+    target = data_root / "proj"
+    target.mkdir(parents=True)
+    link_root = tmp_path / "links"
+    link_root.mkdir()
+    for name in ("a", "b", "c"):
+        (link_root / name).symlink_to(target)
+    (link_root / "rel").symlink_to(os.path.join("..", "Data", "proj"))
+    log = tmp_path / "log.jsonl"
+
+    monkeypatch.setattr(cli, "load_config", lambda: LoadedConfig(data={}, path=None))
+    answer_prompts(confirm=True)
+
+    exit_code = cli.main([
+        "--data-root", str(data_root),
+        "--scan-roots", str(link_root),
+        "--relative",
+        "--preview-limit", "1",
+        "--log-json", str(log),
+    ])
+    out = capsys.readouterr().out
+
+    assert exit_code == 0
+    assert out.count("Retarget: ") == 1
+    assert "... 另有 2 项未显示" in out
+    assert "需改写 3 个链接，1 个已是相对路径" in out
+    phases = [json.loads(line)["phase"] for line in log.read_text().splitlines()]
+    assert phases == ["preview"] * 3 + ["applied"] * 3
+
+
 def test_cli_inline_mode_preserves_original_data(tmp_path, monkeypatch, capsys):
     """CLI inline mode copies data to link locations while preserving original."""
     data_root = tmp_path / "Data"
@@ -398,6 +433,94 @@ def test_cli_inline_mode_preserves_original_data(tmp_path, monkeypatch, capsys):
         assert (link / "file.txt").read_text() == "original data"
 
 
+def test_sort_by_size_orders_menu_heaviest_first(tmp_path, monkeypatch, capsys):
+    data_root = tmp_path / "Data"
+    light = data_root / "light"
+    heavy = data_root / "group" / "heavy"
+    light.mkdir(parents=True)
+    heavy.mkdir(parents=True)
+    (light / "f").write_bytes(b"x")
+    (heavy / "f").write_bytes(b"x" * 4096)
+
+    link_root = tmp_path / "links"
+    link_root.mkdir()
+    (link_root / "l").symlink_to(light)
+    (link_root / "h").symlink_to(heavy)
+
+    monkeypatch.setattr(cli, "load_config", lambda: LoadedConfig(data={}, path=None))
+    seen = {}
+
+    def fake_select(message, choices, **kwargs):
+        seen["titles"] = [c.title for c in choices]
+        return DummyPrompt("退出")
+
+    monkeypatch.setattr(cli.questionary, "select", fake_select)
+
+    exit_code = cli.main([
+        "--data-root", str(data_root),
+        "--scan-roots", str(link_root),
+        "--sort-by-size",
+    ])
+
+    assert exit_code == 0
+    assert seen["titles"][0].startswith(os.path.join("group", "heavy"))
+    assert "4.0 KiB" in seen["titles"][0]
+    assert seen["titles"][1].startswith("light")
+
+
+def test_du_command_reports_targets_and_top_entries(tmp_path, capsys):
+    import json
+
+    data_root = tmp_path / "Data"
+    (data_root / "a" / "sub").mkdir(parents=True)
+    (data_root / "b").mkdir()
+    (data_root / "a" / "sub" / "x.bin").write_bytes(b"x" * 300)
+    (data_root / "b" / "y.bin").write_bytes(b"x" * 10)
+
+    exit_code = cli.main(["du", "--data-root", str(data_root), "--top", "2", "--json"])
+    payload = json.loads(capsys.readouterr().out)
+
+    assert exit_code == 0
+    assert payload["bytes"] == 310
+    assert [t["path"] for t in payload["targets"]] == ["a", "b"]
+    assert [t["path"] for t in payload["top"]] == ["a", os.path.join("a", "sub")]
+
+    exit_code = cli.main(["du", "--data-root", str(data_root)])
+    out = capsys.readouterr().out
+    assert exit_code == 0
+    assert "Top 3 heaviest" in out
+
+
+def test_cli_inline_hardlink_mode_states_shared_inodes(
+    tmp_path, monkeypatch, capsys, answer_prompts
+):
+    data_root = tmp_path / "Data"
+    target = data_root / "shared_data"
+    target.mkdir(parents=True)
+    (target / "file.txt").write_text("original data")
+
+    link_root = tmp_path / "projects"
+    link_a = link_root / "projectA" / "data"
+    link_a.parent.mkdir(parents=True)
+    link_a.symlink_to(target)
+
+    monkeypatch.setattr(cli, "load_config", lambda: LoadedConfig(data={}, path=None))
+    answer_prompts(select=target, confirm=True)
+
+    exit_code = cli.main([
+        "--data-root", str(data_root),
+        "--scan-roots", str(link_root),
+        "--link-mode", "inline-hardlink",
+    ])
+    out = capsys.readouterr().out
+
+    assert exit_code == 0
+    assert "inline-hardlink/materialize" in out
+    assert "shares inodes" in out
+    assert not link_a.is_symlink()
+    assert os.stat(link_a / "file.txt").st_ino == os.stat(target / "file.txt").st_ino
+
+
 # =============================================================================
 # Tests for Typer CLI subcommands (lk status, lk set-mode)
 # =============================================================================
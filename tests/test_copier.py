@@ -0,0 +1,515 @@
+"""Tests for slm.core.copier (cross-device copy engine)."""
+
+import errno
+import os
+import shutil
+import stat
+import sys
+from pathlib import Path
+
+import pytest
+
+from slm.core import copier, migration
+from slm.core.copier import copy_tree
+from slm.core.diff import iter_tree_diff
+
+_REAL_COPY_FILE = copier.copy_file
+
+
+# Regular files of the sample tree; ``tree`` adds a mode, symlinks and an mtime.
+TREE = {
+    "top.bin": os.urandom(300_000),
+    "a/small.txt": "small",
+    "a/b/empty": b"",
+    "a/exec.sh": "#!/bin/sh\n",
+}
+
+
+@pytest.fixture
+def tree(make_tree):
+    def build(root):
+        make_tree(root, TREE)
+        os.chmod(root / "a" / "exec.sh", 0o750)
+        (root / "link-rel").symlink_to("a/small.txt")
+        (root / "dangling").symlink_to("does/not/exist")
+        os.utime(root / "a", (1_600_000_000, 1_600_000_000))
+        return root
+
+    return build
+
+
+def test_copy_tree_matches_copytree_semantics(tmp_path, tree):
+    src = tree(tmp_path / "src")
+    dst = tmp_path / "dst"
+
+    stats = copy_tree(src, dst, max_workers=4)
+
+    assert list(iter_tree_diff(src, dst, compare_hash=True)) == []
+    assert os.readlink(dst / "dangling") == "does/not/exist"
+    assert stat.S_IMODE(os.stat(dst / "a" / "exec.sh").st_mode) == 0o750
+    assert os.stat(dst / "a").st_mtime == 1_600_000_000
+    assert stats.files == 4
+    assert stats.symlinks == 2
+    assert stats.dirs == 2
+    assert stats.bytes == 300_000 + 5 + 10
+    assert stats.throughput >= 0
+    assert "MiB/s" in stats.describe()
+
+
+@pytest.mark.parametrize("disable", [("copy_file_range",), ("copy_file_range", "sendfile")])
+def test_copy_tree_falls_back_when_kernel_copy_is_unavailable(
+    tmp_path, monkeypatch, disable, tree
+):
+    def unsupported(*args, **kwargs):
+        raise OSError(errno.ENOSYS, "not supported")
+
+    for name in disable:
+        if hasattr(os, name):
+            monkeypatch.setattr(os, name, unsupported)
+    src = tree(tmp_path / "src")
+    dst = tmp_path / "dst"
+
+    stats = copy_tree(src, dst)
+
+    assert list(iter_tree_diff(src, dst, compare_hash=True)) == []
+    expected = "readwrite" if "sendfile" in disable else "sendfile"
+    if not hasattr(os, "sendfile") or not sys.platform.startswith("linux"):
+        expected = "readwrite"
+    assert set(stats.strategies) == {expected}
+
+
+def test_copy_tree_reports_errors_like_copytree(tmp_path, monkeypatch, tree):
+    src = tree(tmp_path / "src")
+
+    def broken(src_path, dst_path, progress=None):
+        raise OSError(errno.EIO, "boom")
+
+    monkeypatch.setattr(copier, "copy_file", broken)
+    with pytest.raises(shutil.Error) as excinfo:
+        copy_tree(src, tmp_path / "dst")
+    assert len(excinfo.value.args[0]) == 4
+
+
+def _fail_after(monkeypatch, limit):
+    """Make copier.copy_file fail once ``limit`` files have been copied."""
+
+    calls = {"n": 0}
+
+    def flaky(src_path, dst_path, progress=None):
+        calls["n"] += 1
+        if calls["n"] > limit:
+            raise OSError(errno.EIO, "simulated crash")
+        return _REAL_COPY_FILE(src_path, dst_path, progress)
+
+    monkeypatch.setattr(copier, "copy_file", flaky)
+    return calls
+
+
+def _small_batches(real_init):
+    def init(self, *args, **kwargs):
+        kwargs["batch_files"] = 1
+        real_init(self, *args, **kwargs)
+
+    return init
+
+
+def test_interrupted_cross_device_move_resumes_from_journal(
+    tmp_path, monkeypatch, force_cross_device
+):
+    from slm.core.copier import CopyJournal
+    from slm.core.migration import (
+        MigrationError,
+        has_resumable_copy,
+        migrate_target_and_update_links,
+    )
+
+    src = tmp_path / "data" / "src"
+    src.mkdir(parents=True)
+    for i in range(20):
+        (src / f"f{i:02d}.txt").write_text(f"payload {i}")
+    dst = tmp_path / "other" / "dst"
+    link = tmp_path / "link"
+    link.symlink_to(src)
+
+    force_cross_device()
+    monkeypatch.setattr(copier.CopyJournal, "__init__", _small_batches(copier.CopyJournal.__init__))
+    _fail_after(monkeypatch, 8)
+
+    with pytest.raises(MigrationError, match="resume"):
+        migrate_target_and_update_links(src, dst, [link], dry_run=False)
+    assert src.exists()
+    assert has_resumable_copy(src, dst)
+    journal = CopyJournal.path_for(dst)
+    assert len(journal.read_text().splitlines()) == 1 + 8
+
+    plan = migrate_target_and_update_links(src, dst, [link], dry_run=True)
+    assert plan[0].startswith("Resume copy:")
+
+    calls = _fail_after(monkeypatch, 10**6)
+    migrate_target_and_update_links(src, dst, [link], dry_run=False)
+
+    assert calls["n"] == 12
+    assert not src.exists()
+    assert not journal.exists()
+    assert (dst / "f19.txt").read_text() == "payload 19"
+    assert link.resolve() == dst
+
+
+def test_interrupted_source_delete_never_discards_the_copy(
+    tmp_path, monkeypatch, force_cross_device
+):
+    from pathlib import Path
+
+    from slm.core import migration
+    from slm.core.copier import CopyJournal
+    from slm.core.migration import (
+        MigrationError,
+        has_resumable_copy,
+        migrate_target_and_update_links,
+    )
+
+    src = tmp_path / "data" / "src"
+    for i in range(20):
+        (src / f"d{i}").mkdir(parents=True)
+        (src / f"d{i}" / "f.txt").write_text(f"payload {i}")
+    dst = tmp_path / "other" / "dst"
+    link = tmp_path / "link"
+    link.symlink_to(src)
+
+    def dies_half_way(path, **kwargs):
+        for i in range(10):
+            shutil.rmtree(Path(path) / f"d{i}")
+        raise OSError(errno.EMFILE, "Too many open files")
+
+    force_cross_device()
+    monkeypatch.setattr(migration, "remove_tree", dies_half_way)
+
+    with pytest.raises(MigrationError, match="deleting the source"):
+        migrate_target_and_update_links(src, dst, [link], dry_run=False)
+    assert not CopyJournal.path_for(dst).exists()
+    assert not has_resumable_copy(src, dst)
+    with pytest.raises(MigrationError, match="Destination exists"):
+        migrate_target_and_update_links(src, dst, [link], dry_run=False)
+    assert len(list(dst.iterdir())) == 20
+
+    # A journal left by an older interrupted delete: verification fails but
+    # the complete destination is kept.
+    CopyJournal.open(src.resolve(), dst).close()
+    with pytest.raises(MigrationError, match="was kept"):
+        migrate_target_and_update_links(src, dst, [link], dry_run=False)
+    assert len(list(dst.iterdir())) == 20
+
+
+def test_journal_from_another_source_is_not_resumed(tmp_path):
+    from slm.core.copier import CopyJournal
+    from slm.core.migration import has_resumable_copy
+
+    src = tmp_path / "src"
+    src.mkdir()
+    dst = tmp_path / "dst"
+    dst.mkdir()
+    CopyJournal.open(tmp_path / "elsewhere", dst).close()
+
+    assert not has_resumable_copy(src, dst)
+    with pytest.raises(ValueError):
+        CopyJournal.open(src, dst)
+
+
+def test_two_phase_move_syncs_only_what_changed_during_precopy(
+    tmp_path, monkeypatch, force_cross_device
+):
+    from slm.core.migration import migrate_target_and_update_links
+
+    src = tmp_path / "data" / "src"
+    src.mkdir(parents=True)
+    for name in ("keep", "grow", "gone", "swap", "becomes-dir"):
+        (src / f"{name}.txt").write_text(f"{name} v1")
+    dst = tmp_path / "other" / "dst"
+    link = tmp_path / "link"
+    link.symlink_to(src)
+
+    def writers_keep_going(stats):
+        assert stats.files == 5
+        (src / "grow.txt").write_text("grow v2, longer")
+        (src / "gone.txt").unlink()
+        (src / "new.txt").write_text("new")
+        (src / "becomes-dir.txt").unlink()
+        (src / "becomes-dir.txt").mkdir()
+        (src / "becomes-dir.txt" / "inner").write_text("inner")
+        # Same size and mtime, new inode: an editor's save-by-rename.
+        st = os.stat(src / "swap.txt")
+        (src / "swap.tmp").write_text("swap v2")
+        os.utime(src / "swap.tmp", ns=(st.st_atime_ns, st.st_mtime_ns))
+        os.replace(src / "swap.tmp", src / "swap.txt")
+
+    force_cross_device()
+    copied = []
+
+    plan = migrate_target_and_update_links(src, dst, [link], dry_run=True, two_phase=True)
+    assert plan[0].startswith("Move:")  # a same-device rename needs no phases
+    monkeypatch.setattr("slm.core.migration._same_device", lambda a, b: False)
+    plan = migrate_target_and_update_links(src, dst, [link], dry_run=True, two_phase=True)
+    assert [line.split(":")[0] for line in plan[:2]] == ["Pre-copy", "Final sync"]
+
+    migrate_target_and_update_links(
+        src,
+        dst,
+        [link],
+        dry_run=False,
+        two_phase=True,
+        on_precopied=writers_keep_going,
+        on_copied=copied.append,
+    )
+
+    delta = copied[-1]
+    assert (delta.files, delta.skipped) == (4, 1)
+    assert sorted(p.name for p in dst.iterdir()) == [
+        "becomes-dir.txt", "grow.txt", "keep.txt", "new.txt", "swap.txt"
+    ]
+    assert (dst / "grow.txt").read_text() == "grow v2, longer"
+    assert (dst / "swap.txt").read_text() == "swap v2"
+    assert (dst / "becomes-dir.txt" / "inner").read_text() == "inner"
+    assert not src.exists()
+    assert link.resolve() == dst
+
+
+def test_fan_out_copy_reads_source_once(tmp_path, monkeypatch, tree):
+    from slm.core.copier import fan_out_copy_tree
+
+    src = tree(tmp_path / "src")
+    dsts = [tmp_path / f"dst{i}" for i in range(3)]
+    reads = {"n": 0}
+    real_read = os.read
+
+    def counting_read(fd, n):
+        data = real_read(fd, n)
+        reads["n"] += len(data)
+        return data
+
+    monkeypatch.setattr(os, "read", counting_read)
+    stats = fan_out_copy_tree(src, dsts)
+
+    assert reads["n"] == stats.bytes == 300_000 + 5 + 10
+    assert stats.strategies == {"fanout": 4}
+    for dst in dsts:
+        assert list(iter_tree_diff(src, dst, compare_hash=True)) == []
+
+
+def test_materialize_links_in_place_fans_out(tmp_path, monkeypatch, tree):
+    from slm.core.migration import materialize_links_in_place
+
+    src = tree(tmp_path / "Data" / "shared")
+    links = []
+    for name in ("p1", "p2", "p3"):
+        link = tmp_path / name / "data"
+        link.parent.mkdir()
+        link.symlink_to(src)
+        links.append(link)
+    calls = []
+    real_fanout = copier.copy_file_fanout
+
+    def spy(s, ds, digest=None, progress=None):
+        calls.append(len(ds))
+        return real_fanout(s, ds, digest, progress)
+
+    monkeypatch.setattr(copier, "copy_file_fanout", spy)
+    materialize_links_in_place(src, links, dry_run=False)
+
+    assert calls == [3, 3, 3, 3]
+    for link in links:
+        assert not link.is_symlink()
+        assert list(iter_tree_diff(src, link)) == []
+        assert not any(p.name.startswith(".data.slm_tmp_") for p in link.parent.iterdir())
+
+
+def test_materialize_failure_cleans_up_temp_dirs(tmp_path, monkeypatch, tree):
+    from slm.core.migration import MigrationError, materialize_links_in_place
+
+    src = tree(tmp_path / "src")
+    links = []
+    for name in ("p1", "p2"):
+        link = tmp_path / name / "data"
+        link.parent.mkdir()
+        link.symlink_to(src)
+        links.append(link)
+
+    def broken(s, ds, digest=None, progress=None):
+        raise OSError(errno.ENOSPC, "No space left on device")
+
+    monkeypatch.setattr(copier, "copy_file_fanout", broken)
+    with pytest.raises(MigrationError, match="Failed to materialize"):
+        materialize_links_in_place(src, links, dry_run=False)
+    for link in links:
+        assert link.is_symlink()
+        assert [p.name for p in link.parent.iterdir()] == ["data"]
+
+
+def _fake_clone(fsrc, fdst):
+    # Stand-in for FICLONE on filesystems without reflinks: same result, real bytes.
+    copier._copy_data(fsrc, fdst)
+
+
+def test_clone_file_falls_back_to_copy_without_reflinks(tmp_path, monkeypatch):
+    def unsupported(fsrc, fdst):
+        raise OSError(errno.EOPNOTSUPP, "Operation not supported")
+
+    monkeypatch.setattr(copier, "_clone_fd", unsupported)
+    src = tmp_path / "src.bin"
+    src.write_bytes(os.urandom(70_000))
+
+    size, strategy = copier.clone_file(str(src), str(tmp_path / "dst.bin"))
+
+    assert size == 70_000
+    assert strategy != "reflink"
+    assert (tmp_path / "dst.bin").read_bytes() == src.read_bytes()
+
+
+def test_reflink_probe_runs_once_per_device_pair(tmp_path, monkeypatch):
+    monkeypatch.setattr(copier, "_reflink_support", {})
+    probes = []
+    real_probe = copier._probe_reflink
+
+    def counting(src_dir, dst_dir):
+        probes.append((src_dir, dst_dir))
+        return real_probe(src_dir, dst_dir)
+
+    monkeypatch.setattr(copier, "_probe_reflink", counting)
+    (tmp_path / "a").mkdir()
+    (tmp_path / "a" / "x").write_text("x")
+    (tmp_path / "b").mkdir()
+    (tmp_path / "b" / "y").write_text("y")
+    before = os.stat(tmp_path / "a").st_mtime_ns
+
+    assert copier.reflink_known(tmp_path / "a", tmp_path / "b") is None
+    first = copier.reflink_supported(tmp_path / "a", tmp_path / "b")
+    second = copier.reflink_supported(tmp_path / "b", tmp_path / "a")
+
+    assert first == second == copier.reflink_known(tmp_path / "a", tmp_path / "b")
+    assert len(probes) == 1
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["a", "b"]
+    assert [p.name for p in (tmp_path / "a").iterdir()] == ["x"]
+    assert os.stat(tmp_path / "a").st_mtime_ns == before
+
+
+def test_reflink_probe_reads_read_only_sources(tmp_path, monkeypatch, tree):
+    monkeypatch.setattr(copier, "_reflink_support", {})
+    monkeypatch.setattr(copier, "_clone_fd", _fake_clone)
+    src = tree(tmp_path / "src")
+    (tmp_path / "dst").mkdir()
+    os.chmod(src, 0o555)
+    try:
+        assert copier.reflink_supported(src, tmp_path / "dst")
+    finally:
+        os.chmod(src, 0o755)
+    assert list((tmp_path / "dst").iterdir()) == []
+
+
+def test_planning_never_probes_reflinks(tmp_path, monkeypatch, tree):
+    from slm.core.migration import materialize_links_in_place, plan_migration
+
+    def no_probe(src_dir, dst_dir):
+        raise AssertionError("planning must not write probe files")
+
+    monkeypatch.setattr(copier, "_reflink_support", {})
+    monkeypatch.setattr(copier, "_probe_reflink", no_probe)
+    monkeypatch.setattr(migration, "_same_device", lambda a, b: False)
+    src = tree(tmp_path / "src")
+    link = tmp_path / "p1" / "data"
+    link.parent.mkdir()
+    link.symlink_to(src)
+
+    lines = materialize_links_in_place(src, [link], dry_run=True)
+    plan = plan_migration(src, tmp_path / "dst", [link])
+
+    assert f"Materialize: {link} <= copy from {src} (reflink if supported)" in lines
+    assert "(cross-device copy, reflink if supported)" in plan.actions[0]
+
+
+def test_materialize_clones_when_reflinks_work(tmp_path, monkeypatch, tree):
+    from slm.core.migration import materialize_links_in_place
+
+    monkeypatch.setattr(copier, "_reflink_support", {})
+    monkeypatch.setattr(copier, "_clone_fd", _fake_clone)
+
+    def no_fanout(s, ds, digest=None, progress=None):
+        raise AssertionError("reflinked files must not be read")
+
+    monkeypatch.setattr(copier, "copy_file_fanout", no_fanout)
+    src = tree(tmp_path / "Data" / "shared")
+    links = []
+    for name in ("p1", "p2"):
+        link = tmp_path / name / "data"
+        link.parent.mkdir()
+        link.symlink_to(src)
+        links.append(link)
+
+    plan = materialize_links_in_place(src, links, dry_run=True)
+    assert all(
+        "(reflink if supported)" in line
+        for line in plan
+        if line.startswith("Materialize")
+    )
+
+    materialize_links_in_place(src, links, dry_run=False)
+    for link in links:
+        assert not link.is_symlink()
+        assert list(iter_tree_diff(src, link, compare_hash=True)) == []
+    # Probed while copying, so later plans know.
+    link = tmp_path / "p3" / "data"
+    link.parent.mkdir()
+    link.symlink_to(src)
+    plan = materialize_links_in_place(src, [link], dry_run=True)
+    assert any(line.startswith(f"Materialize: {link} <= reflink") for line in plan)
+
+
+def test_copy_tree_reports_reflink_strategy(tmp_path, monkeypatch, tree):
+    monkeypatch.setattr(copier, "_reflink_support", {})
+    monkeypatch.setattr(copier, "_clone_fd", _fake_clone)
+    src = tree(tmp_path / "src")
+
+    stats = copy_tree(src, tmp_path / "dst")
+
+    assert stats.strategies == {"reflink": 4}
+    assert list(iter_tree_diff(src, tmp_path / "dst", compare_hash=True)) == []
+
+
+@pytest.mark.skipif(
+    not os.environ.get("SLM_REFLINK_TEST_DIR"),
+    reason="set SLM_REFLINK_TEST_DIR to a directory on a btrfs/XFS (e.g. loop) mount",
+)
+def test_reflink_on_real_filesystem(tree):
+    import tempfile
+
+    base = os.environ["SLM_REFLINK_TEST_DIR"]
+    with tempfile.TemporaryDirectory(dir=base) as tmp:
+        root = Path(tmp)
+        src = tree(root / "src")
+        assert copier.reflink_supported(src, root)
+
+        stats = copy_tree(src, root / "dst")
+
+        assert stats.strategies == {"reflink": 4}
+        assert list(iter_tree_diff(src, root / "dst", compare_hash=True)) == []
+
+
+def test_journal_flush_syncs_only_the_copied_files(tmp_path, monkeypatch, tree):
+    src = tree(tmp_path / "src")
+    synced = []
+
+    def host_wide():
+        raise AssertionError("os.sync() stalls every filesystem on the host")
+
+    monkeypatch.setattr(copier.os, "sync", host_wide, raising=False)
+    monkeypatch.setattr(copier, "_syncfs", lambda path: False)
+    monkeypatch.setattr(copier, "_fsync_path", synced.append)
+    journal = copier.CopyJournal.open(src, tmp_path / "dst")
+
+    copy_tree(src, tmp_path / "dst", journal=journal, reflink=False)
+
+    files = [p for p in synced if os.path.isfile(p)]
+    copied = (tmp_path / "dst").rglob("*")
+    assert sorted(files) == sorted(
+        str(p) for p in copied if p.is_file() and not p.is_symlink()
+    )
+    lines = journal.path.read_text().splitlines()
+    assert len(lines) == 1 + len(files)
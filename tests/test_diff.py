@@ -0,0 +1,112 @@
+"""Tests for slm.core.diff and the cross-device copy verification."""
+
+import os
+import shutil
+
+import pytest
+
+from slm import cli
+from slm.core import migration
+from slm.core.diff import iter_tree_diff
+from slm.core.migration import MigrationError, _safe_move_dir
+
+
+# Contents of the sample tree every diff test starts from.
+TREE = {"same.txt": "same", "sub/nested.txt": "nested"}
+
+
+def test_identical_copies_have_no_diff(tmp_path, make_tree):
+    a = make_tree(tmp_path / "a", TREE)
+    b = tmp_path / "b"
+    shutil.copytree(a, b, symlinks=True)
+    assert list(iter_tree_diff(a, b, compare_hash=True)) == []
+
+
+def test_diff_reports_added_removed_changed_in_sorted_order(tmp_path, make_tree):
+    a = make_tree(tmp_path / "a", TREE)
+    b = tmp_path / "b"
+    shutil.copytree(a, b, symlinks=True)
+    (a / "only_a").mkdir()
+    (a / "only_a" / "deep.txt").write_text("x")
+    (b / "sub" / "extra.txt").write_text("x")
+    (b / "same.txt").write_text("different size")
+    (b / "sub" / "nested.txt").unlink()
+    (b / "sub" / "nested.txt").mkdir()
+
+    entries = [str(e) for e in iter_tree_diff(a, b)]
+    assert entries == [
+        "- only_a",
+        "~ same.txt (size)",
+        "+ sub/extra.txt",
+        "~ sub/nested.txt (type)",
+    ]
+
+
+def test_diff_detects_mtime_and_hash_changes(tmp_path, make_tree):
+    a = make_tree(tmp_path / "a", TREE)
+    b = tmp_path / "b"
+    shutil.copytree(a, b, symlinks=True)
+    (b / "same.txt").write_text("SAME")
+    st = os.stat(a / "same.txt")
+    os.utime(b / "same.txt", ns=(st.st_atime_ns, st.st_mtime_ns))
+    assert list(iter_tree_diff(a, b)) == []
+    assert [e.reason for e in iter_tree_diff(a, b, compare_hash=True)] == ["hash"]
+
+    os.utime(b / "same.txt", ns=(st.st_atime_ns, st.st_mtime_ns + 5 * 10**9))
+    assert [e.reason for e in iter_tree_diff(a, b)] == ["mtime"]
+    assert list(iter_tree_diff(a, b, mtime_window=10)) == []
+
+
+def test_diff_compares_symlink_text(tmp_path, make_tree):
+    a = make_tree(tmp_path / "a", TREE)
+    b = tmp_path / "b"
+    shutil.copytree(a, b, symlinks=True)
+    (a / "ln").symlink_to("same.txt")
+    (b / "ln").symlink_to("sub")
+    assert [str(e) for e in iter_tree_diff(a, b)] == ["~ ln (link)"]
+
+
+def test_cross_device_move_is_verified(tmp_path, make_tree, force_cross_device):
+    old = make_tree(tmp_path / "old", TREE)
+    (old / "ln").symlink_to("same.txt")
+    new = tmp_path / "dest" / "new"
+    force_cross_device()
+
+    _safe_move_dir(old, new)
+
+    assert not old.exists()
+    assert (new / "sub" / "nested.txt").read_text() == "nested"
+    assert os.readlink(new / "ln") == "same.txt"
+
+
+def test_cross_device_move_keeps_source_when_copy_drifts(
+    tmp_path, monkeypatch, make_tree, force_cross_device
+):
+    old = make_tree(tmp_path / "old", TREE)
+    new = tmp_path / "new"
+    force_cross_device()
+    real_copy_tree = migration.copy_tree
+
+    def lossy_copy_tree(src, dst, **kwargs):
+        stats = real_copy_tree(src, dst, **kwargs)
+        os.unlink(os.path.join(dst, "same.txt"))
+        return stats
+
+    monkeypatch.setattr(migration, "copy_tree", lossy_copy_tree)
+
+    with pytest.raises(MigrationError, match="verification failed"):
+        _safe_move_dir(old, new)
+    assert (old / "same.txt").exists()
+    assert not new.exists()
+
+
+def test_lk_diff_command(tmp_path, capsys, make_tree):
+    a = make_tree(tmp_path / "a", TREE)
+    b = tmp_path / "b"
+    shutil.copytree(a, b, symlinks=True)
+    assert cli.main(["diff", str(a), str(b)]) == 0
+    assert "diff(added=0 removed=0 changed=0)" in capsys.readouterr().out
+
+    (b / "new.txt").write_text("n")
+    assert cli.main(["diff", str(a), str(b), "--json"]) == 1
+    assert '"kind": "added"' in capsys.readouterr().out
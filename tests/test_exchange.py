@@ -0,0 +1,85 @@
+"""Tests for slm.core.exchange and exchange-based backups."""
+
+import errno
+
+import pytest
+
+from slm.core import exchange, migration
+from slm.core.exchange import exchange_supported, rename_exchange
+from slm.core.migration import migrate_target_and_update_links
+
+needs_exchange = pytest.mark.skipif(
+    not exchange_supported(), reason="renameat2 is not available"
+)
+
+
+def _setup(tmp_path):
+    old = tmp_path / "old"
+    new = tmp_path / "new"
+    old.mkdir()
+    new.mkdir()
+    (old / "f.txt").write_text("source")
+    (new / "f.txt").write_text("existing")
+    link = tmp_path / "link"
+    link.symlink_to(old)
+    return old, new, link
+
+
+@needs_exchange
+def test_rename_exchange_swaps_two_directories(tmp_path):
+    a = tmp_path / "a"
+    b = tmp_path / "b"
+    a.mkdir()
+    b.mkdir()
+    (a / "x").write_text("a")
+    (b / "x").write_text("b")
+
+    rename_exchange(a, b)
+
+    assert (a / "x").read_text() == "b"
+    assert (b / "x").read_text() == "a"
+    with pytest.raises(OSError) as excinfo:
+        rename_exchange(a, tmp_path / "missing")
+    assert excinfo.value.errno == errno.ENOENT
+
+
+@needs_exchange
+def test_backup_exchanges_so_destination_never_disappears(tmp_path, monkeypatch):
+    old, new, link = _setup(tmp_path)
+    seen = []
+    real_rename = migration.os.rename
+
+    def watching_rename(src, dst, *args, **kwargs):
+        seen.append(new.exists())
+        return real_rename(src, dst, *args, **kwargs)
+
+    monkeypatch.setattr(migration.os, "rename", watching_rename)
+    plan = migrate_target_and_update_links(
+        old, new, [link], dry_run=False, conflict_strategy="backup"
+    )
+
+    backup = next(tmp_path.glob("new~*"))
+    assert "atomic exchange" in plan[0]
+    assert seen == [True]
+    assert not old.exists()
+    assert (new / "f.txt").read_text() == "source"
+    assert (backup / "f.txt").read_text() == "existing"
+    assert link.resolve() == new.resolve()
+
+
+def test_backup_falls_back_when_exchange_is_unsupported(tmp_path, monkeypatch):
+    old, new, link = _setup(tmp_path)
+
+    def unsupported(a, b):
+        raise OSError(errno.ENOSYS, "renameat2 is not available")
+
+    monkeypatch.setattr(migration, "rename_exchange", unsupported)
+    monkeypatch.setattr(exchange, "rename_exchange", unsupported)
+    migrate_target_and_update_links(
+        old, new, [link], dry_run=False, conflict_strategy="backup"
+    )
+
+    backup = next(tmp_path.glob("new~*"))
+    assert (new / "f.txt").read_text() == "source"
+    assert (backup / "f.txt").read_text() == "existing"
+    assert link.resolve() == new.resolve()
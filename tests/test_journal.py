@@ -0,0 +1,189 @@
+"""Tests for slm.core.journal and rollback_journal (undoing a migration)."""
+
+import json
+import os
+
+import pytest
+
+from slm import cli
+from slm.core.exchange import exchange_supported
+from slm.core.journal import BACKUP, LINKS, MOVE, JournalState
+from slm.core.migration import (
+    MigrationError,
+    execute_plan,
+    materialize_links_in_place,
+    plan_migration,
+    rollback_journal,
+)
+from slm.core.plan import MOVE_ONLY
+
+
+def _setup(tmp_path, links=3):
+    src = tmp_path / "data" / "src"
+    src.mkdir(parents=True)
+    (src / "a.txt").write_text("alpha")
+    work = tmp_path / "work"
+    work.mkdir()
+    paths = []
+    for i in range(links):
+        link = work / f"link{i}"
+        link.symlink_to(src)
+        paths.append(link)
+    return src, tmp_path / "data" / "dst", paths
+
+
+def test_rollback_restores_backup_data_and_links(tmp_path):
+    src, dst, links = _setup(tmp_path)
+    dst.mkdir()
+    (dst / "old.txt").write_text("existing")
+    journal = tmp_path / "journal.jsonl"
+    plan = plan_migration(src, dst, links, conflict_strategy="backup")
+
+    execute_plan(plan, journal=journal)
+    state = JournalState.read(journal)
+
+    assert state.steps == [BACKUP, MOVE, LINKS]
+    assert state.done == {BACKUP, MOVE, LINKS} and state.finished
+    assert state.links == [(link, str(src)) for link in links]
+
+    lines = rollback_journal(journal)
+
+    assert lines[0] == "Restore links: 3 to their previous targets, 0 unchanged"
+    assert all(os.readlink(link) == str(src) for link in links)
+    assert (src / "a.txt").read_text() == "alpha"
+    assert (dst / "old.txt").read_text() == "existing"
+    assert not plan.backup_path.exists()
+    assert JournalState.read(journal).rolled_back
+    assert rollback_journal(journal) == [f"Already rolled back: {src}"]
+
+
+class _Crash(BaseException):
+    """Stands in for the process dying mid-step (no handler runs)."""
+
+
+@pytest.mark.skipif(not exchange_supported(), reason="renameat2 is not available")
+def test_rollback_swaps_back_an_interrupted_exchange(tmp_path, monkeypatch):
+    src, dst, links = _setup(tmp_path)
+    dst.mkdir()
+    (dst / "old.txt").write_text("existing")
+    journal = tmp_path / "journal.jsonl"
+    plan = plan_migration(src, dst, links, conflict_strategy="backup")
+    assert f"sits at {src} until it is renamed" in plan.actions[0]
+
+    def crash(a, b, *args, **kwargs):
+        raise _Crash()
+
+    monkeypatch.setattr("slm.core.migration.os.rename", crash)
+    with pytest.raises(_Crash):
+        execute_plan(plan, journal=journal)
+    monkeypatch.undo()
+    # Swapped, with no completion marker: the old destination is at src.
+    assert (src / "old.txt").exists() and (dst / "a.txt").exists()
+    assert JournalState.read(journal).done == set()
+
+    lines = rollback_journal(journal)
+
+    assert lines[0] == f"Swap back: {dst} <-> {src} (interrupted exchange)"
+    assert (src / "a.txt").read_text() == "alpha"
+    assert (dst / "old.txt").read_text() == "existing"
+    assert not plan.backup_path.exists()
+    assert all(os.readlink(link) == str(src) for link in links)
+
+
+def test_rollback_after_failed_link_step(tmp_path, monkeypatch):
+    src, dst, links = _setup(tmp_path)
+    journal = tmp_path / "journal.jsonl"
+    plan = plan_migration(src, dst, links)
+    monkeypatch.setattr(
+        "slm.core.migration.verify_links", lambda pairs, **kw: [next(iter(pairs))[0]]
+    )
+
+    with pytest.raises(MigrationError, match="Verification failed"):
+        execute_plan(plan, journal=journal)
+    monkeypatch.undo()
+    state = JournalState.read(journal)
+    assert state.done == {MOVE} and not state.finished
+
+    preview = rollback_journal(journal, dry_run=True)
+    assert f"Move back: {dst} -> {src}" in preview
+    assert dst.exists() and not JournalState.read(journal).undone
+
+    rollback_journal(journal)
+    assert not dst.exists()
+    assert all(os.readlink(link) == str(src) for link in links)
+
+
+@pytest.mark.parametrize("link_mode", [MOVE_ONLY, "inline"])
+def test_rollback_recreates_deleted_and_materialized_links(tmp_path, link_mode):
+    src, dst, links = _setup(tmp_path, links=2)
+    journal = tmp_path / "journal.jsonl"
+    plan = plan_migration(src, dst, links, link_mode=link_mode)
+    execute_plan(plan, journal=journal)
+
+    lines = rollback_journal(journal)
+
+    assert all(link.is_symlink() for link in links)
+    assert all(os.readlink(link) == str(src) for link in links)
+    assert (src / "a.txt").read_text() == "alpha"
+    assert not dst.exists()
+    if link_mode == "inline":
+        assert f"Remove inline copy: {links[0]}" in lines
+    assert not any(".slm-trash-" in p.name for p in (tmp_path / "work").iterdir())
+
+
+@pytest.mark.parametrize("link_mode", ["inline", "inline-hardlink"])
+def test_materialize_journal_rolls_back_to_symlinks(tmp_path, link_mode):
+    src, _, links = _setup(tmp_path, links=2)
+    journal = tmp_path / "journal.jsonl"
+
+    materialize_links_in_place(
+        src, links, dry_run=False, link_mode=link_mode, journal=journal
+    )
+    state = JournalState.read(journal)
+    assert state.steps == [LINKS] and state.done == {LINKS} and state.finished
+    assert not any(link.is_symlink() for link in links)
+
+    lines = rollback_journal(journal)
+
+    assert f"Remove inline copy: {links[0]}" in lines
+    assert all(os.readlink(link) == str(src) for link in links)
+    assert (src / "a.txt").read_text() == "alpha"
+
+
+def test_relative_only_journal_and_lk_rollback(tmp_path, monkeypatch, capsys):
+    from slm.config import LoadedConfig
+
+    src, _, links = _setup(tmp_path, links=2)
+    journal = tmp_path / "journal.jsonl"
+    monkeypatch.setattr(cli, "load_config", lambda: LoadedConfig(data={}, path=None))
+    argv = ["--data-root", str(tmp_path / "data"), "--scan-roots"]
+    argv += [str(tmp_path / "work"), "--relative", "--apply", "--journal", str(journal)]
+
+    assert cli.main(argv) == 0
+    assert all(not os.path.isabs(os.readlink(link)) for link in links)
+    assert JournalState.read(journal).finished
+
+    assert cli.main(["rollback", str(journal)]) == 0
+    assert all(os.readlink(link) == str(src) for link in links)
+
+
+def test_rollback_rejects_unsupported_journal(tmp_path):
+    bad = tmp_path / "bad.jsonl"
+    bad.write_text(json.dumps({"type": "begin", "version": 99}) + "\n")
+
+    with pytest.raises(MigrationError, match="Unsupported journal version"):
+        rollback_journal(bad)
+
+
+def test_lk_apply_journal_and_lk_rollback(tmp_path, capsys):
+    src, dst, links = _setup(tmp_path, links=1)
+    plan_file = tmp_path / "plan.json"
+    plan_migration(src, dst, links).save(plan_file)
+    journal = tmp_path / "journal.jsonl"
+
+    assert cli.main(["apply", str(plan_file), "--journal", str(journal)]) == 0
+    assert links[0].resolve() == dst.resolve()
+
+    assert cli.main(["rollback", str(journal)]) == 0
+    assert "Move back" in capsys.readouterr().out
+    assert links[0].resolve() == src.resolve()
@@ -0,0 +1,143 @@
+"""Tests for slm.core.merge (the ``merge`` conflict strategy)."""
+
+import errno
+import os
+import shutil
+
+import pytest
+
+from slm.core import merge as merge_mod
+from slm.core.merge import MergeConflict, plan_merge
+from slm.core.migration import (
+    MigrationError,
+    migrate_target_and_update_links,
+    move_and_delete_links,
+)
+
+
+def _pair(tmp_path):
+    src = tmp_path / "data" / "src"
+    dst = tmp_path / "other" / "dst"
+    (src / "sub").mkdir(parents=True)
+    dst.mkdir(parents=True)
+    (src / "same.txt").write_text("same")
+    shutil.copy2(src / "same.txt", dst / "same.txt")
+    (src / "touched.txt").write_text("touched")
+    (dst / "touched.txt").write_text("touched")
+    os.utime(dst / "touched.txt", (1_600_000_000, 1_600_000_000))
+    (src / "new.txt").write_text("new file")
+    (src / "sub" / "deep.bin").write_bytes(b"x" * 1000)
+    (src / "rel-link").symlink_to("same.txt")
+    (dst / "extra.txt").write_text("only in destination")
+    return src, dst
+
+
+def test_plan_merge_lists_only_missing_entries(tmp_path):
+    src, dst = _pair(tmp_path)
+
+    plan = plan_merge(src, dst)
+
+    assert plan.missing == ["new.txt", "rel-link", "sub"]
+    assert (plan.files, plan.bytes) == (2, 8 + 1000)
+    assert plan.retouch == ["touched.txt"]
+    assert plan.identical == 1
+    assert "transfer 3 entries (2 files" in plan.describe()
+
+
+@pytest.mark.parametrize("change", ["size", "hash", "type"])
+def test_plan_merge_fails_fast_on_true_conflicts(tmp_path, change):
+    src, dst = _pair(tmp_path)
+    if change == "size":
+        (dst / "same.txt").write_text("different length")
+    elif change == "hash":
+        (dst / "touched.txt").write_text("TOUCHED")
+    else:
+        (dst / "sub").mkdir()
+        (src / "sub" / "deep.bin").unlink()
+        (src / "sub").rmdir()
+        (src / "sub").write_text("now a file")
+
+    with pytest.raises(MergeConflict) as excinfo:
+        plan_merge(src, dst)
+    assert excinfo.value.entry.reason == change
+
+
+def test_migrate_merge_moves_missing_entries_and_relinks(tmp_path):
+    src, dst = _pair(tmp_path)
+    link = tmp_path / "link"
+    link.symlink_to(src)
+    touched_mtime = (src / "touched.txt").stat().st_mtime
+
+    plan = migrate_target_and_update_links(
+        src, dst, [link], dry_run=True, conflict_strategy="merge"
+    )
+    assert plan[0].startswith(f"Merge: {src} -> {dst} (transfer 3 entries")
+    assert not any(line.startswith("Move:") for line in plan)
+
+    migrate_target_and_update_links(
+        src, dst, [link], dry_run=False, conflict_strategy="merge"
+    )
+
+    assert not src.exists()
+    assert link.resolve() == dst
+    assert (dst / "extra.txt").read_text() == "only in destination"
+    assert (dst / "sub" / "deep.bin").stat().st_size == 1000
+    assert os.readlink(dst / "rel-link") == "same.txt"
+    assert (dst / "touched.txt").stat().st_mtime == touched_mtime
+
+
+def test_merge_conflict_leaves_both_trees_untouched(tmp_path):
+    src, dst = _pair(tmp_path)
+    (dst / "same.txt").write_text("different length")
+    before = sorted(p.name for p in dst.iterdir())
+
+    with pytest.raises(MigrationError, match="Merge conflict: ~ same.txt \\(size\\)"):
+        move_and_delete_links(src, dst, [], dry_run=False, conflict_strategy="merge")
+    assert (src / "new.txt").exists()
+    assert sorted(p.name for p in dst.iterdir()) == before
+
+
+def test_cross_device_merge_copies_missing_entries(tmp_path, monkeypatch):
+    src, dst = _pair(tmp_path)
+    real_rename = os.rename
+
+    def cross_device(a, b, *args, **kwargs):
+        if str(a).startswith(str(src)):
+            raise OSError(errno.EXDEV, "Invalid cross-device link")
+        return real_rename(a, b, *args, **kwargs)
+
+    monkeypatch.setattr(merge_mod.os, "rename", cross_device)
+    monkeypatch.setattr(merge_mod, "rename_noreplace", cross_device)
+    copied = []
+
+    move_and_delete_links(
+        src, dst, [], dry_run=False, conflict_strategy="merge", on_copied=copied.append
+    )
+
+    assert not src.exists()
+    assert (copied[0].files, copied[0].symlinks, copied[0].bytes) == (2, 1, 1008)
+    assert (dst / "new.txt").read_text() == "new file"
+    assert os.stat(dst / "touched.txt").st_mtime != 1_600_000_000
+
+
+@pytest.mark.parametrize("noreplace", [True, False])
+def test_merge_never_replaces_entries_that_appear_after_planning(
+    tmp_path, monkeypatch, noreplace
+):
+    src, dst = _pair(tmp_path)
+    plan = plan_merge(src, dst)
+    (dst / "new.txt").write_text("written after planning")
+    if not noreplace:
+
+        def unsupported(a, b):
+            raise OSError(errno.ENOSYS, "renameat2 is not available")
+
+        monkeypatch.setattr(merge_mod, "rename_noreplace", unsupported)
+
+    with pytest.raises(MergeConflict) as excinfo:
+        merge_mod.apply_merge(plan)
+
+    assert excinfo.value.entry.path == "new.txt"
+    assert excinfo.value.entry.reason == "appeared"
+    assert (dst / "new.txt").read_text() == "written after planning"
+    assert (src / "new.txt").read_text() == "new file"
@@ -0,0 +1,160 @@
+"""Tests for slm.core.plan (plan once, then render, save, log and execute)."""
+
+import json
+import os
+
+import pytest
+
+from slm import cli
+from slm.core.migration import MigrationError, execute_plan, plan_migration
+from slm.core.plan import MOVE_ONLY, ActionLines, DirSnapshot, MigrationPlan
+
+
+def _setup(tmp_path):
+    src = tmp_path / "data" / "src"
+    src.mkdir(parents=True)
+    (src / "a.txt").write_text("alpha")
+    link = tmp_path / "work" / "link"
+    link.parent.mkdir()
+    link.symlink_to(src)
+    return src, tmp_path / "data" / "dst", link
+
+
+def test_plan_round_trips_through_json(tmp_path):
+    src, dst, link = _setup(tmp_path)
+    dst.mkdir()
+    (dst / "b.txt").write_text("beta")
+
+    plan = plan_migration(src, dst, [link], conflict_strategy="merge")
+    path = tmp_path / "plan.json"
+    plan.save(path)
+    loaded = MigrationPlan.load(path)
+
+    assert loaded == plan
+    assert loaded.merge.missing == ["a.txt"]
+    assert loaded.render()[0].startswith("Merge:")
+    assert loaded.link_dirs == [DirSnapshot.take(link.parent)]
+    assert all(snap.path != link for snap in loaded.snapshots)
+
+
+def test_plan_rejects_unknown_version(tmp_path):
+    src, dst, link = _setup(tmp_path)
+    data = plan_migration(src, dst, [link]).to_dict()
+    data["version"] = 99
+
+    with pytest.raises(ValueError, match="Unsupported plan version"):
+        MigrationPlan.from_dict(data)
+
+
+@pytest.mark.parametrize("change", ["retarget", "create-destination", "remove-link"])
+def test_execute_refuses_stale_plan(tmp_path, change):
+    src, dst, link = _setup(tmp_path)
+    plan = plan_migration(src, dst, [link])
+    if change == "retarget":
+        link.unlink()
+        link.symlink_to(tmp_path)
+    elif change == "create-destination":
+        dst.mkdir()
+    else:
+        link.unlink()
+
+    with pytest.raises(MigrationError, match="Plan is stale"):
+        execute_plan(plan)
+    assert (src / "a.txt").exists()
+
+
+def test_changes_beside_the_links_keep_the_plan_fresh(tmp_path):
+    src, dst, link = _setup(tmp_path)
+    plan = plan_migration(src, dst, [link])
+    (link.parent / "notes.txt").write_text("unrelated")
+    link.unlink()
+    link.symlink_to(os.path.join("..", "data", "src"))
+
+    assert plan.stale_reasons() == []
+    execute_plan(plan)
+    assert link.resolve() == dst
+
+
+def test_action_lines_build_per_link_lines_on_access():
+    built = []
+
+    def line(item):
+        built.append(item)
+        return f"item {item}"
+
+    lines = ActionLines(["head"], range(1000), line, ["tail"])
+
+    assert len(lines) == 1002
+    assert lines[0] == "head" and lines[-1] == "tail"
+    assert lines[5] == "item 4"
+    assert lines[1:3] == ["item 0", "item 1"]
+    assert built == [4, 0, 1]
+    with pytest.raises(IndexError):
+        lines[1002]
+
+
+def test_log_records_match_the_plan(tmp_path):
+    src, dst, link = _setup(tmp_path)
+    dst.mkdir()
+
+    plan = plan_migration(src, dst, [link], conflict_strategy="backup")
+    records = plan.log_records("preview", ts=1.0)
+
+    assert [r["type"] for r in records] == ["backup", "move", "retarget"]
+    assert records[0]["to"] == str(plan.backup_path)
+    assert records[2] == {
+        "phase": "preview",
+        "type": "retarget",
+        "link": str(link),
+        "to": str(dst),
+        "link_mode": "relative",
+        "ts": 1.0,
+    }
+    move_only = plan_migration(src, tmp_path / "elsewhere", [link], link_mode=MOVE_ONLY)
+    assert [r["type"] for r in move_only.log_records("applied")] == ["move", "unlink"]
+
+
+def test_lk_apply_executes_saved_plan(tmp_path, capsys):
+    src, dst, link = _setup(tmp_path)
+    path = tmp_path / "plan.json"
+    plan_migration(src, dst, [link], link_mode="absolute").save(path)
+    log = tmp_path / "log.jsonl"
+
+    assert cli.main(["apply", str(path), "--dry-run"]) == 0
+    assert src.exists()
+
+    assert cli.main(["apply", str(path), "--log-json", str(log)]) == 0
+    assert os.readlink(link) == str(dst)
+    assert (dst / "a.txt").read_text() == "alpha"
+    records = [json.loads(line) for line in log.read_text().splitlines()]
+    assert [r["phase"] for r in records] == ["applied", "applied"]
+
+    assert cli.main(["apply", str(path)]) == 2
+    assert "计划已过期" in capsys.readouterr().out
+
+
+def test_link_lines_are_generated_lazily_and_can_be_capped(tmp_path):
+    src, dst, link = _setup(tmp_path)
+    links = [link]
+    for i in range(9):
+        extra = link.parent / f"link{i}"
+        extra.symlink_to(src)
+        links.append(extra)
+
+    plan = plan_migration(src, dst, links, link_mode=MOVE_ONLY)
+
+    assert not any(line.startswith("Delete link") for line in plan.actions)
+    lines = list(plan.iter_actions(limit=3))
+    assert [line for line in lines if line.startswith("Delete link")] == [
+        f"Delete link: {p}" for p in links[:3]
+    ]
+    assert "... and 7 more links" in lines
+    assert len(plan.render()) == len(plan.actions) + 10 + len(plan.checks)
+    records = plan.iter_log_records("preview")
+    assert next(records)["type"] == "move"
+    assert next(records) == {
+        "phase": "preview",
+        "type": "unlink",
+        "link": str(link),
+        "ts": pytest.approx(plan.created, abs=60),
+    }
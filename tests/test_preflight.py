@@ -0,0 +1,111 @@
+"""Tests for slm.core.preflight (capacity checks before copying)."""
+
+import os
+from types import SimpleNamespace
+
+import pytest
+
+from slm.core import migration, preflight
+from slm.core.migration import (
+    MigrationError,
+    materialize_links_in_place,
+    move_and_delete_links,
+)
+from slm.core.preflight import check_capacity
+from slm.core.summary import SummaryCache
+
+
+def _fake_statvfs(monkeypatch, free_bytes, free_inodes=10**6, total_inodes=10**6):
+    def statvfs(path):
+        return SimpleNamespace(
+            f_bavail=free_bytes // 4096,
+            f_frsize=4096,
+            f_favail=free_inodes,
+            f_files=total_inodes,
+        )
+
+    monkeypatch.setattr(preflight.os, "statvfs", statvfs)
+
+
+def _links(tmp_path, src, n):
+    links = []
+    for i in range(n):
+        link = tmp_path / f"p{i}" / "data"
+        link.parent.mkdir()
+        link.symlink_to(src)
+        links.append(link)
+    return links
+
+
+def _src(tmp_path):
+    src = tmp_path / "Data" / "shared"
+    src.mkdir(parents=True)
+    (src / "a.bin").write_bytes(b"x" * 40_000)
+    (src / "b.txt").write_text("hi")
+    return src
+
+
+def test_check_capacity_sums_needs_per_device(tmp_path, monkeypatch):
+    _fake_statvfs(monkeypatch, free_bytes=100 * 4096, free_inodes=5)
+    report = check_capacity(
+        [(tmp_path / "a" / "new", 300 * 4096, 3), (tmp_path, 200 * 4096, 3)]
+    )
+
+    assert len(report.devices) == 1
+    device = report.devices[0]
+    assert (device.bytes, device.inodes) == (500 * 4096, 6)
+    assert device.shortfall_bytes == 400 * 4096
+    assert device.shortfall_inodes == 1
+    assert not report.ok
+    assert "short by 1.6 MiB (1638400 bytes) and 1 inodes" in report.shortfalls()[0]
+
+
+def test_untracked_inode_counts_are_not_checked(tmp_path, monkeypatch):
+    _fake_statvfs(monkeypatch, free_bytes=10**9, free_inodes=0, total_inodes=0)
+    report = check_capacity([(tmp_path, 1, 10**9)])
+    assert report.ok
+    assert report.devices[0].free_inodes is None
+
+
+def test_materialize_counts_one_copy_per_link(tmp_path, monkeypatch):
+    src = _src(tmp_path)
+    links = _links(tmp_path, src, 3)
+    # Room for two copies of ~40 KB, not three.
+    _fake_statvfs(monkeypatch, free_bytes=24 * 4096)
+
+    with pytest.raises(MigrationError, match="Not enough space"):
+        materialize_links_in_place(src, links, dry_run=True)
+    with pytest.raises(MigrationError, match="short by"):
+        materialize_links_in_place(src, links, dry_run=False)
+    for link in links:
+        assert link.is_symlink()
+        assert [p.name for p in link.parent.iterdir()] == ["data"]
+
+    plan = materialize_links_in_place(src, links[:2], dry_run=True)
+    assert plan[-1].startswith("Preflight: ")
+    assert "needs 78.1 KiB/4 inodes" in plan[-1]
+
+
+def test_preflight_uses_cached_summary(tmp_path, monkeypatch):
+    src = _src(tmp_path)
+    links = _links(tmp_path, src, 1)
+    _fake_statvfs(monkeypatch, free_bytes=10**9)
+    cache = SummaryCache()
+    cache.put(src, (7, 2 * 10**9))
+
+    with pytest.raises(MigrationError, match="Not enough space"):
+        materialize_links_in_place(src, links, dry_run=True, summary_cache=cache)
+
+
+def test_rename_needs_no_space_but_cross_device_move_does(tmp_path, monkeypatch):
+    src = _src(tmp_path)
+    _fake_statvfs(monkeypatch, free_bytes=0, free_inodes=0)
+
+    plan = move_and_delete_links(src, tmp_path / "moved", [], dry_run=True)
+    assert not any(line.startswith("Preflight") for line in plan)
+
+    monkeypatch.setattr(migration, "_same_device", lambda a, b: False)
+    with pytest.raises(MigrationError, match="2 inodes"):
+        move_and_delete_links(src, tmp_path / "moved", [], dry_run=True)
+    assert src.exists()
+    assert not os.path.exists(tmp_path / "moved")
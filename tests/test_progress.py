@@ -0,0 +1,140 @@
+"""Tests for slm.core.progress (progress snapshots of long-running copies)."""
+
+import io
+import json
+import tarfile
+
+import pytest
+
+from slm import cli
+from slm.core import migration, progress, tarstream
+from slm.core.migration import execute_plan, materialize_links_in_place, plan_migration
+from slm.core.progress import Progress, ProgressTracker, format_duration
+
+
+@pytest.fixture(autouse=True)
+def every_update(monkeypatch):
+    monkeypatch.setattr(progress, "DEFAULT_PROGRESS_INTERVAL", 0.0)
+
+
+def test_snapshot_fraction_rate_and_eta():
+    snap = Progress("copy", 5, 250, 10, 1000, "/a/b", elapsed=2.0)
+
+    assert snap.fraction == 0.25
+    assert snap.rate == 125.0
+    assert snap.eta == pytest.approx(6.0)
+    assert snap.describe() == "copy 25% 250 B/1000 B, 5/10 files, 125 B/s ETA 0:06"
+    assert Progress("copy", 3, 0, None, None, None, 1.0).fraction is None
+    assert Progress("copy", 3, 0, None, None, None, 1.0, finished=True).eta == 0.0
+    assert format_duration(3725) == "1:02:05"
+
+
+def test_cross_device_move_reports_against_plan_summary(
+    tmp_path, monkeypatch, make_tree, force_cross_device
+):
+    src = make_tree(tmp_path / "src", files=6)
+    link = tmp_path / "link"
+    link.symlink_to(src)
+    monkeypatch.setattr(migration, "_same_device", lambda a, b: False)
+    plan = plan_migration(src, tmp_path / "dst", [link])
+    force_cross_device()
+    seen = []
+
+    execute_plan(plan, on_progress=seen.append)
+
+    seen = [s for s in seen if s.phase != "delete"]
+    last = seen[-1]
+    assert last.finished and last.phase == "copy"
+    assert (last.files_done, last.bytes_done) == (6, 18000)
+    assert (last.files_total, last.bytes_total) == (6, 18000)
+    assert any(s.current and s.current.startswith(str(src)) for s in seen)
+    done = [s.bytes_done for s in seen]
+    assert done == sorted(done)
+
+
+def test_cross_device_move_reports_deleting_the_source(
+    tmp_path, monkeypatch, make_tree, force_cross_device
+):
+    src = make_tree(tmp_path / "src", files=6)
+    link = tmp_path / "link"
+    link.symlink_to(src)
+    monkeypatch.setattr(migration, "_same_device", lambda a, b: False)
+    plan = plan_migration(src, tmp_path / "dst", [link])
+    force_cross_device()
+    seen = []
+
+    execute_plan(plan, on_progress=seen.append)
+
+    deletes = [s for s in seen if s.phase == "delete"]
+    assert deletes and deletes[-1].finished
+    assert (deletes[-1].files_done, deletes[-1].files_total) == (6, 6)
+    assert seen[-1] is deletes[-1] and not src.exists()
+
+
+def test_inline_copies_count_every_pass_over_the_source(tmp_path, make_tree):
+    src = make_tree(tmp_path / "src", files=4, size=100)
+    links = []
+    for name in ("p1", "p2"):
+        (tmp_path / name).mkdir()
+        links.append(tmp_path / name / "data")
+        links[-1].symlink_to(src)
+    seen = []
+
+    materialize_links_in_place(src, links, dry_run=False, on_progress=seen.append)
+
+    # Both copies come from one fan-out pass, so the totals are one tree.
+    assert seen[-1].phase == "inline" and seen[-1].finished
+    assert (seen[-1].files_done, seen[-1].files_total) == (4, 4)
+    assert seen[-1].bytes_done == seen[-1].bytes_total == 400
+
+
+def test_tar_meter_counts_content_bytes_in_any_chunking(tmp_path, make_tree):
+    src = make_tree(tmp_path / "src", files=5, size=700)
+    (src / ("long" * 40)).write_bytes(b"")  # pax path record
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode="w", format=tarfile.PAX_FORMAT) as tar:
+        tar.add(src, arcname=".")
+    data = buf.getvalue()
+    seen = []
+    tracker = ProgressTracker("copy", seen.append, interval=0.0)
+
+    meter = tarstream._TarMeter(src, tracker)
+    for start in range(0, len(data), 333):
+        meter.feed(data[start : start + 333])
+
+    assert (tracker.files, tracker.bytes) == (6, 3500)
+    assert str(src / ("long" * 40)) in {s.current for s in seen}
+
+
+def test_external_tar_stream_reports_progress(tmp_path, make_tree):
+    if tarstream.gnu_tar() is None:
+        pytest.skip("GNU tar is not available")
+    src = make_tree(tmp_path / "src", files=6)
+    seen = []
+    tracker = ProgressTracker("copy", seen.append, files_total=6, bytes_total=18000)
+
+    tarstream.tar_copy_tree(src, tmp_path / "dst", external=True, progress=tracker)
+    tracker.finish()
+
+    assert (seen[-1].files_done, seen[-1].bytes_done) == (6, 18000)
+
+
+def test_lk_apply_logs_progress_records(
+    tmp_path, capsys, make_tree, force_cross_device
+):
+    src = make_tree(tmp_path / "src", files=6)
+    link = tmp_path / "link"
+    link.symlink_to(src)
+    plan_file = tmp_path / "plan.json"
+    plan_migration(src, tmp_path / "dst", [link]).save(plan_file)
+    force_cross_device()  # planned as a rename: totals from a fresh walk
+    log = tmp_path / "log.jsonl"
+
+    assert cli.main(["apply", str(plan_file), "--log-json", str(log)]) == 0
+
+    out = capsys.readouterr().out
+    assert "跨设备复制 [########################] 100%" in out
+    records = [json.loads(line) for line in log.read_text().splitlines()]
+    final = [r for r in records if r["type"] == "progress" and r["finished"]]
+    assert final[0]["step"] == "copy"
+    assert (final[0]["files"], final[0]["bytes_total"]) == (6, 18000)
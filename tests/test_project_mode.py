@@ -291,6 +291,58 @@ class TestSetProjectDataMode:
         # Original target should still exist
         assert target.exists()
 
+    def test_set_mode_inline_hardlink_shares_inodes(self, tmp_path):
+        """inline-hardlink builds a real directory whose files share inodes."""
+        from slm.core.project_mode import set_project_data_mode
+
+        data_root = tmp_path / "Data"
+        target = data_root / "my-data"
+        (target / "sub").mkdir(parents=True)
+        (target / "sub" / "file.txt").write_text("shared")
+
+        project_root = tmp_path / "my_project"
+        project_root.mkdir()
+        data_link = project_root / "data"
+        data_link.symlink_to(target)
+
+        new_status = set_project_data_mode(
+            project_root=project_root,
+            data_root=data_root,
+            mode="inline-hardlink",
+        )
+
+        assert new_status.mode == "inline"
+        assert not data_link.is_symlink()
+        copied = data_link / "sub" / "file.txt"
+        original = target / "sub" / "file.txt"
+        assert os.stat(copied).st_ino == os.stat(original).st_ino
+        assert os.stat(data_link / "sub").st_ino != os.stat(target / "sub").st_ino
+
+        # Already inline: no-op rather than an error
+        again = set_project_data_mode(project_root, data_root, "inline-hardlink")
+        assert again.mode == "inline"
+
+    def test_set_mode_inline_hardlink_copies_across_devices(self, tmp_path, monkeypatch):
+        """When the link is on another device the hard-link mode falls back to a copy."""
+        from slm.core import migration
+        from slm.core.project_mode import set_project_data_mode
+
+        data_root = tmp_path / "Data"
+        target = data_root / "my-data"
+        target.mkdir(parents=True)
+        (target / "file.txt").write_text("copied")
+
+        project_root = tmp_path / "my_project"
+        project_root.mkdir()
+        data_link = project_root / "data"
+        data_link.symlink_to(target)
+
+        monkeypatch.setattr(migration, "_same_device", lambda a, b: False)
+        set_project_data_mode(project_root, data_root, "inline-hardlink")
+
+        assert (data_link / "file.txt").read_text() == "copied"
+        assert os.stat(data_link / "file.txt").st_ino != os.stat(target / "file.txt").st_ino
+
     def test_set_mode_noop_when_already_target_mode(self, tmp_path):
         """Setting same mode should be a no-op."""
         from slm.core.project_mode import get_project_data_status, set_project_data_mode
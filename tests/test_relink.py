@@ -0,0 +1,167 @@
+"""Tests for slm.core.relink (atomic, parallel symlink retargeting)."""
+
+import os
+import threading
+
+import pytest
+
+from slm.core import migration, relink
+from slm.core.journal import JournalState
+from slm.core.migration import (
+    MigrationError,
+    migrate_target_and_update_links,
+    relative_rewrites,
+    rewrite_links_to_relative,
+)
+from slm.core.relink import RetargetError, link_text, retarget_links, verify_links
+from slm.core.scanner import SymlinkInfo
+
+
+def _links(tmp_path, dirs=3, per_dir=5):
+    old = tmp_path / "old"
+    new = tmp_path / "new"
+    old.mkdir()
+    new.mkdir()
+    links = []
+    for d in range(dirs):
+        parent = tmp_path / f"d{d}"
+        parent.mkdir()
+        for i in range(per_dir):
+            link = parent / f"l{i}"
+            link.symlink_to(old)
+            links.append(link)
+    return old, new, links
+
+
+def test_retarget_links_switches_every_link_and_leaves_no_temp(tmp_path):
+    _, new, links = _links(tmp_path)
+    pairs = [(link, link_text(link, new, relative=True)) for link in links]
+
+    retarget_links(pairs, max_workers=4)
+
+    assert all(os.readlink(link) == os.path.join("..", "new") for link in links)
+    assert verify_links(pairs) == []
+    assert not any(".slm-link-" in p.name for p in tmp_path.rglob("*"))
+
+
+def test_retarget_never_leaves_link_missing(tmp_path, monkeypatch):
+    _, new, links = _links(tmp_path, dirs=1, per_dir=1)
+    link = links[0]
+    seen = []
+    real_replace = os.replace
+
+    def watching_replace(*args, **kwargs):
+        seen.append(os.path.lexists(link))
+        return real_replace(*args, **kwargs)
+
+    monkeypatch.setattr(relink.os, "replace", watching_replace)
+    retarget_links([(link, str(new))])
+
+    assert seen == [True]
+    assert os.readlink(link) == str(new)
+
+
+def test_retarget_reports_non_symlinks_and_continues(tmp_path):
+    _, new, links = _links(tmp_path, dirs=2, per_dir=2)
+    links[0].unlink()
+    links[0].mkdir()
+
+    with pytest.raises(RetargetError) as excinfo:
+        retarget_links([(link, str(new)) for link in links])
+
+    assert [p for p, _ in excinfo.value.failures] == [links[0]]
+    assert all(os.readlink(link) == str(new) for link in links[1:])
+
+
+def test_directories_are_processed_concurrently(tmp_path, monkeypatch):
+    _, new, links = _links(tmp_path, dirs=4, per_dir=2)
+    threads = set()
+    real_symlink = os.symlink
+
+    def recording_symlink(*args, **kwargs):
+        threads.add(threading.get_ident())
+        return real_symlink(*args, **kwargs)
+
+    monkeypatch.setattr(relink.os, "symlink", recording_symlink)
+    retarget_links([(link, str(new)) for link in links], max_workers=4)
+
+    assert len(threads) > 1
+
+
+def test_verify_links_compares_text_not_resolution(tmp_path):
+    _, new, links = _links(tmp_path, dirs=1, per_dir=2)
+    links[0].unlink()
+    links[0].symlink_to(new)
+    # Resolves to the same directory, but is not the text we asked for.
+    links[1].unlink()
+    links[1].symlink_to(os.path.join("..", "new"))
+
+    assert verify_links([(links[0], str(new)), (links[1], str(new))]) == [links[1]]
+
+
+def test_migration_verifies_links_by_readlink(tmp_path, monkeypatch):
+    old, new, links = _links(tmp_path, dirs=2, per_dir=1)
+    new.rmdir()
+    monkeypatch.setattr(
+        "slm.core.migration.verify_links", lambda pairs: [next(iter(pairs))[0]]
+    )
+
+    with pytest.raises(MigrationError, match="Verification failed for symlink"):
+        migrate_target_and_update_links(old, new, links, dry_run=False)
+
+
+def test_relative_rewrite_skips_links_already_in_place(tmp_path, monkeypatch):
+    target, _, links = _links(tmp_path, dirs=2, per_dir=2)
+    links[0].unlink()
+    links[0].symlink_to(os.path.join("..", "old"))
+    infos = [SymlinkInfo(source=link, target=target) for link in links]
+    before = os.lstat(links[0]).st_ino
+    written = []
+    real_replace = os.replace
+
+    def counting_replace(src, dst, **kwargs):
+        written.append(dst)
+        return real_replace(src, dst, **kwargs)
+
+    monkeypatch.setattr(relink.os, "replace", counting_replace)
+    plan = rewrite_links_to_relative(infos, dry_run=False)
+
+    assert plan[-1] == "Summary: 3 links to rewrite, 1 unchanged"
+    assert f"Unchanged: {links[0]} -> {os.path.join('..', 'old')}" in plan
+    assert len(written) == 3
+    assert os.lstat(links[0]).st_ino == before
+    assert all(os.readlink(link) == os.path.join("..", "old") for link in links)
+
+    again = rewrite_links_to_relative(infos, dry_run=False)
+    assert again[-1] == "Summary: 0 links to rewrite, 4 unchanged"
+    assert len(written) == 3
+
+
+def test_relative_rewrites_stream_in_chunks(tmp_path, monkeypatch):
+    target, _, links = _links(tmp_path, dirs=2, per_dir=3)
+    links[0].unlink()
+    links[0].symlink_to(os.path.join("..", "old"))
+    infos = [SymlinkInfo(source=link, target=target) for link in links]
+    monkeypatch.setattr(relink, "CHUNK_SIZE", 2)
+    monkeypatch.setattr(migration, "CHUNK_SIZE", 2)
+
+    chunks = list(relative_rewrites(iter(infos)))
+    assert [len(changed) + len(unchanged) for changed, unchanged in chunks] == [2, 2, 2]
+    assert chunks[0][1] == [(infos[0], os.path.join("..", "old"))]
+
+    batches = []
+    journal = tmp_path / "relative.jsonl"
+    plan = rewrite_links_to_relative(
+        iter(infos),
+        dry_run=False,
+        journal=journal,
+        limit=2,
+        on_rewritten=batches.append,
+    )
+
+    assert plan[2:] == ["... and 4 more links", "Summary: 5 links to rewrite, 1 unchanged"]
+    assert [len(batch) for batch in batches] == [1, 2, 2]
+    state = JournalState.read(journal)
+    assert [link for link, _ in state.links] == links[1:]
+    assert state.current_target == target and state.finished
+    assert all(os.readlink(link) == os.path.join("..", "old") for link in links)
@@ -0,0 +1,151 @@
+"""Tests for slm.core.remover (parallel tree deletion)."""
+
+import errno
+import os
+import shutil
+
+import pytest
+
+from slm.core import remover
+from slm.core.remover import remove_tree, remove_tree_in_background
+
+
+def _tree(root, width=4, depth=3):
+    root.mkdir(parents=True)
+    count = 0
+    dirs = [root]
+    for _ in range(depth):
+        nxt = []
+        for d in dirs:
+            for i in range(width):
+                (d / f"f{i}.txt").write_text("x")
+                count += 1
+            sub = d / "sub"
+            sub.mkdir()
+            nxt.append(sub)
+            other = d / "other"
+            other.mkdir()
+            nxt.append(other)
+        dirs = nxt
+    return root, count
+
+
+def test_remove_tree_deletes_everything_but_link_targets(tmp_path):
+    keep = tmp_path / "keep"
+    keep.mkdir()
+    (keep / "precious.txt").write_text("keep me")
+    root, count = _tree(tmp_path / "victim")
+    (root / "sub" / "to-keep").symlink_to(keep)
+    (root / "dangling").symlink_to("nowhere")
+    progress = []
+
+    stats = remove_tree(root, max_workers=4, on_progress=progress.append)
+
+    assert not root.exists()
+    assert (keep / "precious.txt").read_text() == "keep me"
+    assert stats.files == count + 2
+    assert stats.dirs == 1 + 2 + 4 + 8
+    assert progress and progress[-1] is stats
+    assert "files/s" in stats.describe()
+
+
+def test_remove_tree_refuses_symlink_root(tmp_path):
+    real, _ = _tree(tmp_path / "real", depth=1)
+    link = tmp_path / "link"
+    link.symlink_to(real)
+
+    with pytest.raises(OSError):
+        remove_tree(link)
+    assert (real / "f0.txt").exists()
+
+
+def test_remove_tree_collects_errors(tmp_path, monkeypatch):
+    root, _ = _tree(tmp_path / "victim", depth=2)
+    real_unlink = os.unlink
+
+    def flaky(name, *args, **kwargs):
+        if name == "f1.txt":
+            raise OSError(errno.EIO, "boom")
+        return real_unlink(name, *args, **kwargs)
+
+    monkeypatch.setattr(remover.os, "unlink", flaky)
+    with pytest.raises(shutil.Error) as excinfo:
+        remove_tree(root)
+    # One f1.txt per directory that was emptied: root, sub, other.
+    assert sum("boom" in err[2] for err in excinfo.value.args[0]) == 3
+
+    stats = remove_tree(root, ignore_errors=True)
+    assert stats.files == 0
+    assert root.exists()
+
+
+def test_remove_tree_holds_few_descriptors_on_wide_trees(tmp_path):
+    resource = pytest.importorskip("resource")
+    root = tmp_path / "wide"
+    for i in range(300):
+        (root / f"d{i}" / "inner").mkdir(parents=True)
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (min(128, hard), hard))
+    try:
+        stats = remove_tree(root, max_workers=4)
+    finally:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (soft, hard))
+
+    assert not root.exists()
+    assert stats.dirs == 601
+
+
+def test_replaced_directory_is_not_emptied(tmp_path):
+    keep = tmp_path / "keep"
+    keep.mkdir()
+    (keep / "precious.txt").write_text("keep me")
+    listed = os.lstat(tmp_path)
+
+    subdirs, errors = remover._empty_dir(
+        str(keep), (listed.st_dev, listed.st_ino), remover.RemoveStats()
+    )
+
+    assert subdirs == [] and "replaced" in str(errors[0][1])
+    assert (keep / "precious.txt").read_text() == "keep me"
+
+
+@pytest.mark.parametrize("detach", [True, False])
+def test_remove_tree_in_background_frees_path_immediately(tmp_path, detach):
+    root, _ = _tree(tmp_path / "victim", depth=2)
+
+    handle = remove_tree_in_background(root, detach=detach)
+
+    assert not root.exists()
+    assert handle.trash.parent == tmp_path
+    assert handle.trash.name.startswith(".victim.slm-trash-")
+    assert handle.wait(timeout=30)
+    assert not handle.trash.exists()
+
+
+def test_cross_device_move_can_delete_source_in_background(
+    tmp_path, monkeypatch, force_cross_device
+):
+    from slm.core.migration import move_and_delete_links
+
+    src, _ = _tree(tmp_path / "data" / "src", depth=2)
+    dst = tmp_path / "other" / "dst"
+    handles = []
+    real_background = remover.remove_tree_in_background
+
+    def spy(path, **kwargs):
+        handles.append(real_background(path, **kwargs))
+        return handles[-1]
+
+    force_cross_device()
+    monkeypatch.setattr("slm.core.migration.remove_tree_in_background", spy)
+
+    plan = move_and_delete_links(src, dst, [], dry_run=True, background_delete=True)
+    assert any(line.startswith("Delete source: rename aside") for line in plan)
+
+    move_and_delete_links(src, dst, [], dry_run=False, background_delete=True)
+
+    assert not src.exists()
+    assert (dst / "sub" / "f0.txt").exists()
+    assert len(handles) == 1
+    assert handles[0].wait(timeout=30)
+    assert not handles[0].trash.exists()
@@ -0,0 +1,197 @@
+"""Tests for slm.core.summary helpers."""
+
+import threading
+
+import pytest
+
+from slm.core import summary
+from slm.core.summary import (
+    COMPUTING_LABEL,
+    UNAVAILABLE_LABEL,
+    SummaryCache,
+    SummaryCancelled,
+    SummaryPrefetcher,
+    fast_tree_summary,
+    format_summary_pair,
+)
+
+
+def _make_tree(root):
+    (root / "a" / "b").mkdir(parents=True)
+    (root / "top.txt").write_text("12345")
+    (root / "a" / "mid.txt").write_text("123")
+    (root / "a" / "b" / "leaf.txt").write_text("1")
+    return root
+
+
+def test_fast_tree_summary_counts_files_and_bytes(tmp_path):
+    _make_tree(tmp_path / "tree")
+    assert fast_tree_summary(tmp_path / "tree") == (3, 9)
+    assert fast_tree_summary(tmp_path / "missing") == (0, 0)
+
+
+def test_fast_tree_summary_honours_cancel_event(tmp_path):
+    _make_tree(tmp_path / "tree")
+    cancel = threading.Event()
+    cancel.set()
+    with pytest.raises(SummaryCancelled):
+        fast_tree_summary(tmp_path / "tree", cancel=cancel)
+
+
+def test_format_summary_pair_shows_computing_for_pending():
+    line = format_summary_pair(None, (1, 2))
+    assert COMPUTING_LABEL in line
+    assert "new=files:1 bytes:2" in line
+
+
+def test_prefetcher_computes_in_background(tmp_path):
+    tree = _make_tree(tmp_path / "tree")
+    with SummaryPrefetcher() as prefetcher:
+        assert prefetcher.describe(tree) == COMPUTING_LABEL
+        prefetcher.submit([tree])
+        assert prefetcher.result(tree) == (3, 9)
+        assert prefetcher.peek(tree) == (3, 9)
+        assert prefetcher.describe(tree) == "files:3 bytes:9"
+
+
+def test_prefetcher_close_ignores_later_submissions(tmp_path):
+    tree = _make_tree(tmp_path / "tree")
+    prefetcher = SummaryPrefetcher()
+    prefetcher.close()
+    prefetcher.submit([tree])
+    assert prefetcher.peek(tree) is None
+
+
+def test_prefetcher_result_walks_synchronously_after_close(tmp_path):
+    tree = _make_tree(tmp_path / "tree")
+    prefetcher = SummaryPrefetcher()
+    prefetcher.close()
+
+    assert prefetcher.result(tree) == (3, 9)
+
+
+def test_prefetcher_reports_failed_walks(tmp_path, monkeypatch):
+    def broken(path, **kwargs):
+        raise OSError("disk on fire")
+
+    monkeypatch.setattr(summary, "fast_tree_summary", broken)
+    with SummaryPrefetcher() as prefetcher:
+        prefetcher.submit([tmp_path])
+        with pytest.raises(OSError):
+            prefetcher.result(tmp_path)
+
+        assert prefetcher.peek(tmp_path) is None
+        assert isinstance(prefetcher.status(tmp_path), OSError)
+        assert prefetcher.describe(tmp_path) == f"{UNAVAILABLE_LABEL} (disk on fire)"
+
+
+def test_prefetcher_keeps_an_explicit_zero_budget(tmp_path, monkeypatch):
+    budgets = []
+
+    def spy(path, **kwargs):
+        budgets.append(kwargs["time_budget"])
+        return (0, 0)
+
+    monkeypatch.setattr(summary, "fast_tree_summary", spy)
+    with SummaryPrefetcher(estimate_budget=0.0) as prefetcher:
+        assert prefetcher.result(tmp_path) == (0, 0)
+    assert budgets == [0.0]
+
+
+def test_prefetcher_shares_walks_between_spellings_of_a_path(tmp_path, monkeypatch):
+    data = tmp_path / "data" / "target"
+    data.mkdir(parents=True)
+    (data / "f.txt").write_text("abc")
+    (tmp_path / "alias").symlink_to(tmp_path / "data")
+    walked = []
+    real = summary.fast_tree_summary
+
+    def counting(path, **kwargs):
+        walked.append(path)
+        return real(path, **kwargs)
+
+    monkeypatch.setattr(summary, "fast_tree_summary", counting)
+    with SummaryPrefetcher() as prefetcher:
+        prefetcher.submit([tmp_path / "alias" / "target"])
+        assert prefetcher.result(data / ".." / "target") == (1, 3)
+        assert prefetcher.status(data) == (1, 3)
+    assert walked == [data.resolve()]
+
+
+def test_execute_plan_invalidates_moved_summaries(tmp_path):
+    from slm.core.migration import execute_plan, plan_migration
+
+    src = tmp_path / "data" / "src"
+    src.mkdir(parents=True)
+    (src / "f.txt").write_text("abc")
+    link = tmp_path / "link"
+    link.symlink_to(src)
+    cache = SummaryCache()
+    for path in (tmp_path, tmp_path / "data", src, tmp_path / "elsewhere"):
+        cache.put(path, (1, 3))
+    plan = plan_migration(src, tmp_path / "data" / "dst", [link], summary_cache=cache)
+
+    execute_plan(plan, summary_cache=cache)
+
+    assert len(cache) == 1 and tmp_path / "elsewhere" in cache
+
+
+def test_approximate_summary_is_exact_for_small_trees(tmp_path):
+    _make_tree(tmp_path / "tree")
+    est = fast_tree_summary(tmp_path / "tree", approximate=True, time_budget=5.0)
+    assert est.exact
+    assert (est.files, est.bytes) == (3, 9)
+    assert "estimate" not in format_summary_pair(est, (0, 0))
+
+
+def test_approximate_summary_extrapolates_with_interval(tmp_path):
+    import random
+
+    root = tmp_path / "wide"
+    for i in range(20):
+        sub = root / f"d{i}"
+        sub.mkdir(parents=True)
+        for j in range(5):
+            (sub / f"f{j}").write_bytes(b"x" * 10)
+
+    est = fast_tree_summary(
+        root, approximate=True, time_budget=0.0, rng=random.Random(0)
+    )
+    assert not est.exact
+    assert est.probes >= 1
+    # Uniform subtrees make every probe hit the true total.
+    assert (est.files, est.bytes) == (100, 1000)
+    line = format_summary_pair(est, None)
+    assert "≈files:100" in line
+    assert "estimate, 95% CI" in line
+
+
+def test_tree_size_breakdown_aggregates_and_fills_cache(tmp_path):
+    from slm.core.summary import SummaryCache, top_heaviest, tree_size_breakdown
+
+    root = tmp_path / "Data"
+    (root / "big" / "inner" / "deep").mkdir(parents=True)
+    (root / "small").mkdir()
+    (root / "big" / "a.bin").write_bytes(b"x" * 100)
+    (root / "big" / "inner" / "b.bin").write_bytes(b"x" * 50)
+    (root / "big" / "inner" / "deep" / "c.bin").write_bytes(b"x" * 25)
+    (root / "small" / "d.bin").write_bytes(b"x" * 5)
+    (root / "loose.txt").write_bytes(b"x")
+
+    cache = SummaryCache()
+    tree = tree_size_breakdown(root, max_depth=2, cache=cache)
+
+    assert (tree.files, tree.bytes) == (5, 181)
+    by_name = {n.path.name: n for n in tree.iter_nodes()}
+    assert (by_name["big"].files, by_name["big"].bytes) == (3, 175)
+    # Depth limit folds "deep" into "inner".
+    assert (by_name["inner"].files, by_name["inner"].bytes) == (2, 75)
+    assert "deep" not in by_name
+
+    assert [n.path.name for n in top_heaviest(tree, 2)] == ["big", "inner"]
+    assert cache.get(root / "big") == (3, 175)
+    assert fast_tree_summary(root / "small", cache=cache) == (1, 5)
+
+    cache.invalidate(root / "big" / "inner")
+    assert root / "big" not in cache
+    assert root / "small" in cache
@@ -0,0 +1,135 @@
+"""Tests for slm.core.tarstream (streamed tar copies for small-file trees)."""
+
+import io
+import os
+import shutil
+import tarfile
+
+import pytest
+
+from slm.core import migration, tarstream
+from slm.core.copier import CopyStats, copy_tree
+from slm.core.migration import execute_plan, plan_migration
+from slm.core.tarstream import FILES, TAR, choose_copy_backend, tar_copy_tree
+from slm.core.verify import verify_tree_copy
+
+
+def _tree(root):
+    (root / "a" / "b").mkdir(parents=True)
+    (root / "empty").mkdir()
+    for i in range(20):
+        (root / "a" / f"f{i}.bin").write_bytes(os.urandom(i * 37))
+    (root / "a" / "b" / "x.txt").write_text("x")
+    os.chmod(root / "a" / "b" / "x.txt", 0o640)
+    os.utime(root / "a" / "b" / "x.txt", ns=(1_600_000_000_123_456_789,) * 2)
+    (root / "rel").symlink_to(os.path.join("a", "b", "x.txt"))
+    (root / "abs").symlink_to("/nonexistent/target")
+    return root
+
+
+def test_choose_copy_backend_uses_average_file_size(monkeypatch):
+    monkeypatch.setattr(tarstream, "gnu_tar", lambda: "/usr/bin/tar")
+
+    assert choose_copy_backend(None, None) == FILES
+    assert choose_copy_backend(10, 1000) == FILES  # too few files to matter
+    assert choose_copy_backend(100_000, 100_000 * 4096) == TAR
+    assert choose_copy_backend(100_000, 100_000 * (1 << 20)) == FILES
+
+    monkeypatch.setattr(tarstream, "gnu_tar", lambda: None)
+    assert choose_copy_backend(100_000, 100_000 * 4096) == FILES
+
+
+@pytest.mark.parametrize("external", [False, True])
+def test_tar_copy_tree_reproduces_tree(tmp_path, external):
+    if external and tarstream.gnu_tar() is None:
+        pytest.skip("GNU tar is not available")
+    src = _tree(tmp_path / "src")
+
+    stats = tar_copy_tree(src, tmp_path / "dst", external=external)
+
+    dst = tmp_path / "dst"
+    assert verify_tree_copy(src, dst, mode="full").ok
+    assert (stats.files, stats.symlinks, stats.strategies) == (21, 2, {TAR: 21})
+    assert os.stat(dst / "a" / "b" / "x.txt").st_mtime_ns == 1_600_000_000_123_456_789
+    assert os.readlink(dst / "abs") == "/nonexistent/target"
+
+
+@pytest.mark.skipif(
+    not hasattr(os, "geteuid") or os.geteuid() != 0, reason="needs root to chown"
+)
+@pytest.mark.parametrize("external", [False, True])
+def test_tar_copy_tree_does_not_preserve_ownership(tmp_path, external):
+    if external and tarstream.gnu_tar() is None:
+        pytest.skip("GNU tar is not available")
+    src = _tree(tmp_path / "src")
+    for path in [src, *src.rglob("*")]:
+        os.chown(path, 12345, 12345, follow_symlinks=False)
+
+    tar_copy_tree(src, tmp_path / "dst", external=external)
+    copy_tree(src, tmp_path / "ref")
+
+    def owners(root):
+        return {
+            str(p.relative_to(root)): (p.lstat().st_uid, p.lstat().st_gid)
+            for p in [root, *root.rglob("*")]
+        }
+
+    assert owners(tmp_path / "dst") == owners(tmp_path / "ref")
+    assert owners(tmp_path / "dst")["a/b/x.txt"] == (os.getuid(), os.getgid())
+
+
+@pytest.mark.skipif(
+    not hasattr(os, "geteuid") or os.geteuid() != 0, reason="needs root to chown"
+)
+def test_unpacking_ignores_archived_owners(tmp_path):
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode="w", format=tarfile.PAX_FORMAT) as tar:
+        info = tarfile.TarInfo("f.txt")
+        info.size, info.uid, info.gid = 1, 12345, 12345
+        tar.addfile(info, io.BytesIO(b"x"))
+    buf.seek(0)
+    (tmp_path / "src").mkdir()
+    (tmp_path / "dst").mkdir()
+    errors = []
+
+    tarstream._unpack(
+        tmp_path / "src", tmp_path / "dst", buf, {}, CopyStats(), errors
+    )
+
+    assert errors == []
+    st = os.lstat(tmp_path / "dst" / "f.txt")
+    assert (st.st_uid, st.st_gid) == (os.getuid(), os.getgid())
+
+
+def test_inprocess_stream_reports_special_files(tmp_path):
+    src = _tree(tmp_path / "src")
+    os.mkfifo(src / "pipe")
+
+    with pytest.raises(shutil.Error, match="special file"):
+        tar_copy_tree(src, tmp_path / "dst", external=False)
+
+
+def test_migration_streams_small_file_tree_across_devices(
+    tmp_path, monkeypatch, force_cross_device
+):
+    src = _tree(tmp_path / "data" / "src")
+    link = tmp_path / "link"
+    link.symlink_to(src)
+    dst = tmp_path / "other" / "dst"
+    monkeypatch.setattr(migration, "choose_copy_backend", lambda files, size: TAR)
+    monkeypatch.setattr(tarstream, "gnu_tar", lambda: None)  # in-process stream
+    monkeypatch.setattr(migration, "_same_device", lambda a, b: False)
+    monkeypatch.setattr(migration, "reflink_supported", lambda a, b: False)
+
+    plan = plan_migration(src, dst, [link], verify="full")
+    assert plan.copy_backend == TAR
+    assert "Copy backend: tar stream (21 files, 334 B on average)" in plan.actions
+
+    force_cross_device()
+    copied = []
+    execute_plan(plan, on_copied=copied.append)
+
+    assert copied[0].strategies == {TAR: 21}
+    assert not src.exists()
+    assert (dst / "a" / "b" / "x.txt").read_text() == "x"
+    assert link.resolve() == dst.resolve()
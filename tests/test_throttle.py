@@ -0,0 +1,123 @@
+"""Tests for slm.core.throttle (rate caps for copies and deletions)."""
+
+import os
+
+import pytest
+
+from slm import cli
+from slm.core import throttle
+from slm.core.copier import copy_tree
+from slm.core.remover import remove_tree
+from slm.core.throttle import Limits, Throttle, parse_size, throttled
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+        self.slept = 0.0
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+        self.slept += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(throttle.time, "monotonic", fake.monotonic)
+    monkeypatch.setattr(throttle.time, "sleep", fake.sleep)
+    return fake
+
+
+class Recorder(Throttle):
+    def __init__(self):
+        super().__init__()
+        self.bytes = 0
+        self.files = 0
+
+    def consume(self, nbytes=0, files=0):
+        self.bytes += nbytes
+        self.files += files
+
+
+def test_parse_size_and_limits():
+    assert parse_size("20M") == 20 << 20
+    assert parse_size("1.5GiB/s") == int(1.5 * (1 << 30))
+    assert parse_size("500") == 500
+    assert parse_size("none") == 0
+    with pytest.raises(ValueError):
+        parse_size("fast")
+
+    assert Limits.parse("bytes=10k, files=50\n") == Limits(10 << 10, 50)
+    assert Limits.parse("files=off") == Limits()
+    with pytest.raises(ValueError):
+        Limits.parse("speed=10")
+
+
+def test_byte_and_file_caps_sleep_off_the_excess(clock):
+    limiter = Throttle(Limits(bytes_per_sec=1000, files_per_sec=10))
+
+    for _ in range(3):
+        limiter.consume(1000)
+    assert clock.slept == pytest.approx(2.0)
+
+    clock.slept = 0.0
+    limiter.consume(files=30)
+    assert clock.slept == pytest.approx(2.0)
+
+
+def test_control_file_changes_caps_while_running(tmp_path, clock):
+    control = tmp_path / "throttle"
+    control.write_text("bytes=1000")
+    seen = []
+    limiter = Throttle(control_file=control, on_change=seen.append)
+    assert limiter.limits == Limits(bytes_per_sec=1000)
+
+    control.write_text("bytes=4000 files=5")
+    os.utime(control, ns=(1, 1))
+    limiter.consume(10)  # too soon for the poll
+    assert limiter.limits.bytes_per_sec == 1000
+    limiter.request_reload()  # what SIGHUP does
+    limiter.consume(10)
+
+    assert limiter.limits == Limits(4000, 5)
+    assert seen == [Limits(4000, 5)]
+    assert "files=5 control=" in limiter.to_env()
+
+
+def test_copy_and_delete_paths_charge_the_installed_throttle(tmp_path):
+    src = tmp_path / "src"
+    (src / "sub").mkdir(parents=True)
+    for i in range(4):
+        (src / "sub" / f"f{i}").write_bytes(b"x" * 1000)
+    limiter = Recorder()
+
+    with throttled(limiter):
+        copy_tree(src, tmp_path / "dst", reflink=False)
+        assert (limiter.bytes, limiter.files) == (4000, 4)
+        remove_tree(tmp_path / "dst")
+    assert limiter.files == 8
+    assert throttle.current() is None
+
+
+def test_environment_round_trip(tmp_path, monkeypatch):
+    limiter = Throttle(Limits(1 << 20, 100), control_file=tmp_path / "ctl")
+    monkeypatch.setenv(throttle.ENV_VAR, limiter.to_env())
+
+    restored = Throttle.from_environment()
+
+    assert restored.limits == limiter.limits
+    assert restored.control_file == tmp_path / "ctl"
+
+
+def test_cli_rejects_invalid_rate(tmp_path, capsys):
+    plan_file = tmp_path / "missing.json"
+    plan_file.write_text("{}")
+
+    code = cli.main(["apply", str(plan_file), "--max-bytes-per-sec", "fast"])
+
+    assert code == 2
+    assert "限速参数无效" in capsys.readouterr().out
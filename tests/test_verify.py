@@ -0,0 +1,237 @@
+"""Tests for slm.core.verify (sampled post-copy verification)."""
+
+import json
+import os
+import random
+import shutil
+from pathlib import Path
+
+import pytest
+
+from slm import cli
+from slm.config import LoadedConfig
+from slm.core.migration import (
+    MigrationError,
+    migrate_target_and_update_links,
+    move_and_delete_links,
+)
+from slm.core.verify import sample_size_for_confidence, verify_tree_copy
+
+
+# Thirty one-byte files and one large one: size-weighted sampling picks big.bin.
+TREE = {
+    **{f"small{i}.txt": "s" for i in range(30)},
+    "big.bin": os.urandom(64 * 1024),
+}
+
+
+def test_sample_size_for_confidence():
+    assert sample_size_for_confidence(0) == 0
+    assert sample_size_for_confidence(10**9, 0.99, 0.01) == 459
+    assert sample_size_for_confidence(10**9, 0.95, 0.05) == 59
+    assert sample_size_for_confidence(5, 0.99, 0.01) == 5
+    with pytest.raises(ValueError):
+        sample_size_for_confidence(10, confidence=1.0)
+
+
+def test_sampled_mode_is_size_weighted_and_catches_corruption(tmp_path, make_tree):
+    src = make_tree(tmp_path / "src", TREE)
+    dst = tmp_path / "dst"
+    shutil.copytree(src, dst, symlinks=True)
+
+    report = verify_tree_copy(
+        src, dst, mode="sampled", confidence=0.5, tolerance=0.5, rng=random.Random(1)
+    )
+    assert report.ok
+    assert report.files == 31
+    assert report.sampled == ["big.bin"]
+
+    # Same size and mtime: only the content sample can see this.
+    data = bytearray((dst / "big.bin").read_bytes())
+    data[0] ^= 0xFF
+    st = os.stat(dst / "big.bin")
+    (dst / "big.bin").write_bytes(bytes(data))
+    os.utime(dst / "big.bin", ns=(st.st_atime_ns, st.st_mtime_ns))
+
+    assert verify_tree_copy(src, dst).ok
+    report = verify_tree_copy(
+        src, dst, mode="sampled", confidence=0.5, tolerance=0.5, rng=random.Random(1)
+    )
+    assert not report.ok
+    assert report.mismatches == ["~ big.bin (hash)"]
+
+
+def _truncate_mtimes(root, step_ns=2_000_000_000):
+    # What a FAT/exFAT destination does to copied timestamps.
+    for path in [root, *root.rglob("*")]:
+        st = os.lstat(path)
+        mtime = st.st_mtime_ns - st.st_mtime_ns % step_ns
+        os.utime(path, ns=(st.st_atime_ns, mtime), follow_symlinks=False)
+
+
+@pytest.mark.parametrize("mode", ["metadata", "sampled", "full"])
+def test_verify_tolerates_coarse_destination_mtimes(tmp_path, mode, make_tree):
+    src = make_tree(tmp_path / "src", TREE)
+    os.utime(src / "big.bin", ns=(1_600_000_001_999_999_999,) * 2)
+    dst = tmp_path / "dst"
+    shutil.copytree(src, dst, symlinks=True)
+    _truncate_mtimes(dst)
+
+    assert verify_tree_copy(src, dst, mode=mode, rng=random.Random(1)).ok
+    report = verify_tree_copy(src, dst, mode=mode, mtime_window=0.0)
+    assert report.mismatches == ["~ big.bin (mtime)"]
+
+    os.utime(dst / "big.bin", ns=(1_600_000_010_000_000_000,) * 2)
+    report = verify_tree_copy(src, dst, mode=mode, rng=random.Random(1))
+    assert report.mismatches == ["~ big.bin (mtime)"]
+
+
+def test_cross_device_move_onto_coarse_timestamps_keeps_the_copy(
+    tmp_path, monkeypatch, make_tree, force_cross_device
+):
+    from slm.core import migration
+
+    src = make_tree(tmp_path / "data" / "src", TREE)
+    os.utime(src / "big.bin", ns=(1_600_000_001_500_000_000,) * 2)
+    dst = tmp_path / "other" / "dst"
+    link = tmp_path / "link"
+    link.symlink_to(src)
+    force_cross_device()
+    real_copy_tree = migration.copy_tree
+
+    def coarse_copy_tree(old, new, **kwargs):
+        stats = real_copy_tree(old, new, **kwargs)
+        _truncate_mtimes(new)
+        return stats
+
+    monkeypatch.setattr(migration, "copy_tree", coarse_copy_tree)
+
+    migrate_target_and_update_links(
+        src, dst, [link], dry_run=False, verify="sampled"
+    )
+
+    assert not src.exists()
+    assert (dst / "big.bin").exists()
+    assert link.resolve() == dst.resolve()
+
+
+def test_migrate_reports_sampled_verification_on_cross_device(
+    tmp_path, make_tree, force_cross_device
+):
+    src = make_tree(tmp_path / "data" / "src", TREE)
+    dst = tmp_path / "other" / "dst"
+    link = tmp_path / "link"
+    link.symlink_to(src)
+    force_cross_device()
+    reports = []
+
+    plan = migrate_target_and_update_links(
+        src, dst, [link], dry_run=True, verify="sampled"
+    )
+    assert any(line.startswith("Verify: sampled") for line in plan)
+
+    migrate_target_and_update_links(
+        src, dst, [link], dry_run=False, verify="sampled", on_verified=reports.append
+    )
+    assert not src.exists()
+    assert len(reports) == 1
+    assert reports[0].ok
+    assert reports[0].sampled
+
+
+def test_move_only_rejects_unknown_verify_mode(tmp_path, make_tree):
+    src = make_tree(tmp_path / "src", TREE)
+    with pytest.raises(MigrationError, match="verify"):
+        move_and_delete_links(src, tmp_path / "dst", [], dry_run=True, verify="bogus")
+
+
+def test_cli_logs_verification_sample(
+    tmp_path, monkeypatch, capsys, make_tree, force_cross_device, answer_prompts
+):
+    data_root = tmp_path / "Data"
+    target = make_tree(data_root / "proj", TREE)
+    link_root = tmp_path / "links"
+    link_root.mkdir()
+    (link_root / "p").symlink_to(target)
+    new_target = tmp_path / "elsewhere" / "proj"
+    log = tmp_path / "log.jsonl"
+
+    monkeypatch.setattr(cli, "load_config", lambda: LoadedConfig(data={}, path=None))
+    answer_prompts(select=target, text=str(new_target), confirm=True)
+    force_cross_device()
+
+    exit_code = cli.main([
+        "--data-root", str(data_root),
+        "--scan-roots", str(link_root),
+        "--link-mode", "relative",
+        "--verify", "sampled",
+        "--verify-confidence", "0.9",
+        "--log-json", str(log),
+    ])
+
+    assert exit_code == 0
+    assert "mode=sampled" in capsys.readouterr().out
+    records = [json.loads(line) for line in log.read_text().splitlines()]
+    verify = [r for r in records if r["type"] == "verify"]
+    assert len(verify) == 1
+    assert verify[0]["phase"] == "applied"
+    assert verify[0]["confidence"] == 0.9
+    assert verify[0]["sampled"]
+
+
+def test_full_verify_reads_source_only_during_copy(
+    tmp_path, monkeypatch, make_tree, force_cross_device
+):
+    from slm.core import verify as verify_mod
+
+    src = make_tree(tmp_path / "data" / "src", TREE)
+    dst = tmp_path / "other" / "dst"
+    force_cross_device()
+    hashed = []
+    real_digest = verify_mod.file_digest
+
+    def spy(path, *args):
+        hashed.append(Path(path))
+        return real_digest(path, *args)
+
+    monkeypatch.setattr(verify_mod, "file_digest", spy)
+    reports = []
+
+    move_and_delete_links(
+        src, dst, [], dry_run=False, verify="full", on_verified=reports.append
+    )
+
+    assert reports[0].ok
+    assert reports[0].prehashed == reports[0].files == 31
+    assert hashed and all(dst in p.parents for p in hashed)
+
+
+def test_materialize_full_verify_catches_bad_write(tmp_path, monkeypatch, make_tree):
+    from slm.core import copier
+    from slm.core.migration import materialize_links_in_place
+
+    src = make_tree(tmp_path / "data" / "src", TREE)
+    link = tmp_path / "p" / "data"
+    link.parent.mkdir()
+    link.symlink_to(src)
+    real_fanout = copier.copy_file_fanout
+
+    def flaky(s, ds, digest=None, progress=None):
+        result = real_fanout(s, ds, digest, progress)
+        if s.endswith("big.bin"):
+            for d in ds:
+                st = os.stat(d)
+                data = bytearray(Path(d).read_bytes())
+                data[-1] ^= 0xFF
+                Path(d).write_bytes(bytes(data))
+                os.utime(d, ns=(st.st_atime_ns, st.st_mtime_ns))
+        return result
+
+    monkeypatch.setattr(copier, "copy_file_fanout", flaky)
+
+    plan = materialize_links_in_place(src, [link], dry_run=True, verify="full")
+    assert any(line.startswith("Verify: full") for line in plan)
+    with pytest.raises(MigrationError, match="big.bin"):
+        materialize_links_in_place(src, [link], dry_run=False, verify="full")
+    assert link.is_symlink()
+    assert [p.name for p in link.parent.iterdir()] == ["data"]